@@ -1,18 +1,29 @@
 #!/usr/bin/env python3
 
 import os
-import argparse
-import pytz
+import sys
 import json 
+import queue
+import threading
 
 from time import sleep
+from time import monotonic
+from time import time
 from enum import Enum
+from collections import OrderedDict
+from contextlib import nullcontext
+from functools import lru_cache
 from datetime import datetime as dt
 from datetime import date
 from datetime import timedelta
+from datetime import timezone
 
 from returncodes import ReturnCodes as rc
 from simplelogger import *
+from wipescheduler import WipeScheduler
+from wipejournal import WipeJournal, EVENT_START, EVENT_STEP, EVENT_FINISH, EVENT_FAIL, EVENT_SKIP
+from wiperule import compile_wipe_types, compile_wipe_schedule
+from wipesteps import parse_wipe_steps, get_single_step, run_wipe_steps, format_steps_result, get_backoff_seconds
 
 
 VERSION_STRING="1.0.0"
@@ -20,7 +31,6 @@ AUTHOR="Florian Oertel";
 AUTHOR_EMAIL="florian.oertel@outlook.com";
 
 SCRIPT_DIR=os.path.dirname(os.path.realpath(__file__))
-LOCAL_TIMEZONE=dt.now().astimezone().tzinfo
 
 #default vars
 wipe_check_interval_seconds=10
@@ -29,14 +39,58 @@ date_parse_format_repstring="%%Y-%%m-%%d"
 bp_wipe_command=os.path.join(SCRIPT_DIR, "wipe.sh bpwipe")
 map_wipe_command=os.path.join(SCRIPT_DIR, "wipe.sh mapwipe")
 log_file_location=os.path.join(SCRIPT_DIR, "autowipe.log")
+wipe_journal_location=os.path.join(SCRIPT_DIR, "autowipe.journal")
 log_level=6
 logger_obj=None
-last_bp_wipe_date=None
-last_map_wipe_date=None
 wipe_command_retries_on_fail=2
-current_bp_wipe_retries=0
-current_map_wipe_retries=0
+wipe_retry_delay_seconds=60
+wipe_retry_max_delay_seconds=1800
+wipe_retry_jitter=0.2
 append_date_to_logfile_name=True
+buffered_logging=False
+log_compression=False
+log_retention_days=0
+scheduler_mode="event"
+scheduler_max_sleep_seconds=300
+configuration_check_interval_seconds=10
+max_concurrent_wipes=2
+metrics_address="127.0.0.1"
+metrics_port=0
+metrics_obj=None
+control_socket=os.path.join(SCRIPT_DIR, "autowipe.sock")
+CONTROL_COMMANDS=["status", "next", "config", "trigger", "skip", "pause", "resume"]
+profiler_obj=None
+prestage_lead_minutes=30
+wipe_early_start=False
+wipe_duration_percentile=90
+wipe_early_start_margin_seconds=120
+wipe_early_start_fallback_seconds=0
+# successful runs per wipe and step, that are kept for the duration estimate
+WIPE_DURATION_HISTORY_SIZE=20
+wipe_command_timeout_seconds=0
+wipe_command_output_timeout_seconds=0
+wipe_command_output_mode="stream"
+wipe_command_output_buffer_kb=64
+wipe_step_concurrency=2
+snapshot_location=os.path.join(SCRIPT_DIR, "snapshots")
+snapshot_before_wipe=False
+snapshot_retention=3
+snapshot_method="auto"
+snapshot_copy_threads=4
+readiness_timeout_seconds=900
+readiness_interval_seconds=2
+lease_backend="file"
+lease_ttl_seconds=60
+WIPE_COMMAND_OUTPUT_MODES=["stream", "summary"]
+SCHEDULER_MODES=["event", "poll"]
+BACKTEST_FORMATS=["csv", "ical"]
+# see wipeprofiler.PROFILE_PARTS, which is only imported when profiling
+PROFILE_PARTS=["tick", "check", "wipe"]
+# see wipesnapshot.SNAPSHOT_METHODS, which is only imported when snapshotting
+SNAPSHOT_METHODS=["auto", "reflink", "copy"]
+# see wipelease.LEASE_BACKENDS, which is only imported with a lease_location
+LEASE_BACKENDS=["file"]
+WIPE_SCHEDULE_HORIZON_DAYS=400
 
 
 class WipeAction(Enum):
@@ -44,132 +98,1166 @@ class WipeAction(Enum):
     BP_WIPE=1,
     MAP_WIPE=2
 
-def __load_configuration(configuration_location):
-    global bp_wipe_days
-    global map_wipe_days
-    global bp_wipe_time
-    global map_wipe_time
-    global bp_wipe_types
-    global map_wipe_types
-    global first_bp_wipe_date
-    global first_map_wipe_date
-    global configuration_path
-
-    global wipe_check_interval_seconds
-    global date_parse_format
-    global bp_wipe_command
-    global map_wipe_command
-    global log_file_location
-    global log_level
-    global time_zone
-    global wipe_command_retries_on_fail
-    global append_date_to_logfile_name
+# short names of the wipe actions, used in the wipe journal
+WIPE_ACTION_KEYS={WipeAction.BP_WIPE: "bp", WipeAction.MAP_WIPE: "map"}
+WIPE_ACTIONS_BY_KEY={key: wipe_action for wipe_action, key in WIPE_ACTION_KEYS.items()}
 
+class WipeInstance(object):
+    '''
+        Configuration and wipe state of one rust server instance.
+    '''
+
+    # not read from the configuration file, kept when the configuration is reloaded
+    STATE_ATTRIBUTES=("name", "configuration_path", "configuration_stat", "fleet_directory", "logger_obj", "journal", "last_bp_wipe_date", "last_map_wipe_date", "current_bp_wipe_retries", "current_map_wipe_retries", "failed", "prestaged_wipe_instants", "last_wipe_downtime_seconds", "wipe_durations", "pending_retries", "completed_wipe_steps", "retry_lost_seconds", "given_up_wipe_dates", "paused", "triggered_wipes", "running_steps", "last_wipe_results")
+    # only read once at startup
+    RESTART_ATTRIBUTES=("log_file_location", "append_date_to_logfile_name", "buffered_logging", "log_compression", "log_retention_days", "wipe_journal_location", "wipe_check_interval_seconds", "scheduler_mode", "scheduler_max_sleep_seconds", "configuration_check_interval_seconds", "metrics_address", "metrics_port", "control_socket")
+    # the scheduler rules of a WipeAction only need a rebuild, if one of these changed
+    RULE_ATTRIBUTES={
+        WipeAction.BP_WIPE: ("bp_wipe_days", "bp_wipe_time", "bp_wipe_types", "bp_wipe_schedule", "first_bp_wipe_date", "bp_prestage_command", "prestage_lead_minutes", "time_zone", "wipe_early_start", "wipe_duration_percentile", "wipe_early_start_margin_seconds", "wipe_early_start_fallback_seconds"),
+        WipeAction.MAP_WIPE: ("map_wipe_days", "map_wipe_time", "map_wipe_types", "map_wipe_schedule", "first_map_wipe_date", "map_prestage_command", "prestage_lead_minutes", "time_zone", "wipe_early_start", "wipe_duration_percentile", "wipe_early_start_margin_seconds", "wipe_early_start_fallback_seconds")
+    }
+
+    def __init__(self, name="AutoWipe"):
+        self.name = name
+        self.configuration_path = None
+        # (mtime, size, inode) of the configuration file, when it was loaded
+        self.configuration_stat = None
+        self.fleet_directory = None
+
+        self.bp_wipe_days = None
+        self.map_wipe_days = None
+        self.bp_wipe_time = None
+        self.map_wipe_time = None
+        self.bp_wipe_types = None
+        self.map_wipe_types = None
+        self.first_bp_wipe_date = None
+        self.first_map_wipe_date = None
+        # optional cron or RRULE expressions instead of the wipe types and days
+        self.bp_wipe_schedule = None
+        self.map_wipe_schedule = None
+        # WipeRules compiled from the wipe types and days or the wipe schedule
+        self.bp_wipe_rule = None
+        self.map_wipe_rule = None
+
+        self.wipe_check_interval_seconds = wipe_check_interval_seconds
+        self.date_parse_format = date_parse_format
+        self.bp_wipe_command = bp_wipe_command
+        self.map_wipe_command = map_wipe_command
+        self.log_file_location = log_file_location
+        self.log_level = log_level
+        self.time_zone = get_local_time_zone()
+        self.wipe_command_retries_on_fail = wipe_command_retries_on_fail
+        self.wipe_retry_delay_seconds = wipe_retry_delay_seconds
+        self.wipe_retry_max_delay_seconds = wipe_retry_max_delay_seconds
+        self.wipe_retry_jitter = wipe_retry_jitter
+        self.append_date_to_logfile_name = append_date_to_logfile_name
+        self.buffered_logging = buffered_logging
+        self.log_compression = log_compression
+        self.log_retention_days = log_retention_days
+        self.scheduler_mode = scheduler_mode
+        self.scheduler_max_sleep_seconds = scheduler_max_sleep_seconds
+        self.configuration_check_interval_seconds = configuration_check_interval_seconds
+        self.metrics_address = metrics_address
+        self.metrics_port = metrics_port
+        self.control_socket = control_socket
+        self.bp_prestage_command = None
+        self.map_prestage_command = None
+        self.prestage_lead_minutes = prestage_lead_minutes
+        self.wipe_early_start = wipe_early_start
+        self.wipe_duration_percentile = wipe_duration_percentile
+        self.wipe_early_start_margin_seconds = wipe_early_start_margin_seconds
+        self.wipe_early_start_fallback_seconds = wipe_early_start_fallback_seconds
+        self.wipe_command_timeout_seconds = wipe_command_timeout_seconds
+        self.wipe_command_output_timeout_seconds = wipe_command_output_timeout_seconds
+        self.wipe_command_output_mode = wipe_command_output_mode
+        self.wipe_command_output_buffer_kb = wipe_command_output_buffer_kb
+        # delegated cgroup v2, below which wipe steps with a cpu_weight or io_weight get their own cgroup
+        self.cgroup_parent = None
+        # optional lists of WipeSteps, that replace bp_wipe_command/map_wipe_command
+        self.bp_wipe_steps = None
+        self.map_wipe_steps = None
+        self.wipe_step_concurrency = wipe_step_concurrency
+        # directories, that are snapshotted before a wipe, e.g. the save data of the server
+        self.snapshot_directories = None
+        self.snapshot_location = snapshot_location
+        self.snapshot_before_wipe = snapshot_before_wipe
+        self.snapshot_retention = snapshot_retention
+        self.snapshot_method = snapshot_method
+        self.snapshot_copy_threads = snapshot_copy_threads
+        # optional list of wipereadiness.ReadinessProbes, that have to succeed after a wipe, e.g. the query port
+        self.readiness_probes = None
+        self.readiness_timeout_seconds = readiness_timeout_seconds
+        self.readiness_interval_seconds = readiness_interval_seconds
+        # lease on shared storage, that this node has to hold to wipe, if several nodes share the server
+        self.lease_location = None
+        self.lease_backend = lease_backend
+        self.lease_ttl_seconds = lease_ttl_seconds
+        # name of this node in the lease, default: the host name
+        self.lease_holder = None
+        self.wipe_journal_location = wipe_journal_location
+
+        self.logger_obj = None
+        self.journal = None
+        self.last_bp_wipe_date = None
+        self.last_map_wipe_date = None
+        self.current_bp_wipe_retries = 0
+        self.current_map_wipe_retries = 0
+        self.failed = False
+        # WipeAction -> wipe instant, that the last pre-stage run prepared for
+        self.prestaged_wipe_instants = {}
+        self.last_wipe_downtime_seconds = {}
+        # "<wipe>.<step>" -> seconds of the last WIPE_DURATION_HISTORY_SIZE successful runs, e.g. "bp.wipe"
+        self.wipe_durations = {}
+        # WipeAction -> (retry instant, wipe date, start of the first attempt) of a failed wipe
+        self.pending_retries = {}
+        # WipeAction -> names of the wipe steps, that the attempts of the current wipe already finished
+        self.completed_wipe_steps = {}
+        # WipeAction -> seconds lost by failed attempts and their backoff since the start
+        self.retry_lost_seconds = {}
+        # WipeAction -> date of the last wipe, that ran out of retries, it is not started again on that date
+        self.given_up_wipe_dates = {}
+        # set by the control socket
+        self.paused = False
+        self.triggered_wipes = set()
+        # step -> unix time, at which its command started, e.g. "wipe" or "wipe.update"
+        self.running_steps = {}
+        # WipeAction -> result of the last wipe attempt, for the control socket
+        self.last_wipe_results = {}
+
+    def log(self, message, log_level=LogLevel.DEBUG):
+        log(message, log_level, self.logger_obj)
+
+    def check_if_wipe(self):
+        '''
+            Returns the WipeAction, that is due right now for this instance, evaluated with the compiled wipe rules.
+        '''
+        now = dt.now(self.time_zone)
+
+        # a failed wipe is due at its retry instant, even if that is after its wipe day
+        for wipe_action in (WipeAction.BP_WIPE, WipeAction.MAP_WIPE):
+            if wipe_action in self.triggered_wipes:
+                return wipe_action
+            pending_retry = self.pending_retries.get(wipe_action)
+            if pending_retry is not None and pending_retry[0] <= now:
+                return wipe_action
+
+        #check for bp wipe first!
+        # with an early start, a wipe is due as soon as it would end at its wipe time
+        bp_now = (now + self.get_wipe_lead(WipeAction.BP_WIPE)).astimezone(self.time_zone)
+        if WipeAction.BP_WIPE not in self.pending_retries and self.bp_wipe_rule.is_due(bp_now.date(), bp_now.strftime("%H%M"), self.get_last_wipe_date(WipeAction.BP_WIPE)):
+            return WipeAction.BP_WIPE
+        map_now = (now + self.get_wipe_lead(WipeAction.MAP_WIPE)).astimezone(self.time_zone)
+        if WipeAction.MAP_WIPE not in self.pending_retries and self.map_wipe_rule.is_due(map_now.date(), map_now.strftime("%H%M"), self.get_last_wipe_date(WipeAction.MAP_WIPE)):
+            return WipeAction.MAP_WIPE
+        return WipeAction.NONE
+
+    def get_wipe_rule(self, wipe_action):
+        if wipe_action == WipeAction.BP_WIPE:
+            return self.bp_wipe_rule
+        elif wipe_action == WipeAction.MAP_WIPE:
+            return self.map_wipe_rule
+        return None
+
+    def get_last_wipe_date(self, wipe_action):
+        '''
+            Returns the date of the last wipe of wipe_action or of the last one, that ran out of retries, if that is later.
+            The scheduler treats both the same, a wipe, that gave up, waits for the next wipe date.
+        '''
+        last_wipe_date = self.last_bp_wipe_date if wipe_action == WipeAction.BP_WIPE else self.last_map_wipe_date
+        given_up_date = self.given_up_wipe_dates.get(wipe_action)
+        if given_up_date is not None and (last_wipe_date is None or given_up_date > last_wipe_date):
+            return given_up_date
+        return last_wipe_date
+
+    def get_next_wipe_instant(self, wipe_action, now=None):
+        '''
+            Returns the next instant at which check_if_wipe() confirms wipe_action. An instant in the past means, that
+            the wipe is already due. Returns None if no wipe is found within WIPE_SCHEDULE_HORIZON_DAYS.
+        '''
+        wipe_rule = self.get_wipe_rule(wipe_action)
+        if wipe_rule is None:
+            return None
+        if now is None:
+            now = dt.now(self.time_zone)
+        current_date = now.astimezone(self.time_zone).date()
+        last_wipe_date = self.get_last_wipe_date(wipe_action)
+
+        wipe_date = wipe_rule.get_next_wipe_date(current_date, last_wipe_date, current_date + timedelta(days=WIPE_SCHEDULE_HORIZON_DAYS))
+        if wipe_date is None:
+            return None
+        return _get_wipe_instant(wipe_date, wipe_rule.wipe_time, self.time_zone)
+
+    def get_next_wipe_start_instant(self, wipe_action, now=None):
+        '''
+            Same as get_next_wipe_instant(), but moved by the early start, so the wipe is done at the wipe time.
+            The retry instant of a failed wipe replaces it.
+        '''
+        if wipe_action in self.triggered_wipes:
+            return dt.now(self.time_zone)
+        pending_retry = self.pending_retries.get(wipe_action)
+        if pending_retry is not None:
+            return pending_retry[0]
+        wipe_instant = self.get_next_wipe_instant(wipe_action, now)
+        if wipe_instant is None:
+            return None
+        return wipe_instant - self.get_wipe_lead(wipe_action)
+
+    def get_duration_estimate(self, wipe_action, step="wipe"):
+        '''
+            Returns the wipe_duration_percentile of the recorded durations of a wipe step in seconds and the amount of
+            recorded runs, or None if nothing is recorded yet.
+        '''
+        durations = self.wipe_durations.get("{0}.{1}".format(WIPE_ACTION_KEYS[wipe_action], step))
+        if not durations:
+            return None
+        durations = sorted(durations)
+        # nearest rank, so the estimate is always a measured duration
+        rank = max(1, -(-len(durations) * self.wipe_duration_percentile // 100))
+        return durations[min(rank, len(durations)) - 1], len(durations)
+
+    def get_wipe_lead(self, wipe_action):
+        '''
+            Returns how long before its wipe time a wipe has to start to be done at the wipe time: the estimated
+            duration plus wipe_early_start_margin_seconds, or wipe_early_start_fallback_seconds without history.
+        '''
+        if not self.wipe_early_start:
+            return timedelta(0)
+        estimate = self.get_duration_estimate(wipe_action)
+        if estimate is None:
+            return timedelta(seconds=self.wipe_early_start_fallback_seconds)
+        snapshot_estimate = self.get_duration_estimate(wipe_action, "snapshot") if self.snapshot_directories and self.snapshot_before_wipe else None
+        # the wipe is only done, once the server is playable again
+        readiness_estimate = self.get_duration_estimate(wipe_action, "readiness") if self.readiness_probes else None
+        extra_seconds = sum(extra[0] for extra in (snapshot_estimate, readiness_estimate) if extra is not None)
+        return timedelta(seconds=estimate[0] + extra_seconds + self.wipe_early_start_margin_seconds)
+
+    def record_duration(self, wipe_action, step, seconds):
+        key = "{0}.{1}".format(WIPE_ACTION_KEYS[wipe_action], step)
+        # replaced at once, the scheduler reads it from another thread
+        self.wipe_durations[key] = (self.wipe_durations.get(key, []) + [round(seconds, 1)])[-WIPE_DURATION_HISTORY_SIZE:]
+
+    def _log_early_start(self, wipe_action):
+        wipe_lead = self.get_wipe_lead(wipe_action)
+        if wipe_lead <= timedelta(0):
+            return
+        estimate = self.get_duration_estimate(wipe_action)
+        if estimate is None:
+            self.log("Started '{0}' before the wipe time, no durations recorded yet.".format(wipe_lead), LogLevel.INFO)
+        else:
+            self.log("Started '{0}' before the wipe time: estimated duration '{1}' (p{2} of {3} runs) plus '{4}' margin.".format(wipe_lead, timedelta(seconds=round(estimate[0])), self.wipe_duration_percentile, estimate[1], timedelta(seconds=self.wipe_early_start_margin_seconds)), LogLevel.INFO)
+
+    def _get_wipe_date(self, wipe_action):
+        # a retry still belongs to the day of the first attempt
+        if wipe_action in self.pending_retries:
+            return self.pending_retries[wipe_action][1]
+        # a triggered wipe runs on the day it was triggered, it does not replace the wipe of a wipe day
+        if wipe_action in self.triggered_wipes:
+            return dt.now(self.time_zone).date()
+        # the day of the wipe time, an early start may begin the day before
+        return (dt.now(self.time_zone) + self.get_wipe_lead(wipe_action)).astimezone(self.time_zone).date()
+
+    def _schedule_retry(self, wipe_action, wipe_date, attempt_started):
+        '''
+            Sets the instant of the next attempt of a failed wipe: wipe_retry_delay_seconds doubled with every retry
+            up to wipe_retry_max_delay_seconds, with jitter.
+        '''
+        retries = self.current_bp_wipe_retries if wipe_action == WipeAction.BP_WIPE else self.current_map_wipe_retries
+        delay_seconds = get_backoff_seconds(retries, self.wipe_retry_delay_seconds, self.wipe_retry_max_delay_seconds, self.wipe_retry_jitter)
+        first_attempt_started = self.pending_retries[wipe_action][2] if wipe_action in self.pending_retries else attempt_started
+        retry_instant = dt.now(self.time_zone) + timedelta(seconds=delay_seconds)
+        self.pending_retries[wipe_action] = (retry_instant, wipe_date, first_attempt_started)
+        completed_steps = self.completed_wipe_steps.get(wipe_action)
+        self.log("Retry {0} at '{1}' (in '{2}'){3}".format(retries, retry_instant.strftime("%Y-%m-%d %H:%M:%S"), timedelta(seconds=round(delay_seconds)), ", resuming after the finished steps {0}".format(completed_steps) if completed_steps else ""), LogLevel.INFO)
+
+    def _end_retries(self, wipe_action, attempt_seconds=None):
+        '''
+            Forgets the retry state of wipe_action. After a successful retry, logs how much time the failed attempts and their backoff cost.
+        '''
+        pending_retry = self.pending_retries.pop(wipe_action, None)
+        self.completed_wipe_steps.pop(wipe_action, None)
+        if pending_retry is None or attempt_seconds is None:
+            return
+        retries = self.current_bp_wipe_retries if wipe_action == WipeAction.BP_WIPE else self.current_map_wipe_retries
+        lost_seconds = max(0.0, (dt.now(self.time_zone) - pending_retry[2]).total_seconds() - attempt_seconds)
+        self.retry_lost_seconds[wipe_action] = self.retry_lost_seconds.get(wipe_action, 0.0) + lost_seconds
+        if retries == 0:
+            # no attempt failed, the wipe only waited for the lease of another node
+            self.log("{0} succeeded after waiting '{1}' for the wipe lease.".format("Blueprint Wipe" if wipe_action == WipeAction.BP_WIPE else "Map Wipe", timedelta(seconds=round(lost_seconds))), LogLevel.INFO)
+            return
+        self.log("{0} succeeded with retry {1}, '{2}' were lost by {1} failed attempt(s) and their backoff.".format("Blueprint Wipe" if wipe_action == WipeAction.BP_WIPE else "Map Wipe", retries, timedelta(seconds=round(lost_seconds))), LogLevel.INFO)
+
+    def execute_wipe_action(self, wipe_action):
+        '''
+            Runs the wipe command of the given WipeAction and updates the wipe state.
+            Returns True on success and False if the wipe failed. Sets failed, if no retries are left.
+            With a lease_location the wipe only runs while this node holds the lease, see _execute_with_lease().
+        '''
+        if self.lease_location and wipe_action in WIPE_ACTION_KEYS:
+            return self._execute_with_lease(wipe_action)
+        return self._execute_wipe_action(wipe_action)
+
+    def _execute_with_lease(self, wipe_action):
+        '''
+            Runs the wipe, if this node gets the lease, and renews it until the wipe ended. Returns None, if another node
+            holds the lease, the wipe is checked again, when that lease expires. Returns True without a wipe, if another
+            node already finished it.
+        '''
+        wipe = WIPE_ACTION_KEYS[wipe_action]
+        wipe_name = "Blueprint Wipe" if wipe_action == WipeAction.BP_WIPE else "Map Wipe"
+        lease = self.create_lease()
+        acquired = self._acquire_lease(lease)
+        wipe_date = self._get_wipe_date(wipe_action)
+
+        if not acquired:
+            # a renewed lease is read again once per ttl, a released or expired one is taken over by the next check
+            delay_seconds = min(max(lease.expires - time(), 1), self.lease_ttl_seconds) if lease.current_holder is not None else self.lease_ttl_seconds
+            retry_instant = dt.now(self.time_zone) + timedelta(seconds=delay_seconds)
+            first_attempt_started = self.pending_retries[wipe_action][2] if wipe_action in self.pending_retries else dt.now(self.time_zone)
+            self.pending_retries[wipe_action] = (retry_instant, wipe_date, first_attempt_started)
+            self.log("{0} is run by '{1}', checking again at '{2}'.".format(wipe_name, lease.current_holder, retry_instant.strftime("%Y-%m-%d %H:%M:%S")), LogLevel.INFO)
+            return None
+
+        done_date = lease.get_wipe_date(wipe)
+        # a triggered wipe runs in addition to the wipe of its date
+        if wipe_action not in self.triggered_wipes and done_date is not None and done_date >= wipe_date.isoformat():
+            self._release_lease(lease)
+            self.log("{0} of '{1}' was already done by '{2}'.".format(wipe_name, wipe_date, lease.record["wipes"][wipe]["holder"]), LogLevel.INFO)
+            self._end_retries(wipe_action)
+            self._set_wipe_done(wipe_action, wipe_date)
+            return True
+
+        lease.start_heartbeat(lambda message: self.log(message, LogLevel.ERROR))
+        triggered = wipe_action in self.triggered_wipes
+        result = False
+        try:
+            result = self._execute_wipe_action(wipe_action)
+            return result
+        finally:
+            last_wipe_date = self.last_bp_wipe_date if wipe_action == WipeAction.BP_WIPE else self.last_map_wipe_date
+            # a failed wipe leaves the lease free, the next node to check retries it
+            if result is True and not triggered and last_wipe_date is not None:
+                self._release_lease(lease, wipe, last_wipe_date.isoformat())
+            else:
+                self._release_lease(lease)
+
+    def create_lease(self):
+        from socket import gethostname
+        from wipelease import create_lease
+
+        return create_lease(self.lease_backend, self.lease_location, self.lease_holder or gethostname(), self.lease_ttl_seconds)
+
+    def _acquire_lease(self, lease):
+        try:
+            return lease.acquire()
+        except Exception as ex:
+            self.log("Failed to take the wipe lease '{0}'! Error Message: '{1}'".format(self.lease_location, ex), LogLevel.ERROR)
+            return False
+
+    def _release_lease(self, lease, wipe=None, wipe_date=None):
+        try:
+            lease.release(wipe, wipe_date)
+        except Exception as ex:
+            self.log("Failed to release the wipe lease '{0}'! It expires after {1}s. Error Message: '{2}'".format(self.lease_location, self.lease_ttl_seconds, ex), LogLevel.ERROR)
+
+    def _execute_wipe_action(self, wipe_action):
+        if wipe_action == WipeAction.BP_WIPE:
+            if self.current_bp_wipe_retries > 0:
+                self.log("Execuing Blueprint Wipe! Retry: {0}".format(self.current_bp_wipe_retries), LogLevel.INFO)
+            else:
+                self.log("Execuing Blueprint Wipe!", LogLevel.INFO)
+            self._log_early_start(WipeAction.BP_WIPE)
+            wipe_date = self._get_wipe_date(WipeAction.BP_WIPE)
+            triggered = WipeAction.BP_WIPE in self.triggered_wipes
+            self.triggered_wipes.discard(WipeAction.BP_WIPE)
+            self.write_journal(EVENT_START, WipeAction.BP_WIPE)
+            attempt_started = dt.now(self.time_zone)
+            wipe_started = monotonic()
+            if self.run_wipe_steps(WipeAction.BP_WIPE) is True:
+                self._report_downtime(WipeAction.BP_WIPE, monotonic() - wipe_started)
+                self._end_retries(WipeAction.BP_WIPE, monotonic() - wipe_started)
+                self._set_wipe_result(WipeAction.BP_WIPE, True, monotonic() - wipe_started)
+                self.current_bp_wipe_retries=0
+                if not triggered:
+                    self.last_bp_wipe_date=wipe_date
+                self.write_journal(EVENT_FINISH, WipeAction.BP_WIPE)
+            else:
+                self.log("Blueprint Wipe Failed!", LogLevel.WARN)
+                self._set_wipe_result(WipeAction.BP_WIPE, False, monotonic() - wipe_started)
+                if triggered:
+                    # a triggered wipe is not retried and does not disable the server, the wipe days are not affected
+                    self.log("Triggered Blueprint Wipe is not retried.", LogLevel.WARN)
+                    self._end_retries(WipeAction.BP_WIPE)
+                    self.write_journal(EVENT_FAIL, WipeAction.BP_WIPE)
+                    return False
+                self.current_bp_wipe_retries+=1
+                if self.wipe_command_retries_on_fail == -1 or self.wipe_command_retries_on_fail >= self.current_bp_wipe_retries:
+                    self.log("Continue..", LogLevel.INFO)
+                    self._schedule_retry(WipeAction.BP_WIPE, wipe_date, attempt_started)
+                else:
+                    self.log("Autowipe failed due to wipe command failure! The wipe of '{0}' is not started again.".format(wipe_date), LogLevel.ERROR)
+                    self._end_retries(WipeAction.BP_WIPE)
+                    self.given_up_wipe_dates[WipeAction.BP_WIPE] = wipe_date
+                    # the next wipe date starts with all retries again
+                    self.current_bp_wipe_retries = 0
+                    self.failed = True
+                self.write_journal(EVENT_FAIL, WipeAction.BP_WIPE)
+                return False
+
+        elif wipe_action == WipeAction.MAP_WIPE:
+            if self.current_map_wipe_retries > 0:
+                self.log("Execuing Map Wipe! Retry: {0}".format(self.current_map_wipe_retries), LogLevel.INFO)
+            else:
+                self.log("Execuing Map Wipe!", LogLevel.INFO)
+            self._log_early_start(WipeAction.MAP_WIPE)
+            wipe_date = self._get_wipe_date(WipeAction.MAP_WIPE)
+            triggered = WipeAction.MAP_WIPE in self.triggered_wipes
+            self.triggered_wipes.discard(WipeAction.MAP_WIPE)
+            self.write_journal(EVENT_START, WipeAction.MAP_WIPE)
+            attempt_started = dt.now(self.time_zone)
+            wipe_started = monotonic()
+            if self.run_wipe_steps(WipeAction.MAP_WIPE) is True:
+                self._report_downtime(WipeAction.MAP_WIPE, monotonic() - wipe_started)
+                self._end_retries(WipeAction.MAP_WIPE, monotonic() - wipe_started)
+                self._set_wipe_result(WipeAction.MAP_WIPE, True, monotonic() - wipe_started)
+                self.current_map_wipe_retries=0
+                if not triggered:
+                    self.last_map_wipe_date=wipe_date
+                self.write_journal(EVENT_FINISH, WipeAction.MAP_WIPE)
+            else:
+                self.log("Map Wipe Failed!", LogLevel.WARN)
+                self._set_wipe_result(WipeAction.MAP_WIPE, False, monotonic() - wipe_started)
+                if triggered:
+                    # a triggered wipe is not retried and does not disable the server, the wipe days are not affected
+                    self.log("Triggered Map Wipe is not retried.", LogLevel.WARN)
+                    self._end_retries(WipeAction.MAP_WIPE)
+                    self.write_journal(EVENT_FAIL, WipeAction.MAP_WIPE)
+                    return False
+                self.current_map_wipe_retries+=1
+                if self.wipe_command_retries_on_fail == -1 or self.wipe_command_retries_on_fail >= self.current_map_wipe_retries:
+                    self.log("Continue..", LogLevel.INFO)
+                    self._schedule_retry(WipeAction.MAP_WIPE, wipe_date, attempt_started)
+                else:
+                    self.log("Autowipe failed due to wipe command failure! The wipe of '{0}' is not started again.".format(wipe_date), LogLevel.ERROR)
+                    self._end_retries(WipeAction.MAP_WIPE)
+                    self.given_up_wipe_dates[WipeAction.MAP_WIPE] = wipe_date
+                    # the next wipe date starts with all retries again
+                    self.current_map_wipe_retries = 0
+                    self.failed = True
+                self.write_journal(EVENT_FAIL, WipeAction.MAP_WIPE)
+                return False
+
+        return True
+
+    def apply_configuration(self, configuration):
+        '''
+            Takes over the configuration of another WipeInstance, that was loaded from the changed configuration file,
+            and keeps the wipe state. Returns the WipeActions, whose wipe rules changed.
+        '''
+        changed_wipe_actions = [wipe_action for wipe_action, attributes in self.RULE_ATTRIBUTES.items() if any(getattr(self, attribute) != getattr(configuration, attribute) for attribute in attributes)]
+
+        for attribute in self.RESTART_ATTRIBUTES:
+            if getattr(self, attribute) != getattr(configuration, attribute):
+                self.log("Changed configuration element '{0}' only takes effect after a restart!".format(attribute), LogLevel.WARN)
+
+        excluded_attributes = self.STATE_ATTRIBUTES + self.RESTART_ATTRIBUTES
+        # one dict update, so nobody sees a half updated configuration
+        self.__dict__.update({attribute: value for attribute, value in vars(configuration).items() if attribute not in excluded_attributes})
+        if self.logger_obj is not None:
+            self.logger_obj.log_level = self.log_level
+        return changed_wipe_actions
+
+    def get_state(self):
+        return {
+            "bp": self.last_bp_wipe_date.isoformat() if self.last_bp_wipe_date is not None else None,
+            "map": self.last_map_wipe_date.isoformat() if self.last_map_wipe_date is not None else None,
+            "bpr": self.current_bp_wipe_retries,
+            "mapr": self.current_map_wipe_retries,
+            "h": self.wipe_durations,
+            "rt": {WIPE_ACTION_KEYS[wipe_action]: [pending_retry[0].timestamp(), pending_retry[1].isoformat(), pending_retry[2].timestamp()] for wipe_action, pending_retry in list(self.pending_retries.items())},
+            "cs": {WIPE_ACTION_KEYS[wipe_action]: list(steps) for wipe_action, steps in list(self.completed_wipe_steps.items())},
+            "gu": {WIPE_ACTION_KEYS[wipe_action]: given_up_date.isoformat() for wipe_action, given_up_date in list(self.given_up_wipe_dates.items())}
+        }
+
+    def write_journal(self, event, wipe_action, step=None):
+        if self.journal is None:
+            return
+        try:
+            self.journal.append(event, WIPE_ACTION_KEYS[wipe_action], self.get_state(), step)
+        except Exception as ex:
+            # a broken journal must not stop the wipe itself
+            self.log("Failed to write wipe journal '{0}'! Error Message: '{1}'".format(self.journal.journal_file, ex), LogLevel.ERROR)
+
+    def load_journal(self):
+        '''
+            Restores the wipe state from the last journal record, so a restarted daemon does not wipe again.
+            A wipe, that was started but never finished, is executed again as a retry.
+        '''
+        if not self.wipe_journal_location:
+            return
+        self.journal = WipeJournal(self.wipe_journal_location)
+
+        try:
+            record = self.journal.load_last()
+        except Exception as ex:
+            self.log("Failed to load wipe journal '{0}'! Error Message: '{1}'".format(self.wipe_journal_location, ex), LogLevel.ERROR)
+            return
+        if record is None:
+            self.log("No wipe state found in journal '{0}'.".format(self.wipe_journal_location), LogLevel.INFO)
+            return
+
+        state = record["s"]
+        self.last_bp_wipe_date = date.fromisoformat(state["bp"]) if state.get("bp") else None
+        self.last_map_wipe_date = date.fromisoformat(state["map"]) if state.get("map") else None
+        self.current_bp_wipe_retries = state.get("bpr", 0)
+        self.current_map_wipe_retries = state.get("mapr", 0)
+        self.wipe_durations = state.get("h", {})
+        self.pending_retries = {WIPE_ACTIONS_BY_KEY[key]: (dt.fromtimestamp(pending_retry[0], self.time_zone), date.fromisoformat(pending_retry[1]), dt.fromtimestamp(pending_retry[2], self.time_zone)) for key, pending_retry in state.get("rt", {}).items()}
+        self.completed_wipe_steps = {WIPE_ACTIONS_BY_KEY[key]: steps for key, steps in state.get("cs", {}).items()}
+        self.given_up_wipe_dates = {WIPE_ACTIONS_BY_KEY[key]: date.fromisoformat(given_up_date) for key, given_up_date in state.get("gu", {}).items()}
+        self.log("Loaded wipe state from journal: last_bp_wipe_date: '{0}' last_map_wipe_date: '{1}'".format(self.last_bp_wipe_date, self.last_map_wipe_date), LogLevel.INFO)
+        for wipe_action, given_up_date in list(self.given_up_wipe_dates.items()):
+            self.log("{0} of '{1}' ran out of retries, it waits for the next wipe date.".format("Blueprint Wipe" if wipe_action == WipeAction.BP_WIPE else "Map Wipe", given_up_date), LogLevel.WARN)
+
+        if record["e"] in (EVENT_START, EVENT_STEP):
+            self.log("{0} started at '{1}' was interrupted! It gets executed again.".format("Blueprint Wipe" if record["w"] == "bp" else "Map Wipe", dt.fromtimestamp(record["t"], self.time_zone)), LogLevel.WARN)
+            if record["w"] == "bp":
+                self.current_bp_wipe_retries += 1
+            else:
+                self.current_map_wipe_retries += 1
+            # retried right away, even if the restart was after the wipe day
+            wipe_action = WIPE_ACTIONS_BY_KEY[record["w"]]
+            started = dt.fromtimestamp(record["t"], self.time_zone)
+            wipe_date = self.pending_retries[wipe_action][1] if wipe_action in self.pending_retries else (started + self.get_wipe_lead(wipe_action)).astimezone(self.time_zone).date()
+            first_attempt_started = self.pending_retries[wipe_action][2] if wipe_action in self.pending_retries else started
+            self.pending_retries[wipe_action] = (started, wipe_date, first_attempt_started)
+
+    def get_wipe_steps(self, wipe_action):
+        if wipe_action == WipeAction.BP_WIPE:
+            return self.bp_wipe_steps or get_single_step(self.bp_wipe_command)
+        elif wipe_action == WipeAction.MAP_WIPE:
+            return self.map_wipe_steps or get_single_step(self.map_wipe_command)
+        return None
+
+    def run_wipe_steps(self, wipe_action):
+        '''
+            Runs the wipe steps of wipe_action and returns True, if all of them succeeded and the server passed the
+            readiness probes afterwards. A single command like wipe.sh is run as step "wipe", the steps of a graph are
+            named "wipe.<step name>" in the metrics and the durations.
+        '''
+        # a retry must not replace the snapshot before the first attempt with a half wiped state
+        retries = self.current_bp_wipe_retries if wipe_action == WipeAction.BP_WIPE else self.current_map_wipe_retries
+        if self.snapshot_directories and self.snapshot_before_wipe and retries == 0:
+            self.take_snapshot(wipe_action)
+
+        log_offsets = None
+        if self.readiness_probes:
+            from wipereadiness import get_log_offsets
+            log_offsets = get_log_offsets(self.readiness_probes)
+
+        if self._run_steps(wipe_action) is not True:
+            return None
+        if self.readiness_probes and self.wait_until_ready(wipe_action, log_offsets) is not True:
+            # the server has to be started again by the retry, the finished steps before stay done
+            steps = self.get_wipe_steps(wipe_action)
+            final_steps = [step.name for step in steps if not any(step.name in other.after for other in steps)]
+            if wipe_action in self.completed_wipe_steps:
+                self.completed_wipe_steps[wipe_action] = [name for name in self.completed_wipe_steps[wipe_action] if name not in final_steps]
+            return None
+        return True
+
+    def _run_steps(self, wipe_action):
+        steps = self.get_wipe_steps(wipe_action)
+        if len(steps) == 1 and not steps[0].after and steps[0].name == "wipe":
+            step = steps[0]
+            return self.run_wipe_process(step.command, wipe_action, "wipe", step.timeout_seconds, step.output_timeout_seconds, resources=step.resources)
+
+        def run_step(step):
+            if self.run_wipe_process(step.command, wipe_action, "wipe." + step.name, step.timeout_seconds, step.output_timeout_seconds, "[{0}] ".format(step.name), step.resources) is not True:
+                return None
+            # checkpoint, so a retry of the wipe starts after this step; steps finish in parallel, append is atomic
+            self.completed_wipe_steps.setdefault(wipe_action, []).append(step.name)
+            self.write_journal(EVENT_STEP, wipe_action, step.name)
+            return True
+
+        completed_steps = [step.name for step in steps if step.name in self.completed_wipe_steps.get(wipe_action, [])]
+        self.log("Running {0} wipe steps, at most {1} at once: {2}".format(len(steps), self.wipe_step_concurrency, [step.name for step in steps]), LogLevel.INFO)
+        if completed_steps:
+            self.log("Resuming the wipe, the steps {0} were finished by an earlier attempt.".format(completed_steps), LogLevel.INFO)
+        result = run_wipe_steps(steps, run_step, self.wipe_step_concurrency, lambda message: self.log(message, LogLevel.WARN), completed_steps)
+        for line in format_steps_result(result):
+            self.log(line, LogLevel.INFO)
+        if not result.succeeded:
+            return None
+        # a resumed wipe says nothing about the duration of a whole wipe
+        if not completed_steps:
+            self.record_duration(wipe_action, "wipe", result.duration_seconds)
+        return True
+
+    def take_snapshot(self, wipe_action=None):
+        '''
+            Snapshots the snapshot_directories as rollback point of a wipe. A failed snapshot does not stop the wipe,
+            a wipe day without a rollback point is better than no wipe at all. Returns True on success.
+        '''
+        from wipesnapshot import create_snapshot
+
+        label = WIPE_ACTION_KEYS[wipe_action] if wipe_action is not None else "manual"
+        started = monotonic()
+        self.running_steps["snapshot"] = time()
+        try:
+            result = create_snapshot(self.snapshot_directories, self.snapshot_location, label, self.snapshot_method, self.snapshot_retention, self.snapshot_copy_threads, lambda message: self.log(message, LogLevel.INFO))
+        except Exception as ex:
+            self.running_steps.pop("snapshot", None)
+            self.log("Failed to snapshot {0} into '{1}'! Error Message: '{2}'".format(self.snapshot_directories, self.snapshot_location, ex), LogLevel.ERROR)
+            if metrics_obj is not None and wipe_action is not None:
+                metrics_obj.observe_command(self.name, label, "snapshot", monotonic() - started, 1)
+            return False
+
+        self.running_steps.pop("snapshot", None)
+        self.log("Created snapshot {0}".format(result), LogLevel.INFO)
+        if wipe_action is not None:
+            self.record_duration(wipe_action, "snapshot", result.duration_seconds)
+            if metrics_obj is not None:
+                metrics_obj.observe_command(self.name, label, "snapshot", result.duration_seconds, 0)
+            self.write_journal(EVENT_STEP, wipe_action, "snapshot")
+        return True
+
+    def wait_until_ready(self, wipe_action=None, log_offsets=None):
+        '''
+            Waits until every readiness probe succeeded, at most readiness_timeout_seconds, and records the time to
+            readiness of the wipe. A server, that never gets ready, failed the wipe. Returns True, if it is ready.
+        '''
+        from wipereadiness import wait_until_ready
+
+        label = WIPE_ACTION_KEYS[wipe_action] if wipe_action is not None else "manual"
+        self.log("Waiting at most {0}s for the server to be ready: {1}".format(self.readiness_timeout_seconds, [probe.name for probe in self.readiness_probes]), LogLevel.INFO)
+        started = monotonic()
+        self.running_steps["readiness"] = time()
+        try:
+            ready_seconds = wait_until_ready(self.readiness_probes, self.readiness_timeout_seconds, self.readiness_interval_seconds, log_offsets, lambda message: self.log(message, LogLevel.DEBUG))
+        finally:
+            self.running_steps.pop("readiness", None)
+        duration_seconds = monotonic() - started
+
+        not_ready = [name for name, seconds in ready_seconds.items() if seconds is None]
+        if not_ready:
+            self.log("Server not ready after {0:.1f}s, the readiness probes {1} never succeeded!".format(duration_seconds, not_ready), LogLevel.ERROR)
+            if metrics_obj is not None and wipe_action is not None:
+                metrics_obj.observe_command(self.name, label, "readiness", duration_seconds, 1)
+            return False
+
+        # the slowest probe decides, when players can join
+        readiness_seconds = max(ready_seconds.values())
+        self.log("Server ready after {0:.1f}s.".format(readiness_seconds), LogLevel.INFO)
+        if wipe_action is not None:
+            self.record_duration(wipe_action, "readiness", readiness_seconds)
+            if metrics_obj is not None:
+                metrics_obj.observe_command(self.name, label, "readiness", readiness_seconds, 0)
+            self.write_journal(EVENT_STEP, wipe_action, "readiness")
+        return True
+
+    def run_wipe_process(self, wipe_command, wipe_action=None, step="wipe", timeout_seconds=None, output_timeout_seconds=None, output_prefix="", resources=None):
+        '''
+            Runs one command with the timeouts of this instance, unless others are given, and the resource settings of
+            its wipe step and records its duration and metrics as step of wipe_action.
+        '''
+        metrics_labels = (self.name, WIPE_ACTION_KEYS[wipe_action], step) if wipe_action is not None else None
+        started = monotonic()
+        self.running_steps[step] = time()
+        try:
+            with profile_phase("wipe", ",".join(metrics_labels) if metrics_labels is not None else None):
+                # every run gets its own cgroup, so its usage can be read without the other steps
+                cgroup_name = "autowipe.{0}.{1}".format(self.name, ".".join(metrics_labels[1:]) if metrics_labels is not None else "manual")
+                result = run_wipe_process(wipe_command, self.logger_obj, self.wipe_command_timeout_seconds if timeout_seconds is None else timeout_seconds, self.wipe_command_output_timeout_seconds if output_timeout_seconds is None else output_timeout_seconds, self.wipe_command_output_mode, self.wipe_command_output_buffer_kb, metrics_labels, output_prefix, resources, self.cgroup_parent, cgroup_name)
+        finally:
+            self.running_steps.pop(step, None)
+        # failed runs are not recorded, a killed or aborted command says nothing about the next duration
+        if result is True and wipe_action is not None:
+            self.record_duration(wipe_action, step, monotonic() - started)
+        return result
+
+    def _set_wipe_result(self, wipe_action, succeeded, duration_seconds):
+        retries = self.current_bp_wipe_retries if wipe_action == WipeAction.BP_WIPE else self.current_map_wipe_retries
+        self.last_wipe_results[wipe_action] = {"succeeded": succeeded, "finished": dt.now(self.time_zone).isoformat(), "duration_seconds": round(duration_seconds, 1), "retry": retries}
+
+    def _report_downtime(self, wipe_action, downtime_seconds):
+        prestaged = self.prestaged_wipe_instants.pop(wipe_action, None) is not None
+        self.last_wipe_downtime_seconds[wipe_action] = downtime_seconds
+        self.log("{0} downtime: '{1}' ({2})".format("Blueprint Wipe" if wipe_action == WipeAction.BP_WIPE else "Map Wipe", timedelta(seconds=round(downtime_seconds)), "pre-staged" if prestaged else "not pre-staged"), LogLevel.INFO)
+
+    def get_prestage_command(self, wipe_action):
+        if wipe_action == WipeAction.BP_WIPE:
+            return self.bp_prestage_command
+        elif wipe_action == WipeAction.MAP_WIPE:
+            return self.map_prestage_command
+        return None
+
+    def get_next_prestage_instant(self, wipe_action, now=None):
+        '''
+            Returns the instant prestage_lead_minutes before the (early) start of the next wipe of wipe_action, or None if there is no
+            pre-stage command, the wipe is already due or its pre-stage already ran.
+        '''
+        if self.get_prestage_command(wipe_action) is None:
+            return None
+        if now is None:
+            now = dt.now(self.time_zone)
+
+        wipe_instant = self.get_next_wipe_instant(wipe_action, now)
+        if wipe_instant is None or wipe_instant - self.get_wipe_lead(wipe_action) <= now:
+            return None
+        if self.prestaged_wipe_instants.get(wipe_action) == wipe_instant:
+            return None
+        return wipe_instant - self.get_wipe_lead(wipe_action) - timedelta(minutes=self.prestage_lead_minutes)
+
+    def get_due_prestage(self, now=None):
+        if now is None:
+            now = dt.now(self.time_zone)
+        for wipe_action in (WipeAction.BP_WIPE, WipeAction.MAP_WIPE):
+            prestage_instant = self.get_next_prestage_instant(wipe_action, now)
+            if prestage_instant is not None and prestage_instant <= now:
+                return wipe_action
+        return WipeAction.NONE
+
+    def execute_prestage(self, wipe_action):
+        '''
+            Runs the pre-stage command of the upcoming wipe, while the server is still up. A failed pre-stage is not
+            retried, the wipe command then has to do the full update itself.
+        '''
+        wipe_instant = self.get_next_wipe_instant(wipe_action)
+        self.log("Pre-staging {0} for '{1}'!".format("Blueprint Wipe" if wipe_action == WipeAction.BP_WIPE else "Map Wipe", wipe_instant), LogLevel.INFO)
+
+        lease = self.create_lease() if self.lease_location else None
+        if lease is not None and not self._acquire_lease(lease):
+            # the node, that holds the lease, pre-stages into the shared server files
+            self.prestaged_wipe_instants[wipe_action] = wipe_instant
+            self.log("Pre-stage is run by '{0}'.".format(lease.current_holder), LogLevel.INFO)
+            return False
+
+        prestage_started = monotonic()
+        if lease is not None:
+            lease.start_heartbeat(lambda message: self.log(message, LogLevel.ERROR))
+        try:
+            prestaged = self.run_wipe_process(self.get_prestage_command(wipe_action), wipe_action, "prestage") is True
+        finally:
+            if lease is not None:
+                self._release_lease(lease)
+        self.prestaged_wipe_instants[wipe_action] = wipe_instant
+
+        if prestaged:
+            self.log("Pre-stage finished in '{0}'.".format(timedelta(seconds=round(monotonic() - prestage_started))), LogLevel.INFO)
+        else:
+            self.log("Pre-stage failed! The wipe command has to do the full update.", LogLevel.WARN)
+        return prestaged
+
+    def get_status(self, next_wipes_only=False):
+        '''
+            Returns the wipe state of this instance for the control socket. Only reads, so it is safe from any thread.
+        '''
+        now = dt.now(self.time_zone)
+        status = {"name": self.name, "next_wipes": {}}
+        for wipe_action, wipe in WIPE_ACTION_KEYS.items():
+            wipe_instant = self.get_next_wipe_instant(wipe_action, now)
+            start_instant = self.get_next_wipe_start_instant(wipe_action, now)
+            pending_retry = self.pending_retries.get(wipe_action)
+            status["next_wipes"][wipe] = {
+                "wipe_time": wipe_instant.astimezone(self.time_zone).isoformat() if wipe_instant is not None else None,
+                "start": start_instant.astimezone(self.time_zone).isoformat() if start_instant is not None else None,
+                "retry": pending_retry[0].isoformat() if pending_retry is not None else None,
+                "triggered": wipe_action in self.triggered_wipes
+            }
+        if next_wipes_only:
+            return status
+
+        status.update({
+            "paused": self.paused,
+            "failed": self.failed,
+            "last_wipe_dates": {"bp": self.last_bp_wipe_date, "map": self.last_map_wipe_date},
+            "given_up_wipe_dates": {WIPE_ACTION_KEYS[wipe_action]: given_up_date for wipe_action, given_up_date in list(self.given_up_wipe_dates.items())},
+            "retries": {"bp": self.current_bp_wipe_retries, "map": self.current_map_wipe_retries},
+            "last_wipe_results": {WIPE_ACTION_KEYS[wipe_action]: result for wipe_action, result in list(self.last_wipe_results.items())},
+            "completed_wipe_steps": {WIPE_ACTION_KEYS[wipe_action]: list(steps) for wipe_action, steps in list(self.completed_wipe_steps.items())},
+            "running_steps": {step: {"started": dt.fromtimestamp(started, self.time_zone).isoformat(), "elapsed_seconds": round(time() - started, 1)} for step, started in list(self.running_steps.items())}
+        })
+        return status
+
+    def get_configuration(self):
+        '''
+            Returns the configuration in effect, without the wipe state and the compiled rules.
+        '''
+        excluded_attributes = self.STATE_ATTRIBUTES + ("bp_wipe_rule", "map_wipe_rule")
+        return {attribute: value for attribute, value in sorted(vars(self).items()) if attribute not in excluded_attributes}
+
+    def trigger_wipe(self, wipe_action):
+        '''
+            Makes wipe_action due right now. A pending retry is moved to now, otherwise the wipe runs in addition to the
+            scheduled ones, does not change the last wipe date and is not retried, if it fails.
+        '''
+        self.failed = False
+        if wipe_action in self.pending_retries:
+            self.pending_retries[wipe_action] = (dt.now(self.time_zone),) + self.pending_retries[wipe_action][1:]
+        else:
+            self.triggered_wipes.add(wipe_action)
+        self.log("{0} triggered by control socket.".format("Blueprint Wipe" if wipe_action == WipeAction.BP_WIPE else "Map Wipe"), LogLevel.INFO)
+
+    def skip_next_wipe(self, wipe_action):
+        '''
+            Skips a pending retry or else the next scheduled wipe of wipe_action as if it ran. Returns the skipped wipe date.
+        '''
+        if wipe_action in self.pending_retries:
+            wipe_date = self.pending_retries[wipe_action][1]
+            self._end_retries(wipe_action)
+        else:
+            wipe_instant = self.get_next_wipe_instant(wipe_action)
+            if wipe_instant is None:
+                raise Exception("No upcoming {0} wipe to skip!".format(WIPE_ACTION_KEYS[wipe_action]))
+            wipe_date = wipe_instant.astimezone(self.time_zone).date()
+        self._set_wipe_done(wipe_action, wipe_date)
+        self.log("{0} of '{1}' skipped by control socket.".format("Blueprint Wipe" if wipe_action == WipeAction.BP_WIPE else "Map Wipe", wipe_date), LogLevel.INFO)
+        return wipe_date
+
+    def _set_wipe_done(self, wipe_action, wipe_date):
+        '''
+            Counts wipe_action as wiped on wipe_date without running it, e.g. because another node did.
+        '''
+        self.triggered_wipes.discard(wipe_action)
+        if wipe_action == WipeAction.BP_WIPE:
+            self.last_bp_wipe_date = wipe_date
+            self.current_bp_wipe_retries = 0
+        else:
+            self.last_map_wipe_date = wipe_date
+            self.current_map_wipe_retries = 0
+        self.write_journal(EVENT_SKIP, wipe_action)
+
+def __load_configuration(configuration_location, instance):
     try:
+        # taken before reading, so a change while reading is noticed by the next check
+        instance.configuration_stat = get_configuration_stat(configuration_location)
         with open(configuration_location) as json_file:
             data = json.load(json_file)
             
             # check first dateformat!!! so we can parse dates in correct way
             if 'date_parse_format' in data:
-                date_parse_format = data['date_parse_format']
+                instance.date_parse_format = data['date_parse_format']
+
+            if 'bp_wipe_schedule' in data:
+                instance.bp_wipe_schedule = data['bp_wipe_schedule']
 
-            # now parse req elems
+            if 'map_wipe_schedule' in data:
+                instance.map_wipe_schedule = data['map_wipe_schedule']
+
+            # now parse req elems, a wipe schedule replaces the wipe days, time, types and first wipe
             if 'bp_wipe_days' not in data:
-                raise Exception('Missing Configuration Element \'{0}\''.format('bp_wipe_days'))
+                if instance.bp_wipe_schedule is None:
+                    raise Exception('Missing Configuration Element \'{0}\''.format('bp_wipe_days'))
             else:
-                bp_wipe_days = [int(numeric_string) for numeric_string in data['bp_wipe_days']]
+                instance.bp_wipe_days = [int(numeric_string) for numeric_string in data['bp_wipe_days']]
 
             if 'map_wipe_days' not in data:
-                raise Exception('Missing Configuration Element \'{0}\''.format('map_wipe_days'))
+                if instance.map_wipe_schedule is None:
+                    raise Exception('Missing Configuration Element \'{0}\''.format('map_wipe_days'))
             else:
-                map_wipe_days = [int(numeric_string) for numeric_string in data['map_wipe_days']]
+                instance.map_wipe_days = [int(numeric_string) for numeric_string in data['map_wipe_days']]
 
             if 'bp_wipe_time' not in data:
-                raise Exception('Missing Configuration Element \'{0}\''.format('bp_wipe_time'))
+                if instance.bp_wipe_schedule is None:
+                    raise Exception('Missing Configuration Element \'{0}\''.format('bp_wipe_time'))
             else:
-                bp_wipe_time = data['bp_wipe_time']
+                instance.bp_wipe_time = data['bp_wipe_time']
 
             if 'map_wipe_time' not in data:
-                raise Exception('Missing Configuration Element \'{0}\''.format('map_wipe_time'))
+                if instance.map_wipe_schedule is None:
+                    raise Exception('Missing Configuration Element \'{0}\''.format('map_wipe_time'))
             else:
-                map_wipe_time = data['map_wipe_time']
+                instance.map_wipe_time = data['map_wipe_time']
 
             if 'bp_wipe_types' not in data:
-                raise Exception('Missing Configuration Element \'{0}\''.format('bp_wipe_types'))
+                if instance.bp_wipe_schedule is None:
+                    raise Exception('Missing Configuration Element \'{0}\''.format('bp_wipe_types'))
             else:
-                bp_wipe_types = [int(numeric_string) for numeric_string in data['bp_wipe_types']]
+                instance.bp_wipe_types = [int(numeric_string) for numeric_string in data['bp_wipe_types']]
 
             if 'map_wipe_types' not in data:
-                raise Exception('Missing Configuration Element \'{0}\''.format('map_wipe_types'))
+                if instance.map_wipe_schedule is None:
+                    raise Exception('Missing Configuration Element \'{0}\''.format('map_wipe_types'))
             else:
-                map_wipe_types = [int(numeric_string) for numeric_string in data['map_wipe_types']]
+                instance.map_wipe_types = [int(numeric_string) for numeric_string in data['map_wipe_types']]
 
             if 'first_bp_wipe' not in data:
-                raise Exception('Missing Configuration Element \'{0}\''.format('first_bp_wipe'))
+                if instance.bp_wipe_schedule is None:
+                    raise Exception('Missing Configuration Element \'{0}\''.format('first_bp_wipe'))
             else:
-                first_bp_wipe_date = dt.strptime(data['first_bp_wipe'], date_parse_format).date()
+                instance.first_bp_wipe_date = dt.strptime(data['first_bp_wipe'], instance.date_parse_format).date()
 
             if 'first_map_wipe' not in data:
-                raise Exception('Missing Configuration Element \'{0}\''.format('first_map_wipe'))
+                if instance.map_wipe_schedule is None:
+                    raise Exception('Missing Configuration Element \'{0}\''.format('first_map_wipe'))
             else:
-                first_map_wipe_date = dt.strptime(data['first_map_wipe'], date_parse_format).date()
+                instance.first_map_wipe_date = dt.strptime(data['first_map_wipe'], instance.date_parse_format).date()
 
 
             # optional elems
             if 'wipe_check_interval_seconds' in data:
-                wipe_check_interval_seconds = int(data['wipe_check_interval_seconds'])
+                instance.wipe_check_interval_seconds = int(data['wipe_check_interval_seconds'])
 
             if 'bp_wipe_command' in data:
-                bp_wipe_command = data['bp_wipe_command']
+                instance.bp_wipe_command = data['bp_wipe_command']
 
             if 'map_wipe_command' in data:
-                map_wipe_command = data['map_wipe_command']
+                instance.map_wipe_command = data['map_wipe_command']
+
+            if 'bp_wipe_steps' in data:
+                instance.bp_wipe_steps = parse_wipe_steps(data['bp_wipe_steps'])
+
+            if 'map_wipe_steps' in data:
+                instance.map_wipe_steps = parse_wipe_steps(data['map_wipe_steps'])
+
+            if 'wipe_step_concurrency' in data:
+                instance.wipe_step_concurrency = int(data['wipe_step_concurrency'])
+                if instance.wipe_step_concurrency < 1:
+                    raise Exception("wipe_step_concurrency has to be at least 1!")
+
+            if 'snapshot_directories' in data:
+                instance.snapshot_directories = data['snapshot_directories']
+                if not isinstance(instance.snapshot_directories, list):
+                    raise Exception("snapshot_directories has to be a list!")
+
+            if 'snapshot_location' in data:
+                instance.snapshot_location = data['snapshot_location']
+
+            if 'snapshot_before_wipe' in data:
+                instance.snapshot_before_wipe = str(data['snapshot_before_wipe']).lower() == "true"
+
+            if 'snapshot_retention' in data:
+                instance.snapshot_retention = int(data['snapshot_retention'])
+
+            if 'snapshot_method' in data:
+                if data['snapshot_method'] not in SNAPSHOT_METHODS:
+                    raise Exception("Invalid snapshot_method '{0}'! Choose one of these: {1}".format(data['snapshot_method'], SNAPSHOT_METHODS))
+                instance.snapshot_method = data['snapshot_method']
+
+            if 'snapshot_copy_threads' in data:
+                instance.snapshot_copy_threads = int(data['snapshot_copy_threads'])
+                if instance.snapshot_copy_threads < 1:
+                    raise Exception("snapshot_copy_threads has to be at least 1!")
+
+            if 'readiness_probes' in data:
+                from wipereadiness import parse_readiness_probes
+                instance.readiness_probes = parse_readiness_probes(data['readiness_probes'])
+
+            if 'readiness_timeout_seconds' in data:
+                instance.readiness_timeout_seconds = int(data['readiness_timeout_seconds'])
+                if instance.readiness_timeout_seconds < 1:
+                    raise Exception("readiness_timeout_seconds has to be at least 1!")
+
+            if 'readiness_interval_seconds' in data:
+                instance.readiness_interval_seconds = float(data['readiness_interval_seconds'])
+
+            if 'lease_location' in data:
+                instance.lease_location = data['lease_location']
+
+            if 'lease_backend' in data:
+                if data['lease_backend'] not in LEASE_BACKENDS:
+                    raise Exception("Invalid lease_backend '{0}'! Choose one of these: {1}".format(data['lease_backend'], LEASE_BACKENDS))
+                instance.lease_backend = data['lease_backend']
+
+            if 'lease_ttl_seconds' in data:
+                instance.lease_ttl_seconds = int(data['lease_ttl_seconds'])
+                if instance.lease_ttl_seconds < 3:
+                    raise Exception("lease_ttl_seconds has to be at least 3!")
+
+            if 'lease_holder' in data:
+                instance.lease_holder = data['lease_holder']
 
             if 'log_file_location' in data:
-                log_file_location = data['log_file_location']
+                instance.log_file_location = data['log_file_location']
 
             if 'log_level' in data:
-                log_level = int(data['log_level'])
+                instance.log_level = int(data['log_level'])
+
+            if 'wipe_journal_location' in data:
+                instance.wipe_journal_location = data['wipe_journal_location']
                 
 
             if 'time_zone' in data:
                 try:
-                    time_zone = pytz.timezone(data['time_zone'])
+                    instance.time_zone = get_time_zone(data['time_zone'])
                 except Exception:
-                    log("Invalid timezone: '{0}'! Using local timezone '{1}' instead.".format(data['time_zone'], LOCAL_TIMEZONE), LogLevel.WARN)
-                    time_zone=LOCAL_TIMEZONE
+                    log("Invalid timezone: '{0}'! Using local timezone '{1}' instead.".format(data['time_zone'], get_local_time_zone()), LogLevel.WARN)
+                    instance.time_zone=get_local_time_zone()
             else:
-                time_zone=LOCAL_TIMEZONE
+                instance.time_zone=get_local_time_zone()
 
             if 'wipe_command_retries_on_fail' in data:
-                wipe_command_retries_on_fail = int(data['wipe_command_retries_on_fail'])
+                instance.wipe_command_retries_on_fail = int(data['wipe_command_retries_on_fail'])
+
+            if 'wipe_retry_delay_seconds' in data:
+                instance.wipe_retry_delay_seconds = int(data['wipe_retry_delay_seconds'])
+
+            if 'wipe_retry_max_delay_seconds' in data:
+                instance.wipe_retry_max_delay_seconds = int(data['wipe_retry_max_delay_seconds'])
+
+            if 'wipe_retry_jitter' in data:
+                instance.wipe_retry_jitter = float(data['wipe_retry_jitter'])
+                if not 0 <= instance.wipe_retry_jitter <= 1:
+                    raise Exception("wipe_retry_jitter has to be between 0 and 1!")
 
             if 'append_date_to_logfile_name' in data:
-                append_date_to_logfile_name = bool(data['append_date_to_logfile_name'])
+                instance.append_date_to_logfile_name = str(data['append_date_to_logfile_name']).lower() == "true"
+
+            if 'buffered_logging' in data:
+                instance.buffered_logging = str(data['buffered_logging']).lower() == "true"
+
+            if 'log_compression' in data:
+                instance.log_compression = str(data['log_compression']).lower() == "true"
+
+            if 'log_retention_days' in data:
+                instance.log_retention_days = int(data['log_retention_days'])
+
+            if 'scheduler_mode' in data:
+                if data['scheduler_mode'] not in SCHEDULER_MODES:
+                    raise Exception("Invalid scheduler_mode '{0}'! Choose one of these: {1}".format(data['scheduler_mode'], SCHEDULER_MODES))
+                instance.scheduler_mode = data['scheduler_mode']
+
+            if 'scheduler_max_sleep_seconds' in data:
+                instance.scheduler_max_sleep_seconds = int(data['scheduler_max_sleep_seconds'])
+
+            if 'configuration_check_interval_seconds' in data:
+                instance.configuration_check_interval_seconds = int(data['configuration_check_interval_seconds'])
+
+            if 'metrics_address' in data:
+                instance.metrics_address = data['metrics_address']
+
+            if 'metrics_port' in data:
+                instance.metrics_port = int(data['metrics_port'])
+
+            if 'control_socket' in data:
+                instance.control_socket = data['control_socket']
+
+            if 'bp_prestage_command' in data:
+                instance.bp_prestage_command = data['bp_prestage_command']
+
+            if 'map_prestage_command' in data:
+                instance.map_prestage_command = data['map_prestage_command']
+
+            if 'prestage_lead_minutes' in data:
+                instance.prestage_lead_minutes = int(data['prestage_lead_minutes'])
+
+            if 'wipe_early_start' in data:
+                instance.wipe_early_start = str(data['wipe_early_start']).lower() == "true"
+
+            if 'wipe_duration_percentile' in data:
+                instance.wipe_duration_percentile = int(data['wipe_duration_percentile'])
+                if not 1 <= instance.wipe_duration_percentile <= 100:
+                    raise Exception("wipe_duration_percentile has to be between 1 and 100!")
+
+            if 'wipe_early_start_margin_seconds' in data:
+                instance.wipe_early_start_margin_seconds = int(data['wipe_early_start_margin_seconds'])
+
+            if 'wipe_early_start_fallback_seconds' in data:
+                instance.wipe_early_start_fallback_seconds = int(data['wipe_early_start_fallback_seconds'])
+
+            if 'wipe_command_timeout_seconds' in data:
+                instance.wipe_command_timeout_seconds = int(data['wipe_command_timeout_seconds'])
+
+            if 'wipe_command_output_timeout_seconds' in data:
+                instance.wipe_command_output_timeout_seconds = int(data['wipe_command_output_timeout_seconds'])
+
+            if 'wipe_command_output_mode' in data:
+                if data['wipe_command_output_mode'] not in WIPE_COMMAND_OUTPUT_MODES:
+                    raise Exception("Invalid wipe_command_output_mode '{0}'! Choose one of these: {1}".format(data['wipe_command_output_mode'], WIPE_COMMAND_OUTPUT_MODES))
+                instance.wipe_command_output_mode = data['wipe_command_output_mode']
+
+            if 'wipe_command_output_buffer_kb' in data:
+                instance.wipe_command_output_buffer_kb = int(data['wipe_command_output_buffer_kb'])
+
+            if 'cgroup_parent' in data:
+                instance.cgroup_parent = data['cgroup_parent']
+
+        __compile_wipe_rules(instance)
+        instance.configuration_path = configuration_location
 
     except Exception as ex:
         raise Exception("Error while loading configuration file '{0}'! Error Message: '{1}'".format(configuration_location, str(ex)))
 
-def __parse_args():
-    global bp_wipe_days
-    global map_wipe_days
-    global bp_wipe_time
-    global map_wipe_time
-    global bp_wipe_types
-    global map_wipe_types
-    global first_bp_wipe_date
-    global first_map_wipe_date
-    global configuration_path
-
-    global wipe_check_interval_seconds
-    global date_parse_format
-    global bp_wipe_command
-    global map_wipe_command
-    global log_file_location
-    global log_level
-    global time_zone
-    global wipe_command_retries_on_fail
+    return instance
+
+def __compile_wipe_rules(instance):
+    '''
+        Validates the bp and map wipe configuration of instance and compiles it into its WipeRules.
+    '''
+    instance.bp_wipe_rule = __compile_wipe_rule("bp", instance.bp_wipe_schedule, instance.bp_wipe_types, instance.bp_wipe_days, instance.bp_wipe_time, instance.first_bp_wipe_date)
+    instance.map_wipe_rule = __compile_wipe_rule("map", instance.map_wipe_schedule, instance.map_wipe_types, instance.map_wipe_days, instance.map_wipe_time, instance.first_map_wipe_date)
+
+def __compile_wipe_rule(wipe_kind, wipe_schedule, wipe_types, wipe_days, wipe_time, first_wipe_date):
+    if wipe_time is not None or wipe_schedule is None:
+        try:
+            if len(wipe_time) != 4:
+                raise ValueError()
+            dt.strptime(wipe_time, "%H%M")
+        except (TypeError, ValueError):
+            raise Exception("Invalid {0}_wipe_time '{1}'! Expected format 'HHMM'.".format(wipe_kind, wipe_time))
+
+    if wipe_schedule is not None:
+        try:
+            return compile_wipe_schedule(wipe_schedule, wipe_time, first_wipe_date)
+        except Exception as ex:
+            raise Exception("Invalid {0}_wipe_schedule '{1}'! {2}".format(wipe_kind, wipe_schedule, ex))
+
+    if not wipe_days or any(day < 1 or day > 7 for day in wipe_days):
+        raise Exception("Invalid {0}_wipe_days '{1}'! Expected days between 1 = Monday and 7 = Sunday.".format(wipe_kind, wipe_days))
+    if not wipe_types or any(wipe_type < 1 or wipe_type > 7 for wipe_type in wipe_types):
+        raise Exception("Invalid {0}_wipe_types '{1}'! Expected types between 1 and 7.".format(wipe_kind, wipe_types))
+    return compile_wipe_types(wipe_types, wipe_days, wipe_time, first_wipe_date)
+
+def get_configuration_stat(configuration_location):
+    try:
+        stat = os.stat(configuration_location)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+def reload_configuration(instance):
+    '''
+        Loads the configuration file of instance into a new WipeInstance, if the file changed since it was loaded.
+        Returns None if it did not change and raises an Exception if the changed file is invalid.
+    '''
+    configuration_stat = get_configuration_stat(instance.configuration_path)
+    if configuration_stat == instance.configuration_stat:
+        return None
+    # a rejected change is only reported once, the next edit is checked again
+    instance.configuration_stat = configuration_stat
+    return __load_configuration(instance.configuration_path, __new_instance(instance.name, instance.fleet_directory))
+
+def __new_instance(name, fleet_directory=None):
+    instance = WipeInstance(name)
+    if fleet_directory is not None:
+        instance.fleet_directory = fleet_directory
+        # each server logs into its own file unless the configuration says otherwise
+        instance.log_file_location = os.path.join(fleet_directory, "{0}.log".format(name))
+        instance.wipe_journal_location = os.path.join(fleet_directory, "{0}.journal".format(name))
+        instance.snapshot_location = os.path.join(fleet_directory, "{0}.snapshots".format(name))
+    return instance
+
+def __load_fleet(fleet_directory):
+    '''
+        Loads every *.json configuration in fleet_directory as its own WipeInstance, named after the file.
+    '''
+    if not os.path.isdir(fleet_directory):
+        raise FileNotFoundError("Fleet directory '{0}' does not exist!".format(fleet_directory))
+
+    instances = []
+    for file_name in sorted(os.listdir(fleet_directory)):
+        if not file_name.endswith(".json"):
+            continue
+        instance = __new_instance(os.path.splitext(file_name)[0], fleet_directory)
+        instances.append(__load_configuration(os.path.join(fleet_directory, file_name), instance))
 
+    if not instances:
+        raise Exception("No configuration files found in fleet directory '{0}'!".format(fleet_directory))
+    return instances
+
+def __parse_args():
+    # only needed when started as a script, not by the backtest or benchmark imports
+    import argparse
     try:
 
         parser = argparse.ArgumentParser(description="Available Arguments:".format(VERSION_STRING))
@@ -183,17 +1271,64 @@ def __parse_args():
         req.add_argument('--map-wipe-types', nargs='+', type=int, choices=range(1, 8), help="List of wipe types used to check for map wipes.")
         req.add_argument('--first-bp-wipe', type=str, help="Date of first blueprint wipe in format requarding to date_format. See optional argument 'date-format'.")
         req.add_argument('--first-map-wipe', type=str, help="Date of first map wipe in format requarding to date_format. See optional argument 'date-format'.")
+        req.add_argument('--bp-wipe-schedule', type=str, help="Cron expression or RRULE, that replaces the blueprint wipe days, types and first wipe.")
+        req.add_argument('--map-wipe-schedule', type=str, help="Cron expression or RRULE, that replaces the map wipe days, types and first wipe.")
 
         opt = parser.add_argument_group("Optional Arguments")
         opt.add_argument('-c', '--configuration', type=str, help="Sets location of autowipe script configuration. If argument is present, any other given argument is ignored.")
+        opt.add_argument('--fleet', type=str, help="Directory of configuration files, one per server, that are all driven by this process. Only the interval, scheduler, log and concurrency arguments are used next to it.")
+        opt.add_argument('--max-concurrent-wipes', type=int, help="Maximum amount of wipe commands running at the same time in fleet mode. Default: {0}".format(max_concurrent_wipes))
         opt.add_argument('-i', '--interval', type=int, help="Wipe check interval in seconds'. Default is {0}".format(wipe_check_interval_seconds))
         opt.add_argument('--date-format', type=str, help="Overwrites the default date format '{0}', that is used to parse dates from arguments.".format(date_parse_format_repstring))
         opt.add_argument('--bp-wipe-command', type=str, help="Overwrites the default blueprint wipe command '{0}'.".format(bp_wipe_command))
         opt.add_argument('--map-wipe-command', type=str, help="Overwrites the default map wipe command '{0}'.".format(map_wipe_command))
+        opt.add_argument('--bp-prestage-command', type=str, help="Command that fetches and verifies updates for a blueprint wipe, while the server is still running.")
+        opt.add_argument('--map-prestage-command', type=str, help="Command that fetches and verifies updates for a map wipe, while the server is still running.")
+        opt.add_argument('--prestage-lead-minutes', type=int, help="Minutes before a wipe, at which the pre-stage command is executed. Default: {0}".format(prestage_lead_minutes))
+        opt.add_argument('--early-start', action='store_true', help="Starts a wipe early by its estimated duration, so it is done at the wipe time.")
+        opt.add_argument('--duration-percentile', type=int, choices=range(1, 101), metavar="1-100", help="Percentile of the recorded wipe durations, that is used as estimate for --early-start. Default: {0}".format(wipe_duration_percentile))
+        opt.add_argument('--early-start-margin', type=int, help="Seconds a wipe starts earlier than estimated with --early-start. Default: {0}".format(wipe_early_start_margin_seconds))
+        opt.add_argument('--early-start-fallback', type=int, help="Seconds a wipe starts early with --early-start, as long as no duration is recorded. Default: {0}".format(wipe_early_start_fallback_seconds))
+        opt.add_argument('--snapshot-directories', nargs='+', type=str, help="Directories, e.g. the save data of the server, that '--snapshot' or snapshot_before_wipe snapshot.")
+        opt.add_argument('--snapshot-location', type=str, help="Directory of the snapshots. Default: '{0}'".format(snapshot_location))
+        opt.add_argument('--snapshot-retention', type=int, help="Amount of snapshots, that are kept. 0 = all. Default: {0}".format(snapshot_retention))
         opt.add_argument('--log-file-location', type=str, help="Overwrites the default logfile location '{0}'.".format(log_file_location))
+        opt.add_argument('--wipe-journal-location', type=str, help="Overwrites the default wipe journal location '{0}'. An empty string disables the journal.".format(wipe_journal_location))
         opt.add_argument('--log-level', type=int, choices=range(1, 7), help="Overwrites the default log level '{0}'.".format(log_level))
+        opt.add_argument('--buffered-logging', action='store_true', help="Writes the log file from a background thread through one open file handle.")
+        opt.add_argument('--log-compression', action='store_true', help="Compresses the daily log files of past days in the background and indexes them for --query-logs.")
+        opt.add_argument('--log-retention-days', type=int, help="Removes daily log files older than this amount of days. 0 = keep all. Default: {0}".format(log_retention_days))
+        opt.add_argument('--query-logs', action='store_true', help="Writes the matching records of the daily log files to stdout and exits. Filters: --query-since, --query-until, --query-level, --query-wipe.")
+        opt.add_argument('--query-since', type=str, help="Only records at or after this date ('YYYY-MM-DD' or 'YYYY-MM-DD HH:MM[:SS]').")
+        opt.add_argument('--query-until', type=str, help="Only records at or before this date ('YYYY-MM-DD' or 'YYYY-MM-DD HH:MM[:SS]').")
+        opt.add_argument('--query-level', type=int, choices=range(1, 7), help="Only records up to this log level, e.g. 2 for FATAL and ERROR.")
+        opt.add_argument('--query-wipe', type=str, choices=list(WIPE_ACTION_KEYS.values()), help="Only records of blueprint (bp) or map wipe runs.")
         opt.add_argument('--time-zone', type=str, help="Default is local timezone. Used to calculate current and future dates")
+        opt.add_argument('--command-timeout', type=int, help="Seconds after which a wipe command and all its child processes are killed. 0 = no timeout. Default: {0}".format(wipe_command_timeout_seconds))
+        opt.add_argument('--output-timeout', type=int, help="Seconds a wipe command may run without writing any output, before it is considered hung and killed. 0 = no timeout. Default: {0}".format(wipe_command_output_timeout_seconds))
+        opt.add_argument('--output-mode', type=str, choices=WIPE_COMMAND_OUTPUT_MODES, help="'stream' logs every output line of a wipe command, 'summary' logs a summary and the buffered output only on failure. Default: {0}".format(wipe_command_output_mode))
         opt.add_argument('--retries', type=int, help="Amount of retries before this script terminates when a wipe command failed. Default: {0}".format(wipe_command_retries_on_fail))
+        opt.add_argument('--retry-delay', type=int, help="Seconds before the first retry of a failed wipe, doubled with every further retry. Default: {0}".format(wipe_retry_delay_seconds))
+        opt.add_argument('--retry-max-delay', type=int, help="Maximum seconds between two retries of a failed wipe. Default: {0}".format(wipe_retry_max_delay_seconds))
+        opt.add_argument('--scheduler-mode', type=str, choices=SCHEDULER_MODES, help="'event' sleeps until the next scheduled wipe, 'poll' checks every interval. Default: {0}".format(scheduler_mode))
+        opt.add_argument('--max-sleep', type=int, help="Maximum seconds the event scheduler sleeps before it checks for clock jumps. Default: {0}".format(scheduler_max_sleep_seconds))
+        opt.add_argument('--config-check-interval', type=int, help="Minimum seconds between checks, if a configuration file changed and has to be reloaded. The event scheduler only checks when it wakes up, at least every --max-sleep seconds. 0 = no reload. Default: {0}".format(configuration_check_interval_seconds))
+        opt.add_argument('--metrics-port', type=int, help="Serves metrics in the Prometheus text format on this port. 0 = disabled. Default: {0}".format(metrics_port))
+        opt.add_argument('--metrics-address', type=str, help="Address the metrics are served on. Default: {0}".format(metrics_address))
+        opt.add_argument('--profile', nargs='*', choices=PROFILE_PARTS, help="Profiles the given parts (default: all) with cProfile and tracemalloc from the start. The files are written next to the log file. SIGUSR1 starts and stops profiling at any time.")
+        opt.add_argument('--check', action='store_true', help="Loads the wipe state, executes a due wipe and exits instead of starting the daemon. For systemd timers and cron.")
+        opt.add_argument('--control-socket', type=str, help="Unix domain socket, on which the daemon answers --control requests. An empty string disables it. Default: '{0}'".format(control_socket))
+        opt.add_argument('--control', type=str, choices=CONTROL_COMMANDS, help="Sends a request to the running daemon, prints the answer as JSON and exits. status/next/config are queries, trigger/skip need --control-wipe and in fleet mode --control-server, pause/resume stop and continue all wipes.")
+        opt.add_argument('--control-server', type=str, help="Server of a --control request in fleet mode. Default: all servers")
+        opt.add_argument('--control-wipe', type=str, choices=list(WIPE_ACTION_KEYS.values()), help="Wipe of a --control trigger or skip request.")
+        opt.add_argument('--snapshot', action='store_true', help="Snapshots the snapshot directories and exits, e.g. as wipe step after the server stopped.")
+        opt.add_argument('--list-snapshots', action='store_true', help="Lists the snapshots and exits.")
+        opt.add_argument('--restore-snapshot', nargs='?', const="latest", metavar="SNAPSHOT", help="Restores the snapshot directories from the given or the latest snapshot and exits. The server has to be stopped. In fleet mode 'SERVER/SNAPSHOT' restores only one server.")
+        opt.add_argument('--check-readiness', action='store_true', help="Runs the readiness probes once, prints how long the server needed to be ready and exits.")
+        opt.add_argument('--readiness-timeout', type=int, help="Seconds a server has after a wipe to pass the readiness probes, before the wipe failed. Default: {0}".format(readiness_timeout_seconds))
+        opt.add_argument('--backtest', nargs=2, type=str, metavar=('START', 'END'), help="Writes every wipe between the dates START and END (format see 'date-format') and exits instead of starting the daemon. Needs numpy.")
+        opt.add_argument('--backtest-format', type=str, choices=BACKTEST_FORMATS, default="csv", help="Output format of --backtest. Default: csv")
+        opt.add_argument('--backtest-output', type=str, help="File --backtest writes to. Default: stdout")
 
         args = parser.parse_args()
 
@@ -201,313 +1336,929 @@ def __parse_args():
         log(str(ex), LogLevel.ERROR)
         exit(rc.EXIT_ARGUMENT_ERROR)
 
+    if args.fleet:
+        return args, __load_fleet(args.fleet)
+
+    instance = WipeInstance()
+
     if args.configuration:
-        __load_configuration(args.configuration)
-        return
+        return args, [__load_configuration(args.configuration, instance)]
 
     # check first dateformat!!! so we can parse dates in correct way
     if args.date_format:
-        date_parse_format = args.date_format
+        instance.date_parse_format = args.date_format
 
     #req args if config path not present
-    bp_wipe_days = args.bp_wipe_days
-    map_wipe_days = args.map_wipe_days
-    bp_wipe_time = args.bp_wipe_time
-    map_wipe_time = args.map_wipe_time
-    bp_wipe_types = args.bp_wipe_types
-    map_wipe_types = args.map_wipe_types
-    first_bp_wipe_date = dt.strptime(args.first_bp_wipe, date_parse_format).date()
-    first_map_wipe_date = dt.strptime(args.first_map_wipe, date_parse_format).date()
+    instance.bp_wipe_days = args.bp_wipe_days
+    instance.map_wipe_days = args.map_wipe_days
+    instance.bp_wipe_time = args.bp_wipe_time
+    instance.map_wipe_time = args.map_wipe_time
+    instance.bp_wipe_types = args.bp_wipe_types
+    instance.map_wipe_types = args.map_wipe_types
+    instance.bp_wipe_schedule = args.bp_wipe_schedule
+    instance.map_wipe_schedule = args.map_wipe_schedule
+    if args.first_bp_wipe or args.bp_wipe_schedule is None:
+        instance.first_bp_wipe_date = dt.strptime(args.first_bp_wipe, instance.date_parse_format).date()
+    if args.first_map_wipe or args.map_wipe_schedule is None:
+        instance.first_map_wipe_date = dt.strptime(args.first_map_wipe, instance.date_parse_format).date()
+    __compile_wipe_rules(instance)
 
 
     #opt args if config path is not present
     if args.interval:
         if args.interval > 5:
-            wipe_check_interval_seconds = args.interval
+            instance.wipe_check_interval_seconds = args.interval
         else:
             raise ValueError("Value of paramter --interval is below 5!")
     
     
     
     if args.bp_wipe_command:
-        bp_wipe_command = args.bp_wipe_command
+        instance.bp_wipe_command = args.bp_wipe_command
 
     if args.map_wipe_command:
-        map_wipe_command = args.map_wipe_command
+        instance.map_wipe_command = args.map_wipe_command
+
+    if args.bp_prestage_command:
+        instance.bp_prestage_command = args.bp_prestage_command
+
+    if args.map_prestage_command:
+        instance.map_prestage_command = args.map_prestage_command
+
+    if args.prestage_lead_minutes:
+        instance.prestage_lead_minutes = args.prestage_lead_minutes
+
+    if args.early_start:
+        instance.wipe_early_start = True
+
+    if args.duration_percentile:
+        instance.wipe_duration_percentile = args.duration_percentile
+
+    if args.early_start_margin is not None:
+        instance.wipe_early_start_margin_seconds = args.early_start_margin
+
+    if args.early_start_fallback is not None:
+        instance.wipe_early_start_fallback_seconds = args.early_start_fallback
+
+    if args.snapshot_directories:
+        instance.snapshot_directories = args.snapshot_directories
+
+    if args.snapshot_location:
+        instance.snapshot_location = args.snapshot_location
+
+    if args.snapshot_retention is not None:
+        instance.snapshot_retention = args.snapshot_retention
+
+    if args.readiness_timeout is not None:
+        instance.readiness_timeout_seconds = args.readiness_timeout
 
     if args.log_file_location:
         if os.path.exists(args.log_file_location):
-            log_file_location = args.log_file_location
+            instance.log_file_location = args.log_file_location
         else:
             raise FileNotFoundError("log_file_location '{0}' does not exist!".format(args.log_file_location))
 
     if args.log_level:
-        log_level = args.log_level
+        instance.log_level = args.log_level
+
+    if args.wipe_journal_location is not None:
+        instance.wipe_journal_location = args.wipe_journal_location
+
+    if args.buffered_logging:
+        instance.buffered_logging = True
+
+    if args.log_compression:
+        instance.log_compression = True
+
+    if args.log_retention_days is not None:
+        instance.log_retention_days = args.log_retention_days
 
     if args.time_zone:
         try:
-            time_zone=pytz.timezone(args.time_zone)
+            instance.time_zone=get_time_zone(args.time_zone)
         except Exception:
-            log("Invalid timezone: '{0}'! Using local timezone '{1}' instead.".format(args.time_zone, LOCAL_TIMEZONE), LogLevel.WARN)
-            time_zone=LOCAL_TIMEZONE
+            log("Invalid timezone: '{0}'! Using local timezone '{1}' instead.".format(args.time_zone, get_local_time_zone()), LogLevel.WARN)
+            instance.time_zone=get_local_time_zone()
     else:
-        time_zone=LOCAL_TIMEZONE
+        instance.time_zone=get_local_time_zone()
 
 
     if args.retries:
         if args.retries:
-            wipe_command_retries_on_fail = args.retries
+            instance.wipe_command_retries_on_fail = args.retries
+
+    if args.retry_delay is not None:
+        instance.wipe_retry_delay_seconds = args.retry_delay
+
+    if args.retry_max_delay is not None:
+        instance.wipe_retry_max_delay_seconds = args.retry_max_delay
+
+    if args.command_timeout:
+        instance.wipe_command_timeout_seconds = args.command_timeout
+
+    if args.output_timeout:
+        instance.wipe_command_output_timeout_seconds = args.output_timeout
+
+    if args.output_mode:
+        instance.wipe_command_output_mode = args.output_mode
+
+    if args.scheduler_mode:
+        instance.scheduler_mode = args.scheduler_mode
+
+    if args.max_sleep:
+        instance.scheduler_max_sleep_seconds = args.max_sleep
+
+    if args.metrics_port is not None:
+        instance.metrics_port = args.metrics_port
+
+    if args.metrics_address:
+        instance.metrics_address = args.metrics_address
+
+    if args.control_socket is not None:
+        instance.control_socket = args.control_socket
 
-def print_current_vars():
+    return args, [instance]
+
+def print_current_vars(instance):
 
     log("", LogLevel.TRACE)
     log("# CURRENT VARS #", LogLevel.TRACE)
 
     log("VERSION_STRING: '{0}'".format(VERSION_STRING), LogLevel.TRACE)
     log("SCRIPT_DIR: '{0}'".format(SCRIPT_DIR), LogLevel.TRACE)
-
-
-    log("wipe_check_interval_seconds: '{0}'".format(wipe_check_interval_seconds), LogLevel.TRACE)
-    log("time_zone: '{0}'".format(time_zone), LogLevel.TRACE)
-    log("date_parse_format: '{0}'".format(date_parse_format), LogLevel.TRACE)
+    log("name: '{0}'".format(instance.name), LogLevel.TRACE)
+
+
+    log("wipe_check_interval_seconds: '{0}'".format(instance.wipe_check_interval_seconds), LogLevel.TRACE)
+    log("scheduler_mode: '{0}'".format(instance.scheduler_mode), LogLevel.TRACE)
+    log("scheduler_max_sleep_seconds: '{0}'".format(instance.scheduler_max_sleep_seconds), LogLevel.TRACE)
+    log("configuration_check_interval_seconds: '{0}'".format(instance.configuration_check_interval_seconds), LogLevel.TRACE)
+    log("metrics_address: '{0}'".format(instance.metrics_address), LogLevel.TRACE)
+    log("metrics_port: '{0}'".format(instance.metrics_port), LogLevel.TRACE)
+    log("control_socket: '{0}'".format(instance.control_socket), LogLevel.TRACE)
+    log("time_zone: '{0}'".format(instance.time_zone), LogLevel.TRACE)
+    log("date_parse_format: '{0}'".format(instance.date_parse_format), LogLevel.TRACE)
     log("date_parse_format_repstring: '{0}'".format(date_parse_format_repstring), LogLevel.TRACE)
-    log("bp_wipe_command: '{0}'".format(bp_wipe_command), LogLevel.TRACE)
-    log("map_wipe_command: '{0}'".format(map_wipe_command), LogLevel.TRACE)
-    log("log_file_location: '{0}'".format(log_file_location), LogLevel.TRACE)
-    log("bp_wipe_days: '{0}'".format(bp_wipe_days), LogLevel.TRACE)
-    log("map_wipe_days: '{0}'".format(map_wipe_days), LogLevel.TRACE)
-    log("bp_wipe_time: '{0}'".format(bp_wipe_time), LogLevel.TRACE)
-    log("map_wipe_time: '{0}'".format(map_wipe_time), LogLevel.TRACE)
-    log("bp_wipe_types: '{0}'".format(bp_wipe_types), LogLevel.TRACE)
-    log("map_wipe_types: '{0}'".format(map_wipe_types), LogLevel.TRACE)
-    log("first_bp_wipe_date: '{0}'".format(first_bp_wipe_date), LogLevel.TRACE)
-    log("first_map_wipe_date: '{0}'".format(first_map_wipe_date), LogLevel.TRACE)
-    log("log_level: '{0}'".format(log_level), LogLevel.TRACE)
+    log("bp_wipe_command: '{0}'".format(instance.bp_wipe_command), LogLevel.TRACE)
+    log("map_wipe_command: '{0}'".format(instance.map_wipe_command), LogLevel.TRACE)
+    log("bp_wipe_steps: '{0}'".format(instance.bp_wipe_steps), LogLevel.TRACE)
+    log("map_wipe_steps: '{0}'".format(instance.map_wipe_steps), LogLevel.TRACE)
+    log("wipe_step_concurrency: '{0}'".format(instance.wipe_step_concurrency), LogLevel.TRACE)
+    log("wipe_retry_delay_seconds: '{0}'".format(instance.wipe_retry_delay_seconds), LogLevel.TRACE)
+    log("wipe_retry_max_delay_seconds: '{0}'".format(instance.wipe_retry_max_delay_seconds), LogLevel.TRACE)
+    log("wipe_retry_jitter: '{0}'".format(instance.wipe_retry_jitter), LogLevel.TRACE)
+    log("snapshot_directories: '{0}'".format(instance.snapshot_directories), LogLevel.TRACE)
+    log("snapshot_location: '{0}'".format(instance.snapshot_location), LogLevel.TRACE)
+    log("snapshot_before_wipe: '{0}'".format(instance.snapshot_before_wipe), LogLevel.TRACE)
+    log("snapshot_retention: '{0}'".format(instance.snapshot_retention), LogLevel.TRACE)
+    log("snapshot_method: '{0}'".format(instance.snapshot_method), LogLevel.TRACE)
+    log("snapshot_copy_threads: '{0}'".format(instance.snapshot_copy_threads), LogLevel.TRACE)
+    log("readiness_probes: '{0}'".format(instance.readiness_probes), LogLevel.TRACE)
+    log("readiness_timeout_seconds: '{0}'".format(instance.readiness_timeout_seconds), LogLevel.TRACE)
+    log("readiness_interval_seconds: '{0}'".format(instance.readiness_interval_seconds), LogLevel.TRACE)
+    log("lease_location: '{0}'".format(instance.lease_location), LogLevel.TRACE)
+    log("lease_backend: '{0}'".format(instance.lease_backend), LogLevel.TRACE)
+    log("lease_ttl_seconds: '{0}'".format(instance.lease_ttl_seconds), LogLevel.TRACE)
+    log("lease_holder: '{0}'".format(instance.lease_holder), LogLevel.TRACE)
+    log("bp_prestage_command: '{0}'".format(instance.bp_prestage_command), LogLevel.TRACE)
+    log("map_prestage_command: '{0}'".format(instance.map_prestage_command), LogLevel.TRACE)
+    log("prestage_lead_minutes: '{0}'".format(instance.prestage_lead_minutes), LogLevel.TRACE)
+    log("wipe_early_start: '{0}'".format(instance.wipe_early_start), LogLevel.TRACE)
+    log("wipe_duration_percentile: '{0}'".format(instance.wipe_duration_percentile), LogLevel.TRACE)
+    log("wipe_early_start_margin_seconds: '{0}'".format(instance.wipe_early_start_margin_seconds), LogLevel.TRACE)
+    log("wipe_early_start_fallback_seconds: '{0}'".format(instance.wipe_early_start_fallback_seconds), LogLevel.TRACE)
+    log("wipe_command_timeout_seconds: '{0}'".format(instance.wipe_command_timeout_seconds), LogLevel.TRACE)
+    log("wipe_command_output_timeout_seconds: '{0}'".format(instance.wipe_command_output_timeout_seconds), LogLevel.TRACE)
+    log("wipe_command_output_mode: '{0}'".format(instance.wipe_command_output_mode), LogLevel.TRACE)
+    log("wipe_command_output_buffer_kb: '{0}'".format(instance.wipe_command_output_buffer_kb), LogLevel.TRACE)
+    log("cgroup_parent: '{0}'".format(instance.cgroup_parent), LogLevel.TRACE)
+    log("log_file_location: '{0}'".format(instance.log_file_location), LogLevel.TRACE)
+    log("wipe_journal_location: '{0}'".format(instance.wipe_journal_location), LogLevel.TRACE)
+    log("bp_wipe_days: '{0}'".format(instance.bp_wipe_days), LogLevel.TRACE)
+    log("map_wipe_days: '{0}'".format(instance.map_wipe_days), LogLevel.TRACE)
+    log("bp_wipe_time: '{0}'".format(instance.bp_wipe_time), LogLevel.TRACE)
+    log("map_wipe_time: '{0}'".format(instance.map_wipe_time), LogLevel.TRACE)
+    log("bp_wipe_types: '{0}'".format(instance.bp_wipe_types), LogLevel.TRACE)
+    log("map_wipe_types: '{0}'".format(instance.map_wipe_types), LogLevel.TRACE)
+    log("first_bp_wipe_date: '{0}'".format(instance.first_bp_wipe_date), LogLevel.TRACE)
+    log("first_map_wipe_date: '{0}'".format(instance.first_map_wipe_date), LogLevel.TRACE)
+    log("bp_wipe_schedule: '{0}'".format(instance.bp_wipe_schedule), LogLevel.TRACE)
+    log("map_wipe_schedule: '{0}'".format(instance.map_wipe_schedule), LogLevel.TRACE)
+    log("log_level: '{0}'".format(instance.log_level), LogLevel.TRACE)
+    log("buffered_logging: '{0}'".format(instance.buffered_logging), LogLevel.TRACE)
+    log("log_compression: '{0}'".format(instance.log_compression), LogLevel.TRACE)
+    log("log_retention_days: '{0}'".format(instance.log_retention_days), LogLevel.TRACE)
 
     log("##", LogLevel.TRACE)
     log("", LogLevel.TRACE)
 
-def _get_n_weekday(year, month, day_of_week, n): 
-    count = 0 
-    for i in range(1, 32): 
-        try: 
-            d = date(year, month, i) 
-        except ValueError: 
-            break 
-        if d.isoweekday() == day_of_week: 
-            count += 1 
-        if count == n:
-            return d
-    return None
-
-def _get_week_number(date):
-    return ((date - dt(date.year, 1, 1).date()).days // 7) + 1
-
-def check_wipe_by_type(wipe_type, wipe_days, wipe_time, first_wipe_date, last_wipe_date, time_zone, current_date=None, current_time=None):
-    log("check_wipe_by_type()", LogLevel.TRACE)
-
-    if current_date is None:
-        current_date = dt.now(time_zone).date()
-    if current_time is None:
-        current_time = dt.now(time_zone).strftime("%H%M")
-    first_date_of_month=dt(current_date.year, current_date.month, 1).date()
-
-    log("current_date: {0}".format(current_date), log_level=LogLevel.TRACE)
-    log("current_time: {0}".format(current_time), log_level=LogLevel.TRACE)
-    log("first_wipe_date: {0}".format(first_wipe_date), log_level=LogLevel.TRACE)
-    log("last_wipe_date: {0}".format(last_wipe_date), log_level=LogLevel.TRACE)
-    log("first_date_of_month: {0}".format(first_date_of_month), log_level=LogLevel.TRACE)
-
-    # first check if we already wiped today!
-    if current_date == last_wipe_date:
-        log("HIT current_date == last_wipe_date", LogLevel.TRACE)
-        return False
-    # next check if first wipe day is in future!
-    if first_wipe_date > current_date:
-        log("HIT first_wipe_date > current_date", LogLevel.TRACE)
-        return False
-    # check if its the right time to wipe!
-    if wipe_time > current_time:
-        log("HIT wipe_time > current_time", LogLevel.TRACE)
-        return False
-    # check if current date is first wipe day
-    if current_date == first_wipe_date:
-        log("HIT current_date == first_wipe_date", LogLevel.TRACE)
-        return True
+@lru_cache(maxsize=None)
+def get_time_zone(time_zone_name):
+    '''
+        Returns the tzinfo of a time zone name like 'CET' or 'Europe/Berlin'. Uses the stdlib zoneinfo and only falls
+        back to pytz, if zoneinfo or its time zone database is missing.
+    '''
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(time_zone_name)
+    except (ImportError, LookupError):
+        # pytz ships its own time zone database
+        import pytz
+        return pytz.timezone(time_zone_name)
+
+@lru_cache(maxsize=None)
+def get_local_time_zone():
+    return dt.now().astimezone().tzinfo
+
+def _get_wipe_instant(wipe_date, wipe_time, time_zone):
+    '''
+        Returns the first (aware) instant on wipe_date at which the local time in time_zone reaches wipe_time.
+    '''
+    local_wipe_time = dt.combine(wipe_date, dt.strptime(wipe_time, "%H%M").time())
+    if hasattr(time_zone, 'localize'):
+        # pytz timezone, is_dst=True picks the first occurrence of an ambiguous local time like fold=0 does below
+        wipe_instant = time_zone.localize(local_wipe_time, is_dst=True)
     else:
-        # 1 -> WEEKLY
-        if wipe_type == 1:
-            # we calculate +1 here so we have some day number structure as in params.. 1 = Monday 7 = Sunday. By default weekday() returns in shema 0 = Monday, 6 = Sunday
-            current_day_of_week = current_date.weekday() + 1
-            for day in wipe_days:
-                for i in range(1, 6):
-                    next_date=_get_n_weekday(current_date.year, current_date.month, day, i)
-                    if next_date is not None and next_date == current_date:
-                        log("HIT Type 1 wipe_type: {0} next_wipe_date: {1} current_date: {2} wipe_day: {3}".format(wipe_type, next_date, current_date, day), LogLevel.TRACE)
-                        return True
-        elif wipe_type == 2:            
-            for day in wipe_days:
-                for i in range(1, 6):
-                    next_date=_get_n_weekday(current_date.year, current_date.month, day, i)
-                    if next_date is None:
-                        continue
-                    next_date_week=_get_week_number(next_date)
-                    if last_wipe_date is not None:
-                        last_wipe_week=_get_week_number(last_wipe_date)
+        wipe_instant = local_wipe_time.replace(tzinfo=time_zone)
+
+    # go through UTC, astimezone() would return the instant unchanged, if it already carries time_zone
+    wipe_instant = wipe_instant.astimezone(timezone.utc)
+    if wipe_instant.astimezone(time_zone).replace(tzinfo=None) == local_wipe_time:
+        return wipe_instant
+
+    # the wipe time falls into a DST gap, so the wipe is due at the first instant after the gap
+    search_start = wipe_instant - timedelta(hours=3)
+    lower_seconds = 0
+    upper_seconds = 6 * 3600
+    while (upper_seconds - lower_seconds) > 1:
+        middle_seconds = (lower_seconds + upper_seconds) // 2
+        if (search_start + timedelta(seconds=middle_seconds)).astimezone(time_zone).replace(tzinfo=None) >= local_wipe_time:
+            upper_seconds = middle_seconds
+        else:
+            lower_seconds = middle_seconds
+    return search_start + timedelta(seconds=upper_seconds)
+
+def run_backtest(instances, start_date, end_date, output_format="csv", output=None):
+    '''
+        Writes every wipe, that the daemon executes between start_date and end_date with the configuration of the given
+        instances, as CSV or iCalendar to output (stdout if None). Returns the amount of clashes, days on which a blueprint
+        and a map wipe are due. If the blueprint wipe time is not after the map wipe time, check_if_wipe() returns the blueprint
+        wipe first and the map wipe only runs after it.
+    '''
+    try:
+        # numpy is only needed for the backtest
+        import wipebacktest
+    except ImportError as ex:
+        raise Exception("The backtest needs numpy! Install it with 'pip3 install numpy'. Error Message: '{0}'".format(ex))
+
+    events = []
+    clash_count = 0
+    for instance in instances:
+        # wipe schedules are walked from wipe to wipe by their compiled rule
+        if instance.bp_wipe_schedule is None:
+            bp_wipe_dates = wipebacktest.get_wipe_dates(instance.bp_wipe_types, instance.bp_wipe_days, instance.first_bp_wipe_date, start_date, end_date)
+        else:
+            bp_wipe_dates = wipebacktest.get_rule_wipe_dates(instance.bp_wipe_rule, start_date, end_date)
+        if instance.map_wipe_schedule is None:
+            map_wipe_dates = wipebacktest.get_wipe_dates(instance.map_wipe_types, instance.map_wipe_days, instance.first_map_wipe_date, start_date, end_date)
+        else:
+            map_wipe_dates = wipebacktest.get_rule_wipe_dates(instance.map_wipe_rule, start_date, end_date)
+        clash_dates = set(wipebacktest.to_dates(wipebacktest.get_clash_dates(bp_wipe_dates, map_wipe_dates)))
+        clash_count += len(clash_dates)
+        map_hidden = instance.bp_wipe_rule.wipe_time <= instance.map_wipe_rule.wipe_time
+
+        for wipe_action, wipe_dates, wipe_time in ((WipeAction.BP_WIPE, bp_wipe_dates, instance.bp_wipe_rule.wipe_time), (WipeAction.MAP_WIPE, map_wipe_dates, instance.map_wipe_rule.wipe_time)):
+            for wipe_date in wipebacktest.to_dates(wipe_dates):
+                clash = None
+                if wipe_date in clash_dates:
+                    if wipe_action == WipeAction.MAP_WIPE:
+                        clash = "hidden by blueprint wipe" if map_hidden else "before blueprint wipe on the same day"
                     else:
-                        last_wipe_week=_get_week_number(first_wipe_date)
-
-                    if (next_date_week - last_wipe_week) == 2:
-                        if next_date is not None and next_date == current_date:
-                            log("HIT Type 2 wipe_type: {0} next_wipe_date: {1} current_date: {2} wipe_day: {3} next_wipe_date_week: {4} last_wipe_week: {5}".format(wipe_type, next_date, current_date, day, next_date_week, last_wipe_week), LogLevel.TRACE)
-                            return True
-        # 3-7 .. 1st - 5th Weekday of Month
-        elif wipe_type >= 3 and wipe_type <= 7:
-            for day in wipe_days:
-                
-                if wipe_type == 3:
-                    nth_day = 1
-                elif wipe_type == 4:
-                    nth_day = 2
-                elif wipe_type == 5:
-                    nth_day = 3
-                elif wipe_type == 6:
-                    nth_day = 4
-                elif wipe_type == 7:
-                    nth_day = 5
-                else:
-                    raise Exception("This should never ever happen! Wipe Type unkown!")
+                        clash = "hides map wipe" if map_hidden else "after map wipe on the same day"
+                events.append({
+                    "server": instance.name,
+                    "wipe": WIPE_ACTION_KEYS[wipe_action],
+                    "date": wipe_date,
+                    "instant": _get_wipe_instant(wipe_date, wipe_time, instance.time_zone),
+                    "clash": clash
+                })
+
+    events.sort(key=lambda event: (event["instant"], event["server"], event["wipe"]))
+    if output_format == "ical":
+        wipebacktest.write_ical(events, output or sys.stdout)
+    else:
+        wipebacktest.write_csv(events, output or sys.stdout)
+    return clash_count
 
-                next_wipe_date = _get_n_weekday(current_date.year, current_date.month, day, nth_day)
-                if next_wipe_date is not None and next_wipe_date == current_date:
-                    return True
+def run_wipe_process(wipe_command, logger=None, timeout_seconds=wipe_command_timeout_seconds, output_timeout_seconds=wipe_command_output_timeout_seconds, output_mode=wipe_command_output_mode, output_buffer_kb=wipe_command_output_buffer_kb, metrics_labels=None, output_prefix="", resources=None, cgroup_parent=None, cgroup_name="autowipe"):
+    '''
+        Runs a wipe or pre-stage command and logs its output. Returns True on success and None on failure.
+        metrics_labels (server, wipe, step) records the wall time and exit code in metrics_obj, if the metrics are enabled.
+        output_prefix is put in front of every output line, e.g. to tell parallel wipe steps apart.
+        resources (processlimits.ProcessLimits) are set by wrappers, that exec the command, cpu/io weights in the
+        cgroup cgroup_name below cgroup_parent. The CPU time and block I/O of the command are logged.
+    '''
+    log("~", LogLevel.INFO, logger)
+    log("=====================", LogLevel.INFO, logger)
+    log("Starting Wipe Process..", LogLevel.INFO, logger)
+
+    log("{0}Executing Command: '{1}'".format(output_prefix, wipe_command), LogLevel.INFO, logger)
+
+    on_output_line = None
+    if output_mode == "stream":
+        def on_output_line(line, is_stderr):
+            log("{0}[stderr] {1}".format(output_prefix, line) if is_stderr else output_prefix + line, LogLevel.INFO, logger)
+
+    # asyncio is only imported, once a command has to run
+    from processrunner import run_process, TIMEOUT_COMMAND, TIMEOUT_OUTPUT
+
+    command = wipe_command
+    cgroup_path = None
+    cgroup_usage = None
+    if resources is not None:
+        from processlimits import create_cgroup, get_cgroup_usage
+        if resources.uses_cgroup and not cgroup_parent:
+            log("{0}cpu_weight and io_weight need a cgroup_parent, the command runs without them.".format(output_prefix), LogLevel.WARN, logger)
+        elif resources.uses_cgroup:
+            try:
+                cgroup_path = create_cgroup(cgroup_parent, cgroup_name, resources)
+                cgroup_usage = get_cgroup_usage(cgroup_path)
+            except Exception as ex:
+                log("{0}Failed to create cgroup '{1}' below '{2}', the command runs without it! Error Message: '{3}'".format(output_prefix, cgroup_name, cgroup_parent, ex), LogLevel.WARN, logger)
+                cgroup_path = None
+        try:
+            command = resources.limit_command(wipe_command, cgroup_path, lambda message: log(output_prefix + message, LogLevel.WARN, logger))
+        except Exception as ex:
+            log("{0}Failed to apply the resource settings, the command runs without them! Error Message: '{1}'".format(output_prefix, ex), LogLevel.WARN, logger)
 
+        log("{0}Resource settings: {1}{2}".format(output_prefix, resources, " cgroup={0}".format(cgroup_path) if cgroup_path is not None else ""), LogLevel.INFO, logger)
 
-    return False
+    result = None
+    try:
+        result = run_process(command, timeout_seconds, output_timeout_seconds, output_buffer_kb * 1024, on_output_line)
+        log("{0}ReturnCode: '{1}'".format(output_prefix, result.returncode), logger=logger)
+        _log_resource_usage(result, cgroup_path, cgroup_usage, output_prefix, logger)
+        if metrics_obj is not None and metrics_labels is not None:
+            metrics_obj.observe_command(*metrics_labels, result.duration_seconds, result.returncode)
+
+        if result.timed_out == TIMEOUT_COMMAND:
+            raise Exception("Command did not finish within {0} seconds and got killed!".format(timeout_seconds))
+        if result.timed_out == TIMEOUT_OUTPUT:
+            raise Exception("Command did not write any output for {0} seconds and got killed!".format(output_timeout_seconds))
+        if result.returncode != 0:
+            raise Exception("Command returncode does not equal 0!")
+    except Exception as ex:
+        # in stream mode every line has already been logged
+        if result is not None and output_mode != "stream":
+            log("{0}Last {1} KB of output:\n{2}".format(output_prefix, output_buffer_kb, result.output.get_text()), LogLevel.ERROR, logger)
+        log("{0}Failed while executing Wipe Command '{1}'! Error Message: '{2}'".format(output_prefix, wipe_command, ex), LogLevel.ERROR, logger)
+        return None
+    finally:
+        if cgroup_path is not None:
+            from processlimits import remove_cgroup
+            remove_cgroup(cgroup_path)
 
-def check_if_wipe(bp_wipe_types, map_wipe_types, bp_wipe_days, map_wipe_days, bp_wipe_time, map_wipe_time, first_bp_wipe_date, first_map_wipe_date, last_bp_wipe_date, last_map_wipe_date, time_zone):
-    '''
-        Returns WipeAction Enum Value.
-    '''
-    log("check_if_wipe()", LogLevel.TRACE)
+    if output_mode == "summary":
+        log("{0}Command finished in '{1}' and wrote {2} bytes of output.".format(output_prefix, timedelta(seconds=round(result.duration_seconds)), result.output.total_bytes), LogLevel.INFO, logger)
 
-    #check for bp wipe first!
-    log("Checking for Blueprint Wipes...")
-    for wipe_type in bp_wipe_types:
-        wipe_confirmed = check_wipe_by_type(wipe_type, bp_wipe_days, bp_wipe_time, first_bp_wipe_date, last_bp_wipe_date, time_zone)
-        if (wipe_confirmed):
-            return WipeAction.BP_WIPE
+    log("Wipe Process ended!", LogLevel.INFO, logger)
+    log("=====================", LogLevel.INFO, logger)
+    log("~", LogLevel.INFO, logger)
 
-    #check for map wipe first!
-    log("Checking for Map Wipes...")
-    for wipe_type in map_wipe_types:
-        wipe_confirmed = check_wipe_by_type(wipe_type, map_wipe_days, map_wipe_time, first_map_wipe_date, last_map_wipe_date, time_zone)
-        if (wipe_confirmed):
-            return WipeAction.MAP_WIPE
+    return True
 
-    return WipeAction.NONE
+def _log_resource_usage(result, cgroup_path, cgroup_usage, output_prefix, logger):
+    if cgroup_path is not None:
+        # the cgroup is kept, while a process of an earlier run still lives in it, so only the difference counts
+        from processlimits import get_cgroup_usage
+        try:
+            usage = get_cgroup_usage(cgroup_path)
+            cpu_seconds, read_bytes, write_bytes = (now - before for now, before in zip(usage, cgroup_usage))
+            source = "cgroup"
+        except Exception:
+            cgroup_path = None
+    if cgroup_path is None:
+        cpu_seconds, read_bytes, write_bytes = result.cpu_seconds, result.read_bytes, result.write_bytes
+        # the usage of children is only known for all commands of the daemon together
+        source = "including other commands, that ran at the same time" if result.overlapped else "children, that the command waited for"
+    log("{0}Resource usage: CPU '{1:.1f}s', read '{2:.1f} MB', written '{3:.1f} MB' ({4})".format(output_prefix, cpu_seconds, read_bytes / 1048576, write_bytes / 1048576, source), LogLevel.INFO, logger)
+
+class AutoWipeDaemon(object):
+    '''
+        Drives the wipes of one or more WipeInstances from one shared timer. Wipe commands run in a bounded worker pool,
+        so many servers wiping at the same time do not overload the host.
+    '''
 
-def run_wipe_process(wipe_command):
-    import subprocess
+    def __init__(self, instances, scheduler_mode=scheduler_mode, wipe_check_interval_seconds=wipe_check_interval_seconds, scheduler_max_sleep_seconds=scheduler_max_sleep_seconds, max_concurrent_wipes=1, time_zone=timezone.utc, configuration_check_interval_seconds=configuration_check_interval_seconds):
+        self.instances = OrderedDict((instance.name, instance) for instance in instances)
+        self.scheduler_mode = scheduler_mode
+        self.wipe_check_interval_seconds = wipe_check_interval_seconds
+        self.scheduler_max_sleep_seconds = scheduler_max_sleep_seconds
+        self.max_concurrent_wipes = max_concurrent_wipes
+        self.time_zone = time_zone
+        self.configuration_check_interval_seconds = configuration_check_interval_seconds
+        self._last_configuration_check = monotonic()
+
+        self.scheduler = None
+        self.executor = None
+        # instance name -> ("wipe" or "prestage", WipeAction, unix time of the start)
+        self.running = {}
+        self._completed = queue.Queue()
+        # (function, Future) of control commands, that change the wipe state, run by the daemon thread
+        self._commands = queue.Queue()
+        self._wake_event = threading.Event()
+
+    def run(self):
+        log("AutoWipeDaemon.run() instances: {0} max_concurrent_wipes: {1}".format(list(self.instances.keys()), self.max_concurrent_wipes), LogLevel.TRACE)
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_wipes, thread_name_prefix="wipe") as self.executor:
+            if self.scheduler_mode == "poll":
+                self._run_polling()
+            else:
+                self._run_scheduled()
+
+    def _run_polling(self):
+        log("_run_polling()", LogLevel.TRACE)
+
+        while True:
+            tick = self._start_tick()
+            self._process_completed()
+            self._process_commands()
+            self._reload_configurations()
+            self._check_instances(self.instances.values())
+            self._end_tick(tick)
+
+            self._wake_event.wait(self.wipe_check_interval_seconds)
+            self._wake_event.clear()
+
+    def _run_scheduled(self):
+        log("_run_scheduled()", LogLevel.TRACE)
+
+        # configuration changes are noticed on the wakeups the scheduler has anyway, at least every max_sleep_seconds
+        self.scheduler = WipeScheduler({}, self.time_zone, log, max_sleep_seconds=self.scheduler_max_sleep_seconds)
+        for key in self._get_keys(self.instances.values()):
+            self.scheduler.next_instant_functions[key] = self._get_next_instant_function(key)
+        self.scheduler.rebuild()
+
+        # a tick is everything between two waits of the scheduler
+        tick = self._start_tick()
+        while True:
+            self._process_completed()
+            self._process_commands()
+            self._reload_configurations()
+            self._end_tick(tick)
+            due_keys = self.scheduler.wait()
+            tick = self._start_tick()
+            if not due_keys:
+                continue
+
+            # the scheduler only decides when to look, check_if_wipe() still decides if and what to wipe
+            due_instances = [self.instances[name] for name in OrderedDict.fromkeys(key[0] for key in due_keys)]
+            if not self._check_instances(due_instances):
+                log("Scheduled wipe instant reached, but no wipe is due!", LogLevel.WARN)
+                sleep(1)
+                self.scheduler.reschedule(self._get_keys(due_instances))
+
+    def _start_tick(self):
+        profile_token = None
+        if profiler_obj is not None:
+            # a profiling session is only started or stopped between two ticks
+            profiler_obj.update()
+            profile_token = profiler_obj.start_phase("tick")
+        return monotonic(), profile_token
+
+    def _end_tick(self, tick):
+        tick_started, profile_token = tick
+        if profiler_obj is not None:
+            profiler_obj.end_phase(profile_token)
+        if metrics_obj is not None:
+            metrics_obj.observe_tick(monotonic() - tick_started)
+
+    def collect_metrics(self):
+        '''
+            Yields the metrics of the wipe state, the schedule and the loggers. Called by the metrics server on every
+            scrape, so the daemon loop does not spend any time on them.
+        '''
+        instances = list(self.instances.values())
+        now = dt.now(timezone.utc)
+        next_wipes = []
+        for instance in instances:
+            for wipe_action, wipe in WIPE_ACTION_KEYS.items():
+                wipe_instant = instance.get_next_wipe_instant(wipe_action, now)
+                if wipe_instant is not None:
+                    next_wipes.append(({"server": instance.name, "wipe": wipe}, wipe_instant.timestamp()))
+        yield "autowipe_next_wipe_timestamp_seconds", "gauge", "Unix time of the next scheduled wipe.", next_wipes
+        yield "autowipe_wipe_early_start_seconds", "gauge", "Seconds a wipe starts before its wipe time, the estimated duration plus margin.", [({"server": instance.name, "wipe": wipe}, instance.get_wipe_lead(wipe_action).total_seconds()) for instance in instances for wipe_action, wipe in WIPE_ACTION_KEYS.items()]
+
+        yield "autowipe_wipe_retries", "gauge", "Failed attempts of the current wipe.", [({"server": instance.name, "wipe": wipe}, getattr(instance, "current_{0}_wipe_retries".format(wipe))) for instance in instances for wipe in WIPE_ACTION_KEYS.values()]
+        yield "autowipe_wipe_retry_timestamp_seconds", "gauge", "Unix time of the next attempt of a failed wipe.", [({"server": instance.name, "wipe": WIPE_ACTION_KEYS[wipe_action]}, pending_retry[0].timestamp()) for instance in instances for wipe_action, pending_retry in list(instance.pending_retries.items())]
+        yield "autowipe_wipe_retry_lost_seconds_total", "counter", "Seconds lost by failed wipe attempts and their backoff, counted when a retry succeeds.", [({"server": instance.name, "wipe": WIPE_ACTION_KEYS[wipe_action]}, seconds) for instance in instances for wipe_action, seconds in list(instance.retry_lost_seconds.items())]
+        yield "autowipe_last_wipe_downtime_seconds", "gauge", "Downtime of the last successful wipe.", [({"server": instance.name, "wipe": WIPE_ACTION_KEYS[wipe_action]}, seconds) for instance in instances for wipe_action, seconds in list(instance.last_wipe_downtime_seconds.items())]
+        yield "autowipe_server_failed", "gauge", "1 if a server ran out of retries and is disabled.", [({"server": instance.name}, instance.failed) for instance in instances]
+        yield "autowipe_running_wipes", "gauge", "Wipe and pre-stage commands running right now.", [({}, len(self.running))]
+
+        # in single mode the instance shares the global logger
+        loggers = OrderedDict((id(logger), logger) for logger in [logger_obj] + [instance.logger_obj for instance in instances] if logger is not None)
+        yield "autowipe_log_lines_written_total", "counter", "Log lines written to the log file.", [({"logger": logger.logger_name}, logger.written_lines) for logger in loggers.values()]
+        yield "autowipe_log_write_seconds_total", "counter", "Seconds spent writing log lines to the log file.", [({"logger": logger.logger_name}, logger.write_seconds) for logger in loggers.values()]
+        yield "autowipe_log_queue_depth", "gauge", "Log lines waiting for the buffered log writer.", [({"logger": logger.logger_name}, logger.get_queue_depth()) for logger in loggers.values()]
+
+    def _get_keys(self, instances):
+        '''
+            Returns the scheduler keys of the given instances, (name, WipeAction) for wipes and (name, WipeAction, "prestage") for pre-stages.
+        '''
+        keys = []
+        for instance in instances:
+            for wipe_action in (WipeAction.BP_WIPE, WipeAction.MAP_WIPE):
+                keys.append((instance.name, wipe_action))
+                if instance.get_prestage_command(wipe_action) is not None:
+                    keys.append((instance.name, wipe_action, "prestage"))
+        return keys
+
+    def _get_next_instant_function(self, key):
+        # bind the instance, so the rule always reads its current wipe state
+        instance = self.instances[key[0]]
+        wipe_action = key[1]
+        if len(key) > 2:
+            return lambda now: instance.get_next_prestage_instant(wipe_action, now)
+        return lambda now: instance.get_next_wipe_start_instant(wipe_action, now)
+
+    def _reload_configurations(self):
+        '''
+            Reloads the configuration of every instance, whose file changed, and reschedules only its changed wipe rules.
+            An invalid configuration is rejected and the previous one stays active. A running wipe keeps the
+            configuration it was started with, the change is applied once it finished.
+        '''
+        if self.configuration_check_interval_seconds <= 0 or monotonic() - self._last_configuration_check < self.configuration_check_interval_seconds:
+            return
+        self._last_configuration_check = monotonic()
+
+        for instance in self.instances.values():
+            if instance.configuration_path is None or instance.name in self.running or instance.failed:
+                continue
+            try:
+                configuration = reload_configuration(instance)
+            except Exception as ex:
+                instance.log("Rejected changed configuration, the previous one stays active! {0}".format(ex), LogLevel.ERROR)
+                continue
+            if configuration is None:
+                continue
+
+            old_keys = self._get_keys([instance])
+            changed_wipe_actions = instance.apply_configuration(configuration)
+            instance.log("Reloaded configuration '{0}'. Changed wipe rules: {1}".format(instance.configuration_path, [WIPE_ACTION_KEYS[wipe_action] for wipe_action in changed_wipe_actions]), LogLevel.INFO)
+            if self.scheduler is None:
+                continue
+
+            new_keys = self._get_keys([instance])
+            for key in old_keys:
+                if key not in new_keys:
+                    self.scheduler.remove(key)
+            changed_keys = [key for key in new_keys if key[1] in changed_wipe_actions or key not in old_keys]
+            for key in changed_keys:
+                self.scheduler.next_instant_functions[key] = self._get_next_instant_function(key)
+            self.scheduler.reschedule(changed_keys)
+
+    def _check_instances(self, instances):
+        '''
+            Submits the due wipe or pre-stage of every given instance, that is neither running nor failed. Returns the amount of submitted runs.
+        '''
+        submitted = 0
+        for instance in instances:
+            if instance.name in self.running or instance.failed or instance.paused:
+                continue
+
+            with profile_phase("check", instance.name):
+                wipe_action_to_trigger = instance.check_if_wipe()
+            if wipe_action_to_trigger != WipeAction.NONE:
+                self._submit(instance, instance.execute_wipe_action, wipe_action_to_trigger)
+                submitted += 1
+                continue
+
+            prestage_action = instance.get_due_prestage()
+            if prestage_action != WipeAction.NONE:
+                self._submit(instance, instance.execute_prestage, prestage_action)
+                submitted += 1
+                continue
+
+            instance.log("Any wipes executed!", LogLevel.DEBUG)
+        return submitted
+
+    def _submit(self, instance, function, wipe_action):
+        self.running[instance.name] = ("wipe" if function == instance.execute_wipe_action else "prestage", wipe_action, time())
+        if self.scheduler is not None:
+            self.scheduler.pause(self._get_keys([instance]))
+        future = self.executor.submit(function, wipe_action)
+        future.add_done_callback(lambda future: self._on_wipe_done(instance, future))
+
+    def _on_wipe_done(self, instance, future):
+        # runs in the worker thread, the scheduler is only touched by the daemon thread
+        self._completed.put((instance, future))
+        self.wake()
+
+    def _process_completed(self):
+        while True:
+            try:
+                instance, future = self._completed.get_nowait()
+            except queue.Empty:
+                break
+
+            self.running.pop(instance.name, None)
+            if future.exception() is not None:
+                instance.log("Wipe raised an unexpected error: '{0}'".format(future.exception()), LogLevel.ERROR)
+
+            if instance.failed:
+                if len(self.instances) > 1:
+                    log("Server '{0}' is disabled due to wipe command failure!".format(instance.name), LogLevel.ERROR)
+            elif self.scheduler is not None and not instance.paused:
+                self.scheduler.resume(self._get_keys([instance]))
+
+        if all(instance.failed for instance in self.instances.values()):
+            log("Autowipe failed due to wipe command failure!", LogLevel.ERROR)
+            exit(rc.EXIT_WIPE_FAILED)
+
+    def _process_commands(self):
+        while True:
+            try:
+                function, future = self._commands.get_nowait()
+            except queue.Empty:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function())
+            except Exception as ex:
+                future.set_exception(ex)
+
+    def run_command(self, function, timeout_seconds=5):
+        '''
+            Runs function in the daemon thread between two ticks and returns its result. Called by the control socket,
+            so the wipe state is only changed by the daemon thread.
+        '''
+        from concurrent.futures import Future
+
+        future = Future()
+        self._commands.put((function, future))
+        self.wake()
+        return future.result(timeout_seconds)
+
+    def handle_control_request(self, request):
+        '''
+            Answers a request of the control socket, see CONTROL_COMMANDS. Queries are answered from the in-memory
+            state by the calling thread, commands are run by the daemon thread.
+        '''
+        command = request["command"]
+        if command not in CONTROL_COMMANDS:
+            raise Exception("Unknown command '{0}'! Choose one of these: {1}".format(command, CONTROL_COMMANDS))
+        if request.get("server"):
+            if request["server"] not in self.instances:
+                raise Exception("Unknown server '{0}'! Servers: {1}".format(request["server"], list(self.instances.keys())))
+            instances = [self.instances[request["server"]]]
+        else:
+            instances = list(self.instances.values())
+
+        if command in ("status", "next"):
+            result = []
+            for instance in instances:
+                status = instance.get_status(command == "next")
+                if command == "status":
+                    running = self.running.get(instance.name)
+                    status["running"] = {"run": running[0], "wipe": WIPE_ACTION_KEYS[running[1]], "elapsed_seconds": round(time() - running[2], 1)} if running is not None else None
+                result.append(status)
+            return result
+        if command == "config":
+            return [instance.get_configuration() for instance in instances]
+        if command in ("pause", "resume"):
+            return self.run_command(lambda: [self._set_paused(instance, command == "pause") for instance in instances])
+
+        if len(instances) != 1:
+            raise Exception("Command '{0}' needs a 'server'!".format(command))
+        if request.get("wipe") not in WIPE_ACTIONS_BY_KEY:
+            raise Exception("Command '{0}' needs a 'wipe' out of {1}!".format(command, list(WIPE_ACTIONS_BY_KEY.keys())))
+        return self.run_command(lambda: self._change_wipe(instances[0], command, WIPE_ACTIONS_BY_KEY[request["wipe"]]))
+
+    def _set_paused(self, instance, paused):
+        # a running wipe is not interrupted, the pause takes effect once it finished
+        instance.paused = paused
+        instance.log("{0} by control socket.".format("Paused" if paused else "Resumed"), LogLevel.INFO)
+        if self.scheduler is not None:
+            if paused:
+                self.scheduler.pause(self._get_keys([instance]))
+            elif instance.name not in self.running:
+                self.scheduler.resume(self._get_keys([instance]))
+        return instance.name
+
+    def _change_wipe(self, instance, command, wipe_action):
+        if instance.name in self.running:
+            raise Exception("Server '{0}' is running a {1} right now!".format(instance.name, self.running[instance.name][0]))
+        if command == "trigger":
+            instance.trigger_wipe(wipe_action)
+            result = instance.name
+        else:
+            result = instance.skip_next_wipe(wipe_action)
+        if self.scheduler is not None and not instance.paused:
+            # the keys of a failed server are still paused
+            self.scheduler.resume(self._get_keys([instance]))
+        return result
+
+    def wake(self):
+        self._wake_event.set()
+        if self.scheduler is not None:
+            self.scheduler.wake()
+
+def log(message, log_level=LogLevel.DEBUG, logger=None):
+    if logger is None:
+        logger = logger_obj
+    if logger is not None:
+        logger.log(message, log_level)
+    else:
+        print(message)
 
-    log("~", LogLevel.INFO)
-    log("=====================", LogLevel.INFO)
-    log("Starting Wipe Process..", LogLevel.INFO)
 
-    log("Executing Command: '{0}'".format(wipe_command), LogLevel.INFO)
+def get_logger(logger_name="AutoWipe", log_file_location=None, log_level=LogLevel.INFO, append_date_to_logfile_name=append_date_to_logfile_name, buffered=buffered_logging):
+    logger_obj = SimpleLogger(logger_name, log_file_location, log_level, append_date_to_logfile_name, buffered=buffered)
+    log("created logger!", log_level=LogLevel.TRACE)
+    return logger_obj
 
-    splitted_command = wipe_command.split(' ')
+def run_check(instances):
+    '''
+        One tick of the daemon for cron and systemd timers: executes every wipe, that is due right now, and returns.
+        Pre-stages are skipped, since the pre-staged state would not survive until the next run.
+        Returns rc.EXIT_WIPE_FAILED if a wipe failed, the retry counter is kept in the journal for the next run.
+    '''
+    exit_code = rc.EXIT_NORMAL
+    for instance in instances:
+        if instance.journal is None:
+            instance.log("No wipe journal configured! Without it a wipe is executed again by every check on the wipe day.", LogLevel.WARN)
+        wipe_action_to_trigger = instance.check_if_wipe()
+        if wipe_action_to_trigger == WipeAction.NONE:
+            instance.log("Any wipes executed!", LogLevel.DEBUG)
+
+        # a blueprint wipe can make the map wipe of the same day due
+        while wipe_action_to_trigger != WipeAction.NONE:
+            result = instance.execute_wipe_action(wipe_action_to_trigger)
+            if result is not True:
+                # None: another node holds the wipe lease, the next run checks again
+                if result is False:
+                    exit_code = rc.EXIT_WIPE_FAILED
+                break
+            wipe_action_to_trigger = instance.check_if_wipe()
+    return exit_code
+
+def _parse_query_date(query_date, end_of_day=False):
+    for date_format in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return dt.strptime(query_date, date_format)
+        except ValueError:
+            pass
+    query_datetime = dt.strptime(query_date, "%Y-%m-%d")
+    if end_of_day:
+        return query_datetime + timedelta(days=1, microseconds=-1)
+    return query_datetime
+
+def __query_logs(args, instances):
+    from logarchive import query_logs
 
     try:
-        with subprocess.Popen(splitted_command, stdout=subprocess.PIPE) as process:
-            while True:
-                line = process.stdout.readline()
-                if not line:
-                    break
-                log(line.decode(), LogLevel.INFO)
-        log("ReturnCode: '{0}'".format(process.returncode))
-
-        if process.returncode != 0:
-            raise Exception("Command returncode does not equal 0!")
+        since = _parse_query_date(args.query_since) if args.query_since else None
+        until = _parse_query_date(args.query_until, True) if args.query_until else None
+        log_files = OrderedDict.fromkeys(instance.log_file_location for instance in instances if instance.log_file_location)
+        record_count = 0
+        for log_file in log_files:
+            record_count += query_logs(log_file, since, until, args.query_level, args.query_wipe)
     except Exception as ex:
-        log("Failed while executing Wipe Command '{0}'! Error Message: '{1}'".format(wipe_command, ex), LogLevel.ERROR)
-        return None
+        log("Log query failed! Error Message: '{0}'".format(ex), LogLevel.ERROR)
+        return rc.EXIT_ARGUMENT_ERROR
 
-    log("Wipe Process ended!", LogLevel.INFO)
-    log("=====================", LogLevel.INFO)
-    log("~", LogLevel.INFO)
+    print("Found {0} log record(s).".format(record_count), file=sys.stderr)
+    return rc.EXIT_NORMAL
 
-    return True
-
-def do_run():
-    global last_bp_wipe_date
-    global last_map_wipe_date
-    global current_bp_wipe_retries
-    global current_map_wipe_retries
+def __snapshots(args, instances):
+    from wipesnapshot import list_snapshots, load_manifest, restore_snapshot
 
-    log("do_run()", LogLevel.TRACE)
+    instances = [instance for instance in instances if instance.snapshot_directories]
+    if not instances:
+        log("No snapshot_directories configured!", LogLevel.ERROR)
+        return rc.EXIT_ARGUMENT_ERROR
 
-    while True:
-        wipe_action_to_trigger = check_if_wipe(bp_wipe_types, map_wipe_types, bp_wipe_days, map_wipe_days, bp_wipe_time, map_wipe_time, first_bp_wipe_date, first_map_wipe_date, last_bp_wipe_date, last_map_wipe_date, time_zone)
+    exit_code = rc.EXIT_NORMAL
+    for instance in instances:
+        if args.snapshot:
+            if instance.take_snapshot() is not True:
+                exit_code = rc.EXIT_WIPE_FAILED
 
-        if wipe_action_to_trigger == WipeAction.BP_WIPE:
-            if current_bp_wipe_retries > 0:
-                log("Execuing Blueprint Wipe! Retry: {0}".format(current_bp_wipe_retries), LogLevel.INFO)
-            else:
-                log("Execuing Blueprint Wipe!", LogLevel.INFO)
-            if run_wipe_process(bp_wipe_command) is True:
-                current_bp_wipe_retries=0
-                last_bp_wipe_date=dt.now(time_zone).date()
-            else:
-                log("Blueprint Wipe Failed!", LogLevel.WARN)
-                current_bp_wipe_retries+=1
-                if wipe_command_retries_on_fail == -1 or wipe_command_retries_on_fail >= current_bp_wipe_retries:
-                    log("Continue..", LogLevel.INFO)
-                    continue
-                else:
-                    log("Autowipe failed due to wipe command failure!", LogLevel.ERROR)
-                    exit(rc.EXIT_WIPE_FAILED)
+        elif args.list_snapshots:
+            for snapshot_path in list_snapshots(instance.snapshot_location):
+                manifest = load_manifest(snapshot_path)
+                print("{0}\t{1}\t{2} files\t{3}".format(instance.name, os.path.basename(snapshot_path), len(manifest["files"]), ", ".join(manifest["directories"].values())))
 
+        else:
+            server_name, _, snapshot_name = args.restore_snapshot.rpartition("/")
+            if server_name and server_name != instance.name:
+                continue
+            snapshots = list_snapshots(instance.snapshot_location)
+            if snapshot_name != "latest":
+                snapshots = [snapshot_path for snapshot_path in snapshots if os.path.basename(snapshot_path) == snapshot_name]
+            if not snapshots:
+                log("Snapshot '{0}' not found in '{1}'!".format(snapshot_name, instance.snapshot_location), LogLevel.ERROR)
+                exit_code = rc.EXIT_ARGUMENT_ERROR
+                continue
+            try:
+                restore_snapshot(snapshots[-1], instance.snapshot_copy_threads, lambda message: log(message, LogLevel.INFO))
+            except Exception as ex:
+                log("Failed to restore snapshot '{0}'! Error Message: '{1}'".format(snapshots[-1], ex), LogLevel.ERROR)
+                exit_code = rc.EXIT_WIPE_FAILED
+    return exit_code
+
+def __readiness(args, instances):
+    instances = [instance for instance in instances if instance.readiness_probes]
+    if not instances:
+        log("No readiness_probes configured!", LogLevel.ERROR)
+        return rc.EXIT_ARGUMENT_ERROR
+
+    exit_code = rc.EXIT_NORMAL
+    for instance in instances:
+        if instance.wait_until_ready() is not True:
+            exit_code = rc.EXIT_WIPE_FAILED
+    return exit_code
+
+def __control(args, instances):
+    from wipecontrol import send_request
+
+    socket_path = (args.control_socket if args.control_socket is not None else control_socket) if args.fleet else instances[0].control_socket
+    request = {"command": args.control}
+    if args.control_server:
+        request["server"] = args.control_server
+    if args.control_wipe:
+        request["wipe"] = args.control_wipe
+    try:
+        result = send_request(socket_path, request)
+    except Exception as ex:
+        log("Control request '{0}' failed! Error Message: '{1}'".format(args.control, ex), LogLevel.ERROR)
+        return rc.EXIT_ARGUMENT_ERROR
+    print(json.dumps(result, indent=2))
+    return rc.EXIT_NORMAL
 
-        elif wipe_action_to_trigger == WipeAction.MAP_WIPE:
-            if current_map_wipe_retries > 0:
-                log("Execuing Map Wipe! Retry: {0}".format(current_map_wipe_retries), LogLevel.INFO)
-            else:
-                log("Execuing Map Wipe!", LogLevel.INFO)
-            if run_wipe_process(map_wipe_command) is True:
-                current_map_wipe_retries=0
-                last_map_wipe_date=dt.now(time_zone).date()
-            else:
-                log("Map Wipe Failed!", LogLevel.WARN)
-                current_map_wipe_retries+=1
-                if wipe_command_retries_on_fail == -1 or wipe_command_retries_on_fail >= current_map_wipe_retries:
-                    log("Continue..", LogLevel.INFO)
-                    continue
-                else:
-                    log("Autowipe failed due to wipe command failure!", LogLevel.ERROR)
-                    exit(rc.EXIT_WIPE_FAILED)
+def __backtest(args, instances):
+    try:
+        start_date, end_date = [dt.strptime(backtest_date, instances[0].date_parse_format).date() for backtest_date in args.backtest]
+        if args.backtest_output:
+            with open(args.backtest_output, 'w', newline='') as output:
+                clash_count = run_backtest(instances, start_date, end_date, args.backtest_format, output)
         else:
-            log("Any wipes executed!", LogLevel.DEBUG)
+            clash_count = run_backtest(instances, start_date, end_date, args.backtest_format)
+    except Exception as ex:
+        log("Backtest failed! Error Message: '{0}'".format(ex), LogLevel.ERROR)
+        return rc.EXIT_ARGUMENT_ERROR
 
-        sleep(wipe_check_interval_seconds)
+    # stdout may carry the backtest itself
+    print("Backtest from '{0}' to '{1}' found {2} clash(es).".format(start_date, end_date, clash_count), file=sys.stderr)
+    return rc.EXIT_NORMAL
 
-def log(message, log_level=LogLevel.DEBUG):
-    if logger_obj is not None:
-        logger_obj.log(message, log_level)
-    else:
-        print(message)
+def profile_phase(part, name=None):
+    '''
+        Returns a context manager, that profiles part (see PROFILE_PARTS in wipeprofiler) while a profiling session is active.
+    '''
+    if profiler_obj is None or not profiler_obj.active:
+        return nullcontext()
+    return profiler_obj.phase(part, name)
 
+def start_profiler(log_file_location, parts=None, profile_now=False):
+    '''
+        Creates profiler_obj, that writes next to log_file_location, and lets SIGUSR1 start and stop a profiling session.
+    '''
+    global profiler_obj
+    import signal
+    from wipeprofiler import WipeProfiler, PROFILE_PARTS
 
-def get_logger(logger_name="AutoWipe", log_file_location=None, log_level=LogLevel.INFO):
-    logger_obj = SimpleLogger(logger_name, log_file_location, log_level, append_date_to_logfile_name)
-    log("created logger!", log_level=LogLevel.TRACE)
-    return logger_obj
+    if log_file_location:
+        output_prefix = os.path.splitext(log_file_location)[0]
+    else:
+        output_prefix = os.path.join(SCRIPT_DIR, "autowipe")
+    profiler_obj = WipeProfiler(output_prefix, parts or PROFILE_PARTS, lambda message: log(message, LogLevel.INFO))
+    signal.signal(signal.SIGUSR1, lambda signum, frame: profiler_obj.toggle())
+    if profile_now:
+        profiler_obj.toggle()
+    return profiler_obj
+
+def start_metrics(address, port):
+    '''
+        Creates metrics_obj and serves it on address:port. Without metrics_obj nothing is collected.
+    '''
+    global metrics_obj
+    from wipemetrics import WipeMetrics, start_metrics_server
+
+    metrics_obj = WipeMetrics()
+    start_metrics_server(metrics_obj, address, port)
+    log("Serving metrics on 'http://{0}:{1}/metrics'".format(address, port), LogLevel.INFO)
+    return metrics_obj
 
 def main():
     global logger_obj
 
     try:
-        __parse_args()
+        args, instances = __parse_args()
     except Exception as ex:
         if hasattr(ex, 'message'):
             log("Failed to parse arguments! Error Message: '{0}'",format(ex.message), LogLevel.ERROR)
@@ -515,12 +2266,74 @@ def main():
             log("Failed to parse arguments! Error: '{0}'".format(ex), LogLevel.ERROR)
         exit(rc.EXIT_PARSE_ARGS_FAILED)
 
+    if args.backtest:
+        exit(__backtest(args, instances))
+
+    if args.query_logs:
+        exit(__query_logs(args, instances))
+
+    if args.snapshot or args.list_snapshots or args.restore_snapshot:
+        exit(__snapshots(args, instances))
+
+    if args.check_readiness:
+        exit(__readiness(args, instances))
 
-    logger_obj = get_logger(log_file_location=log_file_location, log_level=log_level)
+    if args.control:
+        exit(__control(args, instances))
+
+    if args.fleet:
+        logger_obj = get_logger(log_file_location=args.log_file_location, log_level=args.log_level or log_level, buffered=args.buffered_logging)
+        for instance in instances:
+            instance.logger_obj = get_logger(instance.name, instance.log_file_location, instance.log_level, instance.append_date_to_logfile_name, instance.buffered_logging or args.buffered_logging)
+        daemon = AutoWipeDaemon(instances, args.scheduler_mode or scheduler_mode, args.interval or wipe_check_interval_seconds, args.max_sleep or scheduler_max_sleep_seconds, args.max_concurrent_wipes or max_concurrent_wipes, configuration_check_interval_seconds=args.config_check_interval if args.config_check_interval is not None else configuration_check_interval_seconds)
+        daemon_metrics_address, daemon_metrics_port = args.metrics_address or metrics_address, args.metrics_port or metrics_port
+        daemon_control_socket = args.control_socket if args.control_socket is not None else control_socket
+    else:
+        instance = instances[0]
+        logger_obj = get_logger(log_file_location=instance.log_file_location, log_level=instance.log_level, append_date_to_logfile_name=instance.append_date_to_logfile_name, buffered=instance.buffered_logging)
+        instance.logger_obj = logger_obj
+        daemon = AutoWipeDaemon(instances, instance.scheduler_mode, instance.wipe_check_interval_seconds, instance.scheduler_max_sleep_seconds, 1, instance.time_zone, instance.configuration_check_interval_seconds)
+        daemon_metrics_address, daemon_metrics_port = instance.metrics_address, instance.metrics_port
+        daemon_control_socket = instance.control_socket
     
     log("Started AutoWipe Version '{0}' by '{1}'".format(VERSION_STRING, AUTHOR), LogLevel.INFO)
 
-    do_run()
+    for instance in instances:
+        instance.load_journal()
+
+    if args.check:
+        exit(run_check(instances))
+
+    start_profiler(logger_obj.log_file, args.profile, args.profile is not None)
+
+    # (log file, compress, retention days) of every logger with daily log files
+    archived_log_files = OrderedDict()
+    if args.fleet and logger_obj.log_file and logger_obj.append_date_to_logfile_name:
+        archived_log_files[logger_obj.log_file] = (logger_obj.log_file, args.log_compression, args.log_retention_days or log_retention_days)
+    for instance in instances:
+        if instance.log_file_location and instance.append_date_to_logfile_name and instance.log_file_location not in archived_log_files:
+            archived_log_files[instance.log_file_location] = (instance.log_file_location, instance.log_compression, instance.log_retention_days)
+    archived_log_files = [archived_log_file for archived_log_file in archived_log_files.values() if archived_log_file[1] or archived_log_file[2] > 0]
+    if archived_log_files:
+        from logarchive import start_log_archiver
+        start_log_archiver(archived_log_files, lambda message: log(message, LogLevel.INFO))
+
+    if daemon_metrics_port > 0:
+        try:
+            start_metrics(daemon_metrics_address, daemon_metrics_port).collectors.append(daemon.collect_metrics)
+        except Exception as ex:
+            # the wipes are more important than their metrics
+            log("Failed to serve metrics on '{0}:{1}'! Error Message: '{2}'".format(daemon_metrics_address, daemon_metrics_port, ex), LogLevel.ERROR)
+
+    if daemon_control_socket:
+        try:
+            from wipecontrol import start_control_server
+            start_control_server(daemon_control_socket, daemon.handle_control_request, lambda message: log(message, LogLevel.INFO))
+        except Exception as ex:
+            # the wipes still run without the control socket
+            log("Failed to serve control socket '{0}'! Error Message: '{1}'".format(daemon_control_socket, ex), LogLevel.ERROR)
+
+    daemon.run()
 
 if __name__ == '__main__':
     main()
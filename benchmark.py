@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import platform
+import argparse
+import tempfile
+import contextlib
+import subprocess
+
+from time import perf_counter
+from datetime import datetime as dt
+from datetime import date
+from datetime import timedelta
+from datetime import timezone
+
+from simplelogger import SimpleLogger, LogLevel
+
+import autowipe
+from wiperule import compile_wipe_types, compile_wipe_schedule
+
+BENCHMARK_FORMAT_VERSION=1
+# every wipe type, as used in bp_wipe_types/map_wipe_types
+WIPE_TYPES=range(1, 8)
+WIPE_DAYS=[[4], [1, 4], [1, 3, 5, 7], [1, 2, 3, 4, 5, 6, 7]]
+# seconds a "--check" run without a due wipe may take longer than starting the bare interpreter
+STARTUP_TARGET_SECONDS=0.1
+
+
+def measure(function, iterations, repeat=5):
+    '''
+        Calls function iterations times, repeat times in a row, and returns the fastest run, which is the least disturbed
+        by the rest of the machine.
+    '''
+    best = None
+    for i in range(repeat):
+        start = perf_counter()
+        function(iterations)
+        elapsed = perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return {
+        "iterations": iterations,
+        "repeat": repeat,
+        "seconds": best,
+        "microseconds_per_call": best / iterations * 1000000,
+        "calls_per_second": iterations / best
+    }
+
+@contextlib.contextmanager
+def quiet_autowipe():
+    # autowipe prints every log message without a logger, the benchmark measures the production log level instead
+    logger = autowipe.logger_obj
+    autowipe.logger_obj = SimpleLogger("Benchmark", None, LogLevel.INFO)
+    try:
+        yield
+    finally:
+        autowipe.logger_obj = logger
+
+def benchmark_check_if_wipe(repeat=5):
+    '''
+        One WipeInstance.check_if_wipe() call is the check of one server in a tick of the polling daemon, so this is the
+        cost of a tick without a wipe, with every wipe type and several wipe day lists.
+    '''
+    results = {}
+    first_wipe_date = date(2021, 2, 2)
+    with quiet_autowipe():
+        for wipe_days in WIPE_DAYS:
+            instance = autowipe.WipeInstance("Benchmark")
+            instance.bp_wipe_rule = compile_wipe_types(list(WIPE_TYPES), wipe_days, "2359", first_wipe_date)
+            instance.map_wipe_rule = compile_wipe_types(list(WIPE_TYPES), wipe_days, "2359", first_wipe_date)
+            def run(iterations):
+                for i in range(iterations):
+                    instance.check_if_wipe()
+            results["WipeInstance.check_if_wipe[days={0}]".format(",".join(str(day) for day in wipe_days))] = measure(run, 2000, repeat)
+    return results
+
+def benchmark_wipe_rule(repeat=5):
+    '''
+        The compiled WipeRules, that the daemon evaluates, for every wipe type with several wipe day lists plus a cron
+        and an RRULE expression.
+    '''
+    results = {}
+    first_wipe_date = date(2021, 2, 2)
+    wipe_rules = [("type={0},days={1}".format(wipe_type, ",".join(str(day) for day in wipe_days)), compile_wipe_types([wipe_type], wipe_days, "1800", first_wipe_date)) for wipe_type in WIPE_TYPES for wipe_days in WIPE_DAYS]
+    wipe_rules.append(("cron", compile_wipe_schedule("0 18 * * 4L")))
+    wipe_rules.append(("rrule", compile_wipe_schedule(["RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=TH", "EXRULE:FREQ=MONTHLY;BYDAY=1TH"], "1800", first_wipe_date)))
+
+    for name, wipe_rule in wipe_rules:
+        def run_is_due(iterations):
+            last_wipe_date = None
+            current_date = date(2024, 1, 1)
+            for i in range(iterations):
+                if wipe_rule.is_due(current_date, "1800", last_wipe_date):
+                    last_wipe_date = current_date
+                current_date += timedelta(days=1)
+        results["WipeRule.is_due[{0}]".format(name)] = measure(run_is_due, 3650, repeat)
+
+        def run_get_next_wipe_date(iterations):
+            current_date = date(2024, 1, 1)
+            for i in range(iterations):
+                # limited like the daemon does it
+                current_date = wipe_rule.get_next_wipe_date(current_date, current_date, current_date + timedelta(days=autowipe.WIPE_SCHEDULE_HORIZON_DAYS)) or date(2024, 1, 1)
+        results["WipeRule.get_next_wipe_date[{0}]".format(name)] = measure(run_get_next_wipe_date, 1000, repeat)
+    return results
+
+def benchmark_logger(repeat=5):
+    '''
+        Logs at every LogLevel with a TRACE logger, once to stdout only and once to stdout and a log file.
+    '''
+    results = {}
+    with tempfile.TemporaryDirectory() as log_dir, open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for output, log_file in (("stdout", None), ("file", os.path.join(log_dir, "benchmark.log"))):
+            logger = SimpleLogger("Benchmark", log_file, LogLevel.TRACE)
+            for log_level in LogLevel:
+                def run(iterations):
+                    for i in range(iterations):
+                        logger.log("Benchmark line {0}".format(i), log_level)
+                results["SimpleLogger.log[{0},{1}]".format(log_level.name, output)] = measure(run, 2000, repeat)
+            # a message below the log level is only a comparison
+            quiet_logger = SimpleLogger("Benchmark", log_file, LogLevel.FATAL)
+            def run_filtered(iterations):
+                for i in range(iterations):
+                    quiet_logger.log("Benchmark line", LogLevel.TRACE)
+            results["SimpleLogger.log[filtered,{0}]".format(output)] = measure(run_filtered, 100000, repeat)
+    return results
+
+def benchmark_logger_throughput(lines=20000):
+    '''
+        Writes the same amount of log lines through the direct and the buffered SimpleLogger file path.
+        Returns a dict with the measured throughput of both.
+    '''
+    results = {}
+    with tempfile.TemporaryDirectory() as log_dir, open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for name, buffered in (("direct", False), ("buffered", True)):
+            logger = SimpleLogger("Benchmark", os.path.join(log_dir, "{0}.log".format(name)), LogLevel.INFO, buffered=buffered)
+
+            start = perf_counter()
+            for i in range(lines):
+                logger.log("Benchmark line {0}".format(i), LogLevel.INFO)
+            # the buffered writer is only done, once everything is on disk
+            logger.flush()
+            elapsed = perf_counter() - start
+            logger.close()
+
+            results[name] = {
+                "lines": lines,
+                "seconds": elapsed,
+                "lines_per_second": lines / elapsed
+            }
+    return results
+
+def benchmark_run_wipe_process(lines=20000, repeat=3):
+    '''
+        Runs a fake wipe command, that writes lines of output to stdout and stderr, through run_wipe_process() in
+        every output mode, with the log going to a file.
+    '''
+    results = {}
+    fake_wipe_command = [sys.executable, "-c", "import sys\nfor i in range({0}):\n    print('Updating server files.. step', i, file=sys.stderr if i % 10 == 0 else sys.stdout)".format(lines)]
+    with tempfile.TemporaryDirectory() as log_dir, open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        logger = SimpleLogger("Benchmark", os.path.join(log_dir, "benchmark.log"), LogLevel.INFO, buffered=True)
+        for output_mode in autowipe.WIPE_COMMAND_OUTPUT_MODES:
+            def run(iterations):
+                for i in range(iterations):
+                    if autowipe.run_wipe_process(fake_wipe_command, logger, output_mode=output_mode) is not True:
+                        raise Exception("Fake wipe command failed!")
+                logger.flush()
+            result = measure(run, 1, repeat)
+            result["lines"] = lines
+            result["lines_per_second"] = lines / result["seconds"]
+            results["run_wipe_process[{0}]".format(output_mode)] = result
+        logger.close()
+    return results
+
+def benchmark_startup(repeat=5):
+    '''
+        Starts "autowipe.py --check" like a systemd timer or cron does, with a configuration without a due wipe, and the
+        bare python interpreter for comparison. Both run repeat times and the fastest run counts.
+    '''
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        configuration_path = os.path.join(work_dir, "autowipe.json")
+        with open(configuration_path, 'w') as configuration_file:
+            json.dump({
+                "bp_wipe_days": ["4"],
+                "map_wipe_days": ["4"],
+                "bp_wipe_time": "2200",
+                "map_wipe_time": "1500",
+                "bp_wipe_types": ["3"],
+                "map_wipe_types": ["1"],
+                "first_bp_wipe": "2099-1-1",
+                "first_map_wipe": "2099-1-1",
+                "log_file_location": os.path.join(work_dir, "autowipe.log"),
+                "wipe_journal_location": os.path.join(work_dir, "autowipe.journal"),
+                "log_level": "4",
+                "time_zone": "CET"
+            }, configuration_file)
+
+        # a timer runs the modules from their cached bytecode, the first run writes it and is not the fastest
+        environment = dict(os.environ)
+        environment.pop("PYTHONDONTWRITEBYTECODE", None)
+        for name, command in (("python", [sys.executable, "-c", "pass"]), ("check", [sys.executable, os.path.join(autowipe.SCRIPT_DIR, "autowipe.py"), "-c", configuration_path, "--check"])):
+            def run(iterations):
+                for i in range(iterations):
+                    subprocess.run(command, stdout=subprocess.DEVNULL, check=True, env=environment)
+            results["startup[{0}]".format(name)] = measure(run, 1, repeat)
+    return results
+
+def check_startup(results):
+    '''
+        Returns the seconds a "--check" run takes longer than the bare interpreter and if this is within STARTUP_TARGET_SECONDS.
+    '''
+    overhead = results["startup[check]"]["seconds"] - results["startup[python]"]["seconds"]
+    return overhead, overhead <= STARTUP_TARGET_SECONDS
+
+def run_benchmarks(lines=20000, repeat=5):
+    results = {}
+    results.update(benchmark_check_if_wipe(repeat))
+    results.update(benchmark_wipe_rule(repeat))
+    results.update(benchmark_logger(repeat))
+    for name, result in benchmark_logger_throughput(lines).items():
+        results["SimpleLogger.throughput[{0}]".format(name)] = result
+    results.update(benchmark_run_wipe_process(lines))
+    results.update(benchmark_startup(repeat))
+    return get_report(results)
+
+def get_report(results):
+    return {
+        "format_version": BENCHMARK_FORMAT_VERSION,
+        "autowipe_version": autowipe.VERSION_STRING,
+        "created": dt.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "platform": platform.platform(),
+        "results": results
+    }
+
+def compare(baseline, current):
+    '''
+        Yields (name, ratio) for every benchmark in both runs, where ratio is the time per call or per line compared to
+        the baseline, so > 1 is slower.
+    '''
+    for name, result in current["results"].items():
+        baseline_result = baseline["results"].get(name)
+        if baseline_result is None:
+            continue
+        yield name, _get_unit_seconds(result) / _get_unit_seconds(baseline_result)
+
+def _get_unit_seconds(result):
+    return result["seconds"] / result.get("lines", result.get("iterations"))
+
+def main():
+    parser = argparse.ArgumentParser(description="AutoWipe benchmarks")
+    parser.add_argument('--lines', type=int, default=20000, help="Amount of log and output lines written by the throughput benchmarks. Default: 20000")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per benchmark, the fastest counts. Default: 5")
+    parser.add_argument('--output', type=str, help="Saves the results as JSON to this file.")
+    parser.add_argument('--compare', type=str, help="JSON results of an earlier run to compare against, e.g. of the previous version on the same machine.")
+    parser.add_argument('--startup-only', action='store_true', help="Only runs the startup benchmark, e.g. as a quick check before a release.")
+    args = parser.parse_args()
+
+    if args.startup_only:
+        report = get_report(benchmark_startup(args.repeat))
+    else:
+        report = run_benchmarks(args.lines, args.repeat)
+    for name, result in report["results"].items():
+        if "lines_per_second" in result:
+            print("{0}: {1:.3f}s ({2:.0f} lines/s)".format(name, result["seconds"], result["lines_per_second"]))
+        elif name.startswith("startup"):
+            print("{0}: {1:.1f}ms".format(name, result["seconds"] * 1000))
+        else:
+            print("{0}: {1:.2f}us per call".format(name, result["microseconds_per_call"]))
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+        print("Results saved to '{0}'.".format(args.output))
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        print("Compared to '{0}' (AutoWipe {1}, {2}):".format(args.compare, baseline.get("autowipe_version"), baseline.get("created")))
+        for name, ratio in compare(baseline, report):
+            print("{0}: {1:.2f}x {2}".format(name, ratio, "slower" if ratio > 1 else "faster"))
+
+    overhead, within_target = check_startup(report["results"])
+    print("Startup of '--check': {0:.1f}ms above the interpreter, target: {1:.1f}ms".format(overhead * 1000, STARTUP_TARGET_SECONDS * 1000))
+    if not within_target:
+        print("Startup target exceeded! Check for new imports at module level of autowipe.py.", file=sys.stderr)
+        exit(1)
+
+if __name__ == '__main__':
+    main()
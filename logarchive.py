@@ -0,0 +1,225 @@
+import os
+import re
+import sys
+import json
+import gzip
+import threading
+from datetime import datetime as dt
+from datetime import timedelta
+
+from simplelogger import LogLevel
+
+COMPRESSED_SUFFIX=".gz"
+INDEX_SUFFIX=".idx"
+INDEX_VERSION=1
+# uncompressed bytes per gzip member, the smallest part a query has to decompress
+BLOCK_SIZE=65536
+# a daily log file is only compressed, once nobody wrote to it for this long
+MIN_AGE_SECONDS=300
+ARCHIVE_INTERVAL_SECONDS=3600
+DATE_FORMAT="%Y-%m-%d"
+# "[2024-04-04 22:00:01.123456][INFO][AutoWipe]: message", as written by SimpleLogger
+LOG_LINE_PATTERN=re.compile(rb"^\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d+)\]\[([A-Z]+)\]\[[^\]]*\]: ")
+# the log messages of WipeInstance.execute_wipe_action(), that start and end a wipe run
+RUN_START_MARKERS={b"Execuing Blueprint Wipe!": "bp", b"Execuing Map Wipe!": "map"}
+RUN_END_MARKERS={b"Blueprint Wipe downtime": ("bp", True), b"Blueprint Wipe Failed!": ("bp", False), b"Map Wipe downtime": ("map", True), b"Map Wipe Failed!": ("map", False)}
+
+
+def get_daily_log_files(log_file):
+    '''
+        Returns (date, path) of every daily log file of log_file, like SimpleLogger names them with
+        append_date_to_logfile_name, compressed or not, sorted by date.
+    '''
+    log_dir = os.path.dirname(log_file) or "."
+    prefix, suffix = os.path.splitext(os.path.basename(log_file))
+    pattern = re.compile(r"^{0}\.(\d{{4}}-\d\d-\d\d){1}({2})?$".format(re.escape(prefix), re.escape(suffix), re.escape(COMPRESSED_SUFFIX)))
+    files = []
+    for name in os.listdir(log_dir):
+        match = pattern.match(name)
+        if match:
+            files.append((dt.strptime(match.group(1), DATE_FORMAT).date(), os.path.join(log_dir, name)))
+    files.sort()
+    return files
+
+def compress_log_file(path):
+    '''
+        Compresses a closed log file into "<path>.gz" with one gzip member per block of about BLOCK_SIZE bytes and
+        writes an index "<path>.gz.idx" with the byte range, time range and log levels of every block and the blocks of
+        every wipe run. A wipe run always starts a new block. The result is a normal gzip file, that zcat can read.
+    '''
+    compressed_path = path + COMPRESSED_SUFFIX
+    blocks = []
+    runs = []
+    current_runs = {}
+    block = {"lines": [], "size": 0, "first": None, "last": None, "levels": 0}
+
+    with open(path, 'rb') as log, open(compressed_path + ".tmp", 'wb') as compressed:
+        def write_block():
+            if not block["lines"]:
+                return
+            data = gzip.compress(b"".join(block["lines"]))
+            blocks.append([compressed.tell(), len(data), block["first"], block["last"], block["levels"]])
+            compressed.write(data)
+            block.update(lines=[], size=0, first=None, last=None, levels=0)
+
+        for line in log:
+            match = LOG_LINE_PATTERN.match(line)
+            if match is not None:
+                timestamp = match.group(1).decode()
+                message = line[match.end():]
+                wipe = _get_marker(message, RUN_START_MARKERS)
+                # blocks are only split between records, so a record never spans two blocks
+                if wipe is not None or block["size"] >= BLOCK_SIZE:
+                    write_block()
+                if wipe is not None:
+                    current_runs[wipe] = {"wipe": wipe, "first": timestamp, "last": timestamp, "first_block": len(blocks), "last_block": len(blocks), "succeeded": None}
+                    runs.append(current_runs[wipe])
+
+                block["first"] = block["first"] or timestamp
+                block["last"] = timestamp
+                block["levels"] |= 1 << _get_level(match.group(2))
+                for run in current_runs.values():
+                    run["last"] = timestamp
+                    run["last_block"] = len(blocks)
+
+                end = _get_marker(message, RUN_END_MARKERS)
+                if end is not None and end[0] in current_runs:
+                    current_runs.pop(end[0])["succeeded"] = end[1]
+            block["lines"].append(line)
+            block["size"] += len(line)
+        write_block()
+
+    with open(compressed_path + INDEX_SUFFIX + ".tmp", 'w') as index:
+        json.dump({"version": INDEX_VERSION, "blocks": blocks, "runs": runs}, index, separators=(",", ":"))
+    os.replace(compressed_path + INDEX_SUFFIX + ".tmp", compressed_path + INDEX_SUFFIX)
+    os.replace(compressed_path + ".tmp", compressed_path)
+    os.remove(path)
+    return compressed_path
+
+def archive_logs(log_file, compress=True, retention_days=0, today=None):
+    '''
+        Compresses every closed daily log file of log_file and removes the ones older than retention_days
+        (0 = keep all). Returns the compressed and the removed files.
+    '''
+    if today is None:
+        today = dt.now().date()
+    compressed = []
+    removed = []
+    for log_date, path in get_daily_log_files(log_file):
+        if retention_days > 0 and log_date < today - timedelta(days=retention_days):
+            for file_path in (path, path + INDEX_SUFFIX):
+                if os.path.isfile(file_path):
+                    os.remove(file_path)
+            removed.append(path)
+        elif compress and log_date < today and not path.endswith(COMPRESSED_SUFFIX) and os.path.getmtime(path) < dt.now().timestamp() - MIN_AGE_SECONDS:
+            compressed.append(compress_log_file(path))
+    return compressed, removed
+
+def start_log_archiver(log_files, log=print, interval_seconds=ARCHIVE_INTERVAL_SECONDS):
+    '''
+        Runs archive_logs() for every (log_file, compress, retention_days) now and then every interval_seconds in a
+        background thread with the lowest CPU priority.
+    '''
+    def archive_loop():
+        try:
+            # on linux the nice value of a thread only applies to the thread itself
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            for log_file, compress, retention_days in log_files:
+                try:
+                    compressed, removed = archive_logs(log_file, compress, retention_days)
+                    if compressed or removed:
+                        log("Archived log files of '{0}': compressed {1}, removed {2}".format(log_file, len(compressed), len(removed)))
+                except Exception as ex:
+                    log("Failed to archive log files of '{0}'! Error Message: '{1}'".format(log_file, ex))
+            stop_event.wait(interval_seconds)
+
+    stop_event = threading.Event()
+    threading.Thread(target=archive_loop, name="LogArchiver", daemon=True).start()
+    return stop_event
+
+def query_logs(log_file, since=None, until=None, max_level=None, wipe=None, output=sys.stdout):
+    '''
+        Writes every log record of the daily log files of log_file between since and until (datetimes), with a log
+        level up to max_level and, if wipe ("bp"/"map") is given, only of its wipe runs. Compressed files are read
+        with their index, so only the blocks that can contain matching records are decompressed.
+        Returns the amount of written records.
+    '''
+    since_timestamp = since.strftime("%Y-%m-%d %H:%M:%S.%f") if since is not None else None
+    until_timestamp = until.strftime("%Y-%m-%d %H:%M:%S.%f") if until is not None else None
+    level_mask = sum(1 << level for level in range(1, max_level + 1)) if max_level is not None else None
+
+    record_count = 0
+    for log_date, path in get_daily_log_files(log_file):
+        if since is not None and log_date < since.date():
+            continue
+        if until is not None and log_date > until.date():
+            continue
+
+        if path.endswith(COMPRESSED_SUFFIX) and os.path.isfile(path + INDEX_SUFFIX):
+            with open(path + INDEX_SUFFIX) as index_file:
+                index = json.load(index_file)
+            runs = [run for run in index["runs"] if wipe is None or run["wipe"] == wipe]
+            run_blocks = set(block_number for run in runs for block_number in range(run["first_block"], run["last_block"] + 1))
+            with open(path, 'rb') as compressed:
+                for block_number, (offset, length, first, last, levels) in enumerate(index["blocks"]):
+                    if since_timestamp is not None and last < since_timestamp:
+                        continue
+                    if until_timestamp is not None and first > until_timestamp:
+                        continue
+                    if level_mask is not None and not levels & level_mask:
+                        continue
+                    if wipe is not None and block_number not in run_blocks:
+                        continue
+                    compressed.seek(offset)
+                    lines = gzip.decompress(compressed.read(length)).splitlines(keepends=True)
+                    record_count += _write_records(lines, since_timestamp, until_timestamp, max_level, wipe, runs, output)
+        else:
+            opener = gzip.open if path.endswith(COMPRESSED_SUFFIX) else open
+            with opener(path, 'rb') as log:
+                record_count += _write_records(log, since_timestamp, until_timestamp, max_level, wipe, None, output)
+    return record_count
+
+def _write_records(lines, since_timestamp, until_timestamp, max_level, wipe, runs, output):
+    '''
+        Writes the matching records of lines. Lines without a log prefix belong to the record before them. If wipe is
+        given, runs are the wipe runs from the index or None to follow the runs through the lines themselves.
+    '''
+    record_count = 0
+    matches = False
+    in_run = False
+    for line in lines:
+        match = LOG_LINE_PATTERN.match(line)
+        if match is not None:
+            timestamp = match.group(1).decode()
+            message = line[match.end():]
+            if wipe is not None and runs is None:
+                in_run = in_run or _get_marker(message, RUN_START_MARKERS) == wipe
+            elif wipe is not None:
+                in_run = any(run["first"] <= timestamp <= run["last"] for run in runs)
+
+            matches = (since_timestamp is None or timestamp >= since_timestamp) and (until_timestamp is None or timestamp <= until_timestamp)
+            matches = matches and (max_level is None or _get_level(match.group(2)) <= max_level) and (wipe is None or in_run)
+            if matches:
+                record_count += 1
+
+            end = _get_marker(message, RUN_END_MARKERS)
+            if runs is None and end is not None and end[0] == wipe:
+                in_run = False
+        if matches:
+            output.write(line.decode(errors='replace'))
+    return record_count
+
+def _get_marker(message, markers):
+    for marker, value in markers.items():
+        if message.startswith(marker):
+            return value
+    return None
+
+def _get_level(level_name):
+    try:
+        return LogLevel[level_name.decode()].value
+    except KeyError:
+        return LogLevel.TRACE.value
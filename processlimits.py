@@ -0,0 +1,190 @@
+import os
+import shlex
+import shutil
+
+IONICE_CLASSES={"realtime": 1, "best-effort": 2, "idle": 3}
+CGROUP_ROOT="/sys/fs/cgroup"
+# moves the shell into the cgroup $0 and replaces it with the command, a failed move only leaves the command outside
+CGROUP_EXEC_SCRIPT='echo $$ 2>/dev/null > "$0/cgroup.procs" || echo "Failed to move the command into the cgroup \'$0\'!" >&2; exec "$@"'
+
+
+class ProcessLimits(object):
+    '''
+        CPU and I/O priority of a wipe step and all its children: nice level, ionice class (and level), the CPUs it
+        may run on and the cpu.weight/io.weight of its own cgroup v2 below cgroup_parent. None means unchanged.
+    '''
+
+    def __init__(self, nice=None, ionice_class=None, ionice_level=None, cpus=None, cpu_weight=None, io_weight=None):
+        self.nice = nice
+        self.ionice_class = ionice_class
+        self.ionice_level = ionice_level
+        self.cpus = cpus
+        self.cpu_weight = cpu_weight
+        self.io_weight = io_weight
+
+    @property
+    def uses_cgroup(self):
+        return self.cpu_weight is not None or self.io_weight is not None
+
+    def __eq__(self, other):
+        return isinstance(other, ProcessLimits) and vars(self) == vars(other)
+
+    def __repr__(self):
+        settings = []
+        if self.nice is not None:
+            settings.append("nice={0}".format(self.nice))
+        if self.ionice_class is not None:
+            settings.append("ionice={0}{1}".format(self.ionice_class, ":{0}".format(self.ionice_level) if self.ionice_level is not None else ""))
+        if self.cpus is not None:
+            settings.append("cpus={0}".format(format_cpus(self.cpus)))
+        if self.cpu_weight is not None:
+            settings.append("cpu.weight={0}".format(self.cpu_weight))
+        if self.io_weight is not None:
+            settings.append("io.weight={0}".format(self.io_weight))
+        return " ".join(settings) or "none"
+
+    def limit_command(self, command, cgroup_path=None, log=print):
+        '''
+            Returns the argument list, that runs command (string or argument list) with the limits. The command is
+            wrapped in sh (cgroup), nice, ionice and taskset, which set the limits on their own process and then exec
+            the next one, so the command and every process it starts run with them from their first instruction.
+        '''
+        wrappers = []
+        if cgroup_path is not None:
+            wrappers.append(["sh", "-c", CGROUP_EXEC_SCRIPT, cgroup_path])
+        if self.nice is not None:
+            # nice runs the command anyway, if it may not raise the priority
+            wrappers.append(["nice", "-n", str(self.nice)])
+        if self.ionice_class is not None:
+            wrappers.append(["ionice", "--ignore", "-c", str(IONICE_CLASSES[self.ionice_class])] + (["-n", str(self.ionice_level)] if self.ionice_level is not None else []))
+        if self.cpus is not None:
+            # taskset fails on CPUs, that the daemon may not use itself
+            cpus = self.cpus & os.sched_getaffinity(0)
+            if cpus != self.cpus:
+                log("The CPUs {0} are not available, the command runs on {1}.".format(format_cpus(self.cpus - cpus), format_cpus(cpus) if cpus else "all CPUs"))
+            if cpus:
+                wrappers.append(["taskset", "-c", format_cpus(cpus)])
+
+        arguments = shlex.split(command) if isinstance(command, str) else list(command)
+        prefix = []
+        for wrapper in wrappers:
+            if shutil.which(wrapper[0]) is None:
+                log("'{0}' is not installed, the command runs without its settings.".format(wrapper[0]))
+                continue
+            prefix += wrapper
+        return prefix + arguments
+
+
+def parse_process_limits(limits_data):
+    '''
+        Parses the resource settings of a configuration, e.g. {"nice": "10", "ionice": "idle", "cpus": "0-3",
+        "cpu_weight": "50", "io_weight": "50"}. ionice is "idle", "best-effort[:0-7]" or "realtime[:0-7]".
+    '''
+    if not isinstance(limits_data, dict):
+        raise Exception("Resource settings have to be an object!")
+    unknown_keys = set(limits_data) - {"nice", "ionice", "cpus", "cpu_weight", "io_weight"}
+    if unknown_keys:
+        raise Exception("Unknown resource settings {0}!".format(sorted(unknown_keys)))
+
+    limits = ProcessLimits()
+    if 'nice' in limits_data:
+        limits.nice = int(limits_data['nice'])
+        if not -20 <= limits.nice <= 19:
+            raise Exception("nice has to be between -20 and 19!")
+    if 'ionice' in limits_data:
+        ionice_class, _, ionice_level = str(limits_data['ionice']).partition(":")
+        if ionice_class not in IONICE_CLASSES:
+            raise Exception("Invalid ionice class '{0}'! Choose one of these: {1}".format(ionice_class, list(IONICE_CLASSES)))
+        limits.ionice_class = ionice_class
+        if ionice_level:
+            limits.ionice_level = int(ionice_level)
+            if not 0 <= limits.ionice_level <= 7 or ionice_class == "idle":
+                raise Exception("The ionice level has to be between 0 and 7 and the idle class has none!")
+    if 'cpus' in limits_data:
+        limits.cpus = parse_cpus(limits_data['cpus'])
+    for key in ('cpu_weight', 'io_weight'):
+        if key in limits_data:
+            weight = int(limits_data[key])
+            if not 1 <= weight <= 10000:
+                raise Exception("{0} has to be between 1 and 10000!".format(key))
+            setattr(limits, key, weight)
+    return limits
+
+def parse_cpus(cpus_data):
+    '''
+        Parses a CPU list like "0-3,8" or [ "0", "1" ] into a set of CPU numbers.
+    '''
+    parts = cpus_data if isinstance(cpus_data, list) else str(cpus_data).split(",")
+    cpus = set()
+    for part in parts:
+        first, _, last = str(part).strip().partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    if not cpus:
+        raise Exception("cpus must not be empty!")
+    return cpus
+
+def format_cpus(cpus):
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(first) if first == last else "{0}-{1}".format(first, last) for first, last in ranges)
+
+def create_cgroup(cgroup_parent, name, limits):
+    '''
+        Creates (or reuses) the cgroup v2 name below cgroup_parent, a relative cgroup_parent is below /sys/fs/cgroup,
+        and sets its weights. cgroup_parent has to be delegated to the user of the daemon and have the cpu and io
+        controllers in its cgroup.subtree_control. Returns its path.
+    '''
+    parent_path = os.path.join(CGROUP_ROOT, cgroup_parent.lstrip("/"))
+    if not os.path.isfile(os.path.join(parent_path, "cgroup.controllers")):
+        raise Exception("'{0}' is no cgroup v2!".format(parent_path))
+    cgroup_path = os.path.join(parent_path, name.replace("/", "_"))
+    os.makedirs(cgroup_path, exist_ok=True)
+    try:
+        for file_name, weight in (("cpu.weight", limits.cpu_weight), ("io.weight", limits.io_weight)):
+            if weight is not None:
+                with open(os.path.join(cgroup_path, file_name), 'w') as weight_file:
+                    weight_file.write("default {0}".format(weight) if file_name == "io.weight" else str(weight))
+    except OSError as ex:
+        remove_cgroup(cgroup_path)
+        raise Exception("Failed to set {0}, is the controller enabled in the cgroup.subtree_control of '{1}'? {2}".format(os.path.basename(getattr(ex, 'filename', None) or "the weight"), parent_path, ex))
+    return cgroup_path
+
+def get_cgroup_usage(cgroup_path):
+    '''
+        Returns the CPU seconds and the bytes read and written by all processes, that ever were in the cgroup.
+    '''
+    cpu_seconds = 0.0
+    read_bytes = 0
+    write_bytes = 0
+    with open(os.path.join(cgroup_path, "cpu.stat")) as cpu_stat:
+        for line in cpu_stat:
+            key, _, value = line.partition(" ")
+            if key == "usage_usec":
+                cpu_seconds = int(value) / 1000000
+    try:
+        with open(os.path.join(cgroup_path, "io.stat")) as io_stat:
+            # one line per device: "8:0 rbytes=1 wbytes=2 rios=3 wios=4 dbytes=0 dios=0"
+            for line in io_stat:
+                for field in line.split()[1:]:
+                    key, _, value = field.partition("=")
+                    if key == "rbytes":
+                        read_bytes += int(value)
+                    elif key == "wbytes":
+                        write_bytes += int(value)
+    except FileNotFoundError:
+        # without the io controller there is no io.stat
+        pass
+    return cpu_seconds, read_bytes, write_bytes
+
+def remove_cgroup(cgroup_path):
+    '''
+        Removes the cgroup, unless a process of the command still runs in it, e.g. a server, that a step started.
+    '''
+    try:
+        os.rmdir(cgroup_path)
+    except OSError:
+        pass
@@ -0,0 +1,163 @@
+import os
+import shlex
+import signal
+import asyncio
+import resource
+import threading
+from collections import deque
+from time import monotonic
+
+CHUNK_SIZE=65536
+TIMEOUT_COMMAND="command"
+TIMEOUT_OUTPUT="output"
+# block I/O in the resource usage is counted in 512 byte blocks
+RUSAGE_BLOCK_SIZE=512
+
+# running processes and processes started so far, the resource usage of children is only known for all of them
+_process_counts_lock = threading.Lock()
+_process_counts = [0, 0]
+
+
+class OutputRingBuffer(object):
+    '''
+        Keeps the last max_bytes of the output of a process in memory.
+    '''
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._chunks = deque()
+        self._size = 0
+
+    def append(self, data):
+        self.total_bytes += len(data)
+        self._chunks.append(data)
+        self._size += len(data)
+        while self._size - len(self._chunks[0]) >= self.max_bytes:
+            self._size -= len(self._chunks.popleft())
+
+    def get_bytes(self):
+        data = b"".join(self._chunks)
+        return data[-self.max_bytes:]
+
+    def get_text(self):
+        return self.get_bytes().decode(errors='replace')
+
+
+class ProcessResult(object):
+
+    def __init__(self, command, returncode, timed_out, duration_seconds, output, cpu_seconds=0.0, read_bytes=0, write_bytes=0, overlapped=False):
+        self.command = command
+        self.returncode = returncode
+        # None, TIMEOUT_COMMAND or TIMEOUT_OUTPUT
+        self.timed_out = timed_out
+        self.duration_seconds = duration_seconds
+        self.output = output
+        # user and system CPU time and block I/O of the command and the children it waited for
+        self.cpu_seconds = cpu_seconds
+        self.read_bytes = read_bytes
+        self.write_bytes = write_bytes
+        # True if other commands ran at the same time, their usage is then included
+        self.overlapped = overlapped
+
+    @property
+    def succeeded(self):
+        return self.timed_out is None and self.returncode == 0
+
+
+def run_process(command, timeout_seconds=None, output_timeout_seconds=None, ring_buffer_bytes=65536, on_output_line=None, kill_grace_seconds=10):
+    '''
+        Runs command (string or argument list) in its own process group and reads stdout and stderr at the same time.
+        The whole process group is killed, if it runs longer than timeout_seconds or writes no output for
+        output_timeout_seconds. on_output_line(line, is_stderr) is called for every complete output line.
+        Returns a ProcessResult, whose output is an OutputRingBuffer with the last ring_buffer_bytes of output.
+    '''
+    with _process_counts_lock:
+        _process_counts[0] += 1
+        _process_counts[1] += 1
+        overlapped = _process_counts[0] > 1
+        started_processes = _process_counts[1]
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    try:
+        result = asyncio.run(_run_process(command, timeout_seconds, output_timeout_seconds, ring_buffer_bytes, on_output_line, kill_grace_seconds))
+    finally:
+        with _process_counts_lock:
+            _process_counts[0] -= 1
+            overlapped = overlapped or _process_counts[1] != started_processes
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    result.cpu_seconds = usage.ru_utime + usage.ru_stime - usage_before.ru_utime - usage_before.ru_stime
+    result.read_bytes = (usage.ru_inblock - usage_before.ru_inblock) * RUSAGE_BLOCK_SIZE
+    result.write_bytes = (usage.ru_oublock - usage_before.ru_oublock) * RUSAGE_BLOCK_SIZE
+    result.overlapped = overlapped
+    return result
+
+async def _run_process(command, timeout_seconds, output_timeout_seconds, ring_buffer_bytes, on_output_line, kill_grace_seconds):
+    arguments = shlex.split(command) if isinstance(command, str) else list(command)
+    output = OutputRingBuffer(ring_buffer_bytes)
+    last_output = [monotonic()]
+
+    started = monotonic()
+    process = await asyncio.create_subprocess_exec(*arguments, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, start_new_session=True)
+
+    async def read_stream(stream, is_stderr):
+        remainder = b""
+        while True:
+            chunk = await stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            last_output[0] = monotonic()
+            output.append(chunk)
+            if on_output_line is not None:
+                lines = (remainder + chunk).split(b"\n")
+                remainder = lines.pop()
+                for line in lines:
+                    on_output_line(line.decode(errors='replace'), is_stderr)
+        if remainder and on_output_line is not None:
+            on_output_line(remainder.decode(errors='replace'), is_stderr)
+
+    readers = asyncio.ensure_future(asyncio.gather(read_stream(process.stdout, False), read_stream(process.stderr, True)))
+
+    timed_out = None
+    while not readers.done():
+        now = monotonic()
+        wait_seconds = None
+        if timeout_seconds:
+            if now - started >= timeout_seconds:
+                timed_out = TIMEOUT_COMMAND
+                break
+            wait_seconds = timeout_seconds - (now - started)
+        if output_timeout_seconds:
+            if now - last_output[0] >= output_timeout_seconds:
+                timed_out = TIMEOUT_OUTPUT
+                break
+            idle_wait_seconds = output_timeout_seconds - (now - last_output[0])
+            wait_seconds = idle_wait_seconds if wait_seconds is None else min(wait_seconds, idle_wait_seconds)
+        await asyncio.wait([readers], timeout=wait_seconds)
+
+    if timed_out is not None:
+        await _kill_process_group(process, kill_grace_seconds)
+        # children, that left the process group, may still hold the pipes open
+        try:
+            await asyncio.wait_for(readers, kill_grace_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+    else:
+        await readers
+
+    returncode = await process.wait()
+    return ProcessResult(command, returncode, timed_out, monotonic() - started, output)
+
+async def _kill_process_group(process, kill_grace_seconds):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        await asyncio.wait_for(process.wait(), kill_grace_seconds)
+    except asyncio.TimeoutError:
+        pass
+    # whatever is left of the group after the grace period gets killed
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
@@ -1,33 +1,103 @@
 import os
+import atexit
+import queue
+import threading
 from enum import IntEnum
+from time import perf_counter
 from datetime import datetime as dt
 
 class SimpleLogger(object):
 
-    def __init__(self, logger_name, log_file, log_level, append_date_to_logfile_name=True, datetime_format=None):
+    def __init__(self, logger_name, log_file, log_level, append_date_to_logfile_name=True, datetime_format=None, buffered=False, flush_interval_seconds=1.0, max_batch_size=1000):
         self.logger_name = logger_name
         self.log_file = log_file
         self.log_level = log_level
+        self.append_date_to_logfile_name = append_date_to_logfile_name
 
         if self.log_file is not None:
             self.log_file_dir = os.path.dirname(self.log_file)
             self.log_file_name = os.path.basename(self.log_file)
+            splitted_name = self.log_file.split('.')
+            self._log_file_prefix = ".".join(splitted_name[:-1])
+            self._log_file_suffix = splitted_name[-1]
 
         if datetime_format is None:
             datetime_format = "%Y-%m-%d %H:%M:%S.%f"
         self.datetime_format = datetime_format
 
+        # buffered mode keeps one file handle open and writes from a background thread
+        self.buffered = buffered and self.log_file is not None
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_batch_size = max_batch_size
+        self._queue = None
+        # guards buffered and the queue, so no message is queued behind the stop sentinel of close()
+        self._enqueue_lock = threading.Lock()
+        self._writer_thread = None
+        self._file = None
+        self._file_date = None
+        # written lines and the seconds spent writing them to the log file, for the metrics
+        self.written_lines = 0
+        self.write_seconds = 0.0
+        if self.buffered:
+            self._queue = queue.Queue()
+            self._writer_thread = threading.Thread(target=self._write_loop, name="SimpleLogger-{0}".format(self.logger_name), daemon=True)
+            self._writer_thread.start()
+            atexit.register(self.close)
+
     def log(self, log_message, log_level):
         if (log_level <= self.log_level):
-            full_log_message = "[{0}][{1}][{2}]: {3}".format(dt.now().strftime(self.datetime_format), log_level.name, self.logger_name, log_message)
+            now = dt.now()
+            full_log_message = "[{0}][{1}][{2}]: {3}".format(now.strftime(self.datetime_format), log_level.name, self.logger_name, log_message)
             print(full_log_message)
-            self._log_to_file(full_log_message)
+            queued = False
+            if self._queue is not None:
+                with self._enqueue_lock:
+                    if self.buffered:
+                        self._queue.put((now, full_log_message))
+                        queued = True
+            if queued:
+                # make sure errors are on disk, even if the process dies right after
+                if log_level <= LogLevel.ERROR:
+                    self.flush()
+            else:
+                self._log_to_file(full_log_message)
+
+    def flush(self):
+        '''
+            Blocks until every queued message has been written and flushed to the log file.
+        '''
+        writer_thread = self._writer_thread
+        if writer_thread is not None and writer_thread.is_alive():
+            self._queue.join()
+
+    def get_queue_depth(self):
+        '''
+            Returns the amount of messages, that wait for the background writer.
+        '''
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def close(self):
+        writer_thread = self._writer_thread
+        if writer_thread is None:
+            return
+        # later messages go straight to the file again
+        with self._enqueue_lock:
+            self.buffered = False
+            self._queue.put(None)
+        writer_thread.join()
+        self._writer_thread = None
+        atexit.unregister(self.close)
+
+    def _get_log_file_location(self, log_date):
+        if not self.append_date_to_logfile_name:
+            return self.log_file
+        return "{0}.{1}.{2}".format(self._log_file_prefix, log_date.strftime("%Y-%m-%d"), self._log_file_suffix)
 
     def _log_to_file(self, full_log_message):
         if self.log_file is not None:
+            write_started = perf_counter()
 
-            splitted_name = self.log_file.split('.')
-            log_file_location = "{0}.{1}.{2}".format(".".join(splitted_name[:-1]), dt.now().strftime("%Y-%m-%d"), splitted_name[-1])
+            log_file_location = self._get_log_file_location(dt.now())
 
 
             if not os.path.isfile(log_file_location):
@@ -40,8 +110,55 @@ class SimpleLogger(object):
 
             with open(log_file_location, 'a', opener=opener) as f:
                 print(full_log_message, file=f)
-            
+
             os.close(dir_fd)
+            self.write_seconds += perf_counter() - write_started
+            self.written_lines += 1
+
+    def _write_loop(self):
+        running = True
+        while running:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval_seconds)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            write_started = perf_counter()
+            try:
+                for item in batch:
+                    if item is None:
+                        running = False
+                        continue
+                    log_time, full_log_message = item
+                    # rotate only when the date changes
+                    if self._file is None or (self.append_date_to_logfile_name and log_time.date() != self._file_date):
+                        self._open_file(log_time)
+                    self._file.write(full_log_message)
+                    self._file.write("\n")
+                    self.written_lines += 1
+                if self._file is not None:
+                    self._file.flush()
+            except Exception as ex:
+                print("[{0}][{1}][{2}]: Failed to write log file! Error Message: '{3}'".format(dt.now().strftime(self.datetime_format), LogLevel.ERROR.name, self.logger_name, ex))
+            finally:
+                self.write_seconds += perf_counter() - write_started
+                for item in batch:
+                    self._queue.task_done()
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open_file(self, log_time):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self._get_log_file_location(log_time), 'a')
+        self._file_date = log_time.date()
 
 
 class LogLevel(IntEnum):
@@ -50,4 +167,4 @@ class LogLevel(IntEnum):
     WARN=3
     INFO=4
     DEBUG=5
-    TRACE=6
\ No newline at end of file
+    TRACE=6
@@ -0,0 +1,66 @@
+import json
+from datetime import datetime as dt
+
+import pytest
+
+from autowipe import WipeInstance, WipeAction, WIPE_ACTION_KEYS
+from wipejournal import WipeJournal
+
+
+def get_instance(tmp_path, wipe_succeeds):
+    instance = WipeInstance("server1")
+    instance.journal = WipeJournal(str(tmp_path / "autowipe.journal"))
+    instance.wipe_command_retries_on_fail = 0
+    instance.run_wipe_steps = lambda wipe_action: wipe_succeeds
+    return instance
+
+
+@pytest.mark.parametrize("wipe_action", [WipeAction.BP_WIPE, WipeAction.MAP_WIPE])
+def test_failed_triggered_wipe_on_fresh_instance(tmp_path, wipe_action):
+    instance = get_instance(tmp_path, False)
+    instance.trigger_wipe(wipe_action)
+
+    assert instance.execute_wipe_action(wipe_action) is False
+    # not retried, not given up and the server stays enabled
+    assert instance.pending_retries == {}
+    assert instance.given_up_wipe_dates == {}
+    assert instance.failed is False
+    assert instance.triggered_wipes == set()
+
+    state = instance.get_state()
+    json.dumps(state)
+    record = instance.journal.load_last()
+    assert record["e"] == "fail"
+    assert record["w"] == WIPE_ACTION_KEYS[wipe_action]
+    assert record["s"] == state
+
+
+def test_triggered_wipe_keeps_last_wipe_date(tmp_path):
+    instance = get_instance(tmp_path, True)
+    instance.trigger_wipe(WipeAction.MAP_WIPE)
+
+    assert instance.execute_wipe_action(WipeAction.MAP_WIPE) is True
+    assert instance.last_map_wipe_date is None
+    assert instance.get_state()["map"] is None
+
+
+def test_triggered_wipe_waiting_for_lease_serializes(tmp_path):
+    instance = get_instance(tmp_path, False)
+    instance.lease_location = str(tmp_path / "lease")
+    other = get_instance(tmp_path, False)
+    other.lease_location = instance.lease_location
+    other.lease_holder = "node2"
+    other_lease = other.create_lease()
+    assert other_lease.acquire() is True
+
+    instance.lease_holder = "node1"
+    instance.trigger_wipe(WipeAction.MAP_WIPE)
+    assert instance.execute_wipe_action(WipeAction.MAP_WIPE) is None
+    assert instance.pending_retries[WipeAction.MAP_WIPE][1] == dt.now(instance.time_zone).date()
+    json.dumps(instance.get_state())
+
+    other_lease.release()
+    assert instance.execute_wipe_action(WipeAction.MAP_WIPE) is False
+    assert instance.pending_retries == {}
+    assert instance.failed is False
+    json.dumps(instance.get_state())
@@ -0,0 +1,64 @@
+import os
+import sys
+
+import pytest
+
+from processlimits import ProcessLimits, parse_process_limits, parse_cpus, format_cpus
+from processrunner import run_process
+
+# the command prints the limits of a child, that it forks right away
+CHILD_LIMITS_COMMAND=[sys.executable, "-c", "import os, subprocess, sys; subprocess.run([sys.executable, '-c', 'import os, subprocess; print(os.getpriority(os.PRIO_PROCESS, 0)); print(sorted(os.sched_getaffinity(0))); subprocess.run([\"ionice\", \"-p\", str(os.getpid())])'])"]
+
+
+def run_limited(limits, cgroup_path=None):
+    messages = []
+    result = run_process(limits.limit_command(CHILD_LIMITS_COMMAND, cgroup_path, messages.append))
+    assert result.succeeded
+    return result.output.get_text().splitlines(), messages
+
+
+def test_children_inherit_limits_from_the_start():
+    cpu = min(os.sched_getaffinity(0))
+    lines, messages = run_limited(ProcessLimits(nice=os.getpriority(os.PRIO_PROCESS, 0) + 5, ionice_class="idle", cpus={cpu}))
+    assert messages == []
+    assert int(lines[0]) == os.getpriority(os.PRIO_PROCESS, 0) + 5
+    assert lines[1] == str([cpu])
+    assert lines[2] == "idle"
+
+
+def test_unavailable_cpus_are_skipped():
+    unavailable_cpu = max(os.sched_getaffinity(0)) + 1
+    lines, messages = run_limited(ProcessLimits(cpus={unavailable_cpu}))
+    assert lines[1] == str(sorted(os.sched_getaffinity(0)))
+    assert len(messages) == 1
+
+
+def test_failed_cgroup_move_still_runs_the_command(tmp_path):
+    limits = ProcessLimits(nice=os.getpriority(os.PRIO_PROCESS, 0) + 1)
+    result = run_process(limits.limit_command(["true"], str(tmp_path / "missing")))
+    assert result.succeeded
+    assert "Failed to move the command into the cgroup" in result.output.get_text()
+
+
+def test_cgroup_procs_is_written_before_exec(tmp_path):
+    # a plain file stands in for the cgroup.procs of a real cgroup
+    (tmp_path / "cgroup.procs").write_text("")
+    result = run_process(ProcessLimits().limit_command(["sh", "-c", "echo $$"], str(tmp_path)))
+    assert result.succeeded
+    assert (tmp_path / "cgroup.procs").read_text().strip() == result.output.get_text().strip()
+
+
+def test_without_limits_the_command_is_unchanged():
+    assert ProcessLimits().limit_command("wipe.sh 'map wipe'") == ["wipe.sh", "map wipe"]
+
+
+def test_parse_process_limits():
+    limits = parse_process_limits({"nice": "10", "ionice": "best-effort:7", "cpus": "0-2,5", "cpu_weight": "20"})
+    assert limits == ProcessLimits(nice=10, ionice_class="best-effort", ionice_level=7, cpus={0, 1, 2, 5}, cpu_weight=20)
+    assert format_cpus(parse_cpus("0-2,5")) == "0-2,5"
+
+
+@pytest.mark.parametrize("limits_data", [{"nice": "20"}, {"ionice": "idle:1"}, {"ionice": "low"}, {"io_weight": "0"}, {"cpu": "1"}])
+def test_invalid_process_limits_are_rejected(limits_data):
+    with pytest.raises(Exception):
+        parse_process_limits(limits_data)
@@ -0,0 +1,47 @@
+import os
+import time
+import threading
+
+import pytest
+
+from simplelogger import SimpleLogger, LogLevel
+
+
+@pytest.mark.parametrize("round", range(20))
+def test_close_keeps_concurrent_records(tmp_path, capsys, round):
+    '''
+        Records logged by other threads while the buffered logger closes are written, either by the writer thread or
+        straight to the file after it.
+    '''
+    log_file = os.path.join(str(tmp_path), "autowipe.log")
+    logger = SimpleLogger("Test", log_file, LogLevel.INFO, False, buffered=True)
+    stopped = threading.Event()
+    counts = [0] * 4
+
+    def log_lines(index):
+        while not stopped.is_set():
+            logger.log("Line", LogLevel.INFO)
+            counts[index] += 1
+
+    threads = [threading.Thread(target=log_lines, args=(index,)) for index in range(len(counts))]
+    for thread in threads:
+        thread.start()
+    while sum(counts) < 1000:
+        time.sleep(0.001)
+    logger.close()
+    stopped.set()
+    for thread in threads:
+        thread.join()
+
+    with open(log_file) as log:
+        assert sum(1 for line in log) == sum(counts)
+
+def test_log_file_name_without_date(tmp_path, capsys):
+    log_file = os.path.join(str(tmp_path), "autowipe.log")
+    for buffered in (False, True):
+        logger = SimpleLogger("Test", log_file, LogLevel.INFO, False, buffered=buffered)
+        logger.log("Line", LogLevel.INFO)
+        logger.close()
+    assert os.listdir(str(tmp_path)) == ["autowipe.log"]
+    with open(log_file) as log:
+        assert len(log.readlines()) == 2
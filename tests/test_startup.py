@@ -0,0 +1,24 @@
+import os
+import sys
+import subprocess
+
+from benchmark import STARTUP_TARGET_SECONDS, benchmark_startup, check_startup
+
+# only imported, once they are needed, see benchmark.py --startup-only
+LAZY_MODULES=["asyncio", "ctypes", "numpy", "platform", "random", "processrunner", "processlimits", "wipelease", "wipereadiness", "wipesnapshot", "wipebacktest"]
+
+
+def test_check_startup_within_target():
+    '''
+        A "--check" run without a due wipe, like a systemd timer starts it every minute, may only take
+        STARTUP_TARGET_SECONDS longer than the bare python interpreter.
+    '''
+    # the fastest of many runs, the others are disturbed by the rest of the machine
+    overhead, within_target = check_startup(benchmark_startup(repeat=15))
+    assert within_target, "'--check' took {0:.1f}ms longer than python itself, the target is {1:.0f}ms! Check for new imports at module level of autowipe.py.".format(overhead * 1000, STARTUP_TARGET_SECONDS * 1000)
+
+def test_no_lazy_module_imported_at_startup():
+    script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    output = subprocess.run([sys.executable, "-c", "import sys, autowipe; print(' '.join(sorted(sys.modules)))"], cwd=script_dir, stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+    imported_modules = set(output.split())
+    assert [module for module in LAZY_MODULES if module in imported_modules] == []
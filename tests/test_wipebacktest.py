@@ -0,0 +1,53 @@
+from datetime import date
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import wipebacktest
+from wiperule import compile_wipe_types, compile_wipe_schedule
+from test_wipetypes import FIRST_WIPE_DATES, START_DATE, END_DATE, check_wipe_by_type, _get_dates
+
+RULE_SETS=[([1], [4]), ([2], [4]), ([2], [1, 4]), ([3], [4]), ([7], [1, 3, 5, 7]), ([2, 3], [4]), ([1, 2, 3, 4, 5, 6, 7], [1, 4])]
+
+
+def get_first_release_wipe_dates(wipe_types, wipe_days, first_wipe_date, start_date=START_DATE):
+    '''
+        Runs the day check of the first release once per day like the daemon, which sets the last wipe date after every wipe.
+    '''
+    wipe_dates = []
+    last_wipe_date = None
+    for current_date in _get_dates():
+        if any(check_wipe_by_type(wipe_type, wipe_days, "1800", first_wipe_date, last_wipe_date, current_date, "1800") for wipe_type in wipe_types):
+            last_wipe_date = current_date
+            if current_date >= start_date:
+                wipe_dates.append(current_date)
+    return wipe_dates
+
+
+@pytest.mark.parametrize("first_wipe_date", FIRST_WIPE_DATES)
+@pytest.mark.parametrize("wipe_types, wipe_days", RULE_SETS)
+def test_backtest_matches_first_release(wipe_types, wipe_days, first_wipe_date):
+    expected = get_first_release_wipe_dates(wipe_types, wipe_days, first_wipe_date)
+    assert wipebacktest.to_dates(wipebacktest.get_wipe_dates(wipe_types, wipe_days, first_wipe_date, START_DATE, END_DATE)) == expected
+    wipe_rule = compile_wipe_types(wipe_types, wipe_days, "1800", first_wipe_date)
+    assert wipebacktest.to_dates(wipebacktest.get_rule_wipe_dates(wipe_rule, START_DATE, END_DATE)) == expected
+
+@pytest.mark.parametrize("wipe_types, wipe_days", [([2], [4]), ([2, 3], [1, 4])])
+def test_backtest_window_after_first_wipe_date(wipe_types, wipe_days):
+    # the every 2nd week type still counts from the wipes before the window
+    start_date = date(2023, 5, 17)
+    first_wipe_date = FIRST_WIPE_DATES[1]
+    expected = get_first_release_wipe_dates(wipe_types, wipe_days, first_wipe_date, start_date)
+    assert wipebacktest.to_dates(wipebacktest.get_wipe_dates(wipe_types, wipe_days, first_wipe_date, start_date, END_DATE)) == expected
+
+def test_schedule_backtest_matches_rule():
+    wipe_rule = compile_wipe_schedule("0 18 * * 4#1", first_wipe_date=date(2021, 2, 4))
+    wipe_dates = wipebacktest.to_dates(wipebacktest.get_rule_wipe_dates(wipe_rule, START_DATE, END_DATE))
+    assert wipe_dates[0] == date(2021, 2, 4)
+    assert wipe_dates == [current_date for current_date in _get_dates() if wipe_rule.is_due(current_date, "1800")]
+
+def test_clash_dates():
+    bp_wipe_dates = wipebacktest.get_wipe_dates([3], [4], date(2021, 2, 4), date(2021, 1, 1), date(2021, 12, 31))
+    map_wipe_dates = wipebacktest.get_wipe_dates([1], [4], date(2021, 1, 7), date(2021, 1, 1), date(2021, 12, 31))
+    assert wipebacktest.to_dates(wipebacktest.get_clash_dates(bp_wipe_dates, map_wipe_dates)) == wipebacktest.to_dates(bp_wipe_dates)
@@ -0,0 +1,82 @@
+import os
+import json
+import stat
+import socket
+
+import pytest
+
+import wipecontrol
+from wipecontrol import start_control_server, send_request, MAX_REQUEST_BYTES
+
+
+def handle_request(request):
+    if request["command"] == "fail":
+        raise Exception("Failed!")
+    return {"command": request["command"]}
+
+@pytest.fixture
+def control_socket(tmp_path):
+    socket_path = str(tmp_path / "autowipe.sock")
+    server = start_control_server(socket_path, handle_request, log=lambda message: None)
+    yield socket_path
+    server.shutdown()
+    server.server_close()
+
+
+def test_request_and_error(control_socket):
+    assert send_request(control_socket, {"command": "status"}) == {"command": "status"}
+    with pytest.raises(Exception, match="Failed!"):
+        send_request(control_socket, {"command": "fail"})
+    with pytest.raises(Exception, match="needs a 'command'"):
+        send_request(control_socket, {"server": "server1"})
+
+def test_socket_is_created_without_access_for_others(tmp_path, monkeypatch):
+    # a wide umask must not leave the socket open to other users for a moment
+    previous_umask = os.umask(0)
+    modes = []
+    original_chmod = os.chmod
+    try:
+        monkeypatch.setattr(os, "chmod", lambda path, mode, *args, **kwargs: modes.append(mode) or original_chmod(path, mode, *args, **kwargs))
+        socket_path = str(tmp_path / "autowipe.sock")
+        server = start_control_server(socket_path, handle_request, log=lambda message: None)
+    finally:
+        os.umask(previous_umask)
+    try:
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o660
+        assert modes == []
+        # the umask of the daemon is restored
+        assert os.umask(previous_umask) == previous_umask
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_too_long_request_is_not_read(control_socket):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(5)
+        client.connect(control_socket)
+        # a line without end, only the first MAX_REQUEST_BYTES + 1 bytes are read before the answer
+        client.sendall(b"x" * (MAX_REQUEST_BYTES + 1))
+        with client.makefile('rb') as reader:
+            response = json.loads(reader.readline())
+            assert response == {"ok": False, "error": "Request too long!"}
+            # the connection is closed, the rest of the line is no request
+            assert reader.readline() == b""
+    assert send_request(control_socket, {"command": "status"}) == {"command": "status"}
+
+def test_too_long_response_is_rejected(control_socket, monkeypatch):
+    monkeypatch.setattr(wipecontrol, "MAX_RESPONSE_BYTES", 10)
+    with pytest.raises(Exception, match="longer than 10 bytes"):
+        send_request(control_socket, {"command": "status"})
+
+def test_stale_socket_is_replaced(tmp_path):
+    socket_path = str(tmp_path / "autowipe.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+        stale.bind(socket_path)
+    server = start_control_server(socket_path, handle_request, log=lambda message: None)
+    try:
+        assert send_request(socket_path, {"command": "next"}) == {"command": "next"}
+        with pytest.raises(Exception, match="used by another running daemon"):
+            start_control_server(socket_path, handle_request, log=lambda message: None)
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,59 @@
+import json
+
+import wipejournal
+from wipejournal import WipeJournal, EVENT_START, EVENT_FINISH, EVENT_FAIL
+
+
+def get_journal(tmp_path):
+    return WipeJournal(str(tmp_path / "autowipe.journal"))
+
+
+def test_missing_journal(tmp_path):
+    journal = get_journal(tmp_path)
+    assert journal.load_last() is None
+    assert list(journal.history()) == []
+
+def test_newest_record_after_appends(tmp_path):
+    journal = get_journal(tmp_path)
+    for day in range(1, 30):
+        journal.append(EVENT_START, "map", {"map": "2026-10-{0:02d}".format(day - 1)})
+        journal.append(EVENT_FINISH, "map", {"map": "2026-10-{0:02d}".format(day)}, "wipe")
+    record = journal.load_last()
+    assert record["e"] == EVENT_FINISH
+    assert record["w"] == "map"
+    assert record["n"] == "wipe"
+    assert record["s"] == {"map": "2026-10-29"}
+    assert len(list(journal.history())) == 58
+
+def test_torn_last_line_is_skipped(tmp_path):
+    journal = get_journal(tmp_path)
+    journal.append(EVENT_START, "bp", {"bp": None})
+    journal.append(EVENT_FINISH, "bp", {"bp": "2026-10-01"})
+    # the daemon died while writing the next record
+    line = json.dumps({"t": 1.0, "e": EVENT_FAIL, "w": "bp", "s": {"bp": "2026-10-02"}})
+    with open(journal.journal_file, 'a') as journal_file:
+        journal_file.write(line[:len(line) // 2])
+    assert journal.load_last()["s"] == {"bp": "2026-10-01"}
+    assert [record["e"] for record in journal.history()] == [EVENT_START, EVENT_FINISH]
+
+    # the next record starts on a new line after the torn one
+    journal.append(EVENT_FAIL, "bp", {"bp": "2026-10-03"})
+    assert journal.load_last()["s"] == {"bp": "2026-10-03"}
+    assert [record["e"] for record in journal.history()] == [EVENT_START, EVENT_FINISH, EVENT_FAIL]
+
+def test_records_longer_than_a_block(tmp_path, monkeypatch):
+    # the file is read backwards in blocks, a record may start in an earlier block
+    monkeypatch.setattr(wipejournal, "READ_BLOCK_SIZE", 16)
+    journal = get_journal(tmp_path)
+    journal.append(EVENT_START, "map", {"h": {"map.wipe": [1.0] * 20}})
+    journal.append(EVENT_FINISH, "map", {"h": {"map.wipe": [2.0] * 20}})
+    assert journal.load_last()["s"] == {"h": {"map.wipe": [2.0] * 20}}
+    with open(journal.journal_file, 'a') as journal_file:
+        journal_file.write("\n\n{\"e\": ")
+    assert journal.load_last()["s"] == {"h": {"map.wipe": [2.0] * 20}}
+
+def test_only_torn_record(tmp_path):
+    journal = get_journal(tmp_path)
+    with open(journal.journal_file, 'w') as journal_file:
+        journal_file.write("{\"t\": 1.0, \"e\": \"sta")
+    assert journal.load_last() is None
@@ -0,0 +1,85 @@
+import json
+import time
+
+import pytest
+
+from wipelease import FileLease, create_lease
+
+TTL_SECONDS=0.3
+
+
+def get_leases(tmp_path, ttl_seconds=60):
+    location = str(tmp_path / "autowipe.lease")
+    return FileLease(location, "node1", ttl_seconds), FileLease(location, "node2", ttl_seconds)
+
+
+def test_second_holder_refused_while_lease_is_live(tmp_path):
+    lease, other_lease = get_leases(tmp_path)
+    assert lease.acquire() is True
+    assert other_lease.acquire() is False
+    assert other_lease.current_holder == "node1"
+    assert other_lease.expires > time.time()
+    # the holder itself may take it again, e.g. after a restart during a wipe
+    assert lease.acquire() is True
+
+def test_second_holder_takes_over_after_ttl(tmp_path):
+    lease, other_lease = get_leases(tmp_path, TTL_SECONDS)
+    assert lease.acquire() is True
+    time.sleep(TTL_SECONDS + 0.1)
+    assert other_lease.acquire() is True
+    assert other_lease.current_holder == "node2"
+    # the node, that lost its lease, can not renew or release it anymore
+    assert lease.renew() is False
+    assert lease.release() is False
+    assert other_lease.acquire() is True
+
+def test_release_records_wipe_date(tmp_path):
+    lease, other_lease = get_leases(tmp_path)
+    assert lease.acquire() is True
+    assert lease.release("map", "2026-10-15") is True
+    assert other_lease.acquire() is True
+    assert other_lease.get_wipe_date("map") == "2026-10-15"
+    assert other_lease.get_wipe_date("bp") is None
+    # a release without a wipe keeps the recorded dates
+    assert other_lease.release() is True
+    assert lease.acquire() is True
+    assert lease.get_wipe_date("map") == "2026-10-15"
+
+@pytest.mark.parametrize("data", ["{\"holder\": \"node1\", \"expi", "\x00\x00\x00", "   "])
+def test_corrupt_lease_file_is_free(tmp_path, data):
+    lease, other_lease = get_leases(tmp_path)
+    with open(lease.location, 'w') as lease_file:
+        lease_file.write(data)
+    assert other_lease.acquire() is True
+    with open(lease.location) as lease_file:
+        assert json.load(lease_file)["holder"] == "node2"
+
+def test_heartbeat_keeps_lease_until_release(tmp_path):
+    lease, other_lease = get_leases(tmp_path, TTL_SECONDS)
+    messages = []
+    assert lease.acquire() is True
+    lease.start_heartbeat(messages.append)
+    time.sleep(TTL_SECONDS * 3)
+    assert other_lease.acquire() is False
+    assert lease.release("bp", "2026-10-01") is True
+    time.sleep(TTL_SECONDS)
+    # a released lease is not renewed again
+    with open(lease.location) as lease_file:
+        assert json.load(lease_file)["holder"] is None
+    assert messages == []
+
+def test_heartbeat_logs_lost_lease(tmp_path):
+    lease, other_lease = get_leases(tmp_path, TTL_SECONDS)
+    messages = []
+    assert lease.acquire() is True
+    lease.start_heartbeat(messages.append)
+    # another node, whose clock is ahead, takes the lease over between two renewals
+    with open(lease.location, 'w') as lease_file:
+        json.dump({"holder": "node2", "expires": time.time() + 60}, lease_file)
+    time.sleep(TTL_SECONDS)
+    assert len(messages) == 1
+    assert "node2" in messages[0]
+
+def test_invalid_backend_is_rejected(tmp_path):
+    with pytest.raises(Exception):
+        create_lease("redis", str(tmp_path / "autowipe.lease"), "node1", 60)
@@ -0,0 +1,100 @@
+import socket
+import threading
+
+import pytest
+
+from wipereadiness import ReadinessProbe, A2S_INFO_REQUEST, READ_BLOCK_SIZE, get_log_offsets, parse_readiness_probes, wait_until_ready
+
+TIMEOUT_SECONDS=1
+INTERVAL_SECONDS=0.05
+
+
+def wait(probes, log_offsets=None, timeout_seconds=TIMEOUT_SECONDS):
+    return wait_until_ready(probes, timeout_seconds, INTERVAL_SECONDS, log_offsets, log=lambda message: None)
+
+@pytest.fixture
+def tcp_socket():
+    tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    tcp_socket.bind(("127.0.0.1", 0))
+    yield tcp_socket
+    tcp_socket.close()
+
+@pytest.fixture
+def udp_socket():
+    udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp_socket.bind(("127.0.0.1", 0))
+    yield udp_socket
+    udp_socket.close()
+
+
+def test_tcp_probe_ready(tcp_socket):
+    tcp_socket.listen()
+    probe = ReadinessProbe("tcp", "127.0.0.1", tcp_socket.getsockname()[1])
+    assert wait([probe])[probe.name] is not None
+
+def test_tcp_probe_timeout(tcp_socket):
+    # bound, but not listening: every connection is refused
+    probe = ReadinessProbe("tcp", "127.0.0.1", tcp_socket.getsockname()[1])
+    assert wait([probe]) == {probe.name: None}
+
+def test_udp_probe_ready(udp_socket):
+    requests = []
+
+    def answer():
+        data, address = udp_socket.recvfrom(1024)
+        requests.append(data)
+        udp_socket.sendto(b"\xff\xff\xff\xffI", address)
+
+    answer_thread = threading.Thread(target=answer, daemon=True)
+    answer_thread.start()
+    probe = ReadinessProbe("udp", "127.0.0.1", udp_socket.getsockname()[1])
+    assert wait([probe])[probe.name] is not None
+    answer_thread.join(TIMEOUT_SECONDS)
+    assert requests == [A2S_INFO_REQUEST]
+
+def test_udp_probe_timeout(udp_socket):
+    # the query port receives the request, but never answers
+    probe = ReadinessProbe("udp", "127.0.0.1", udp_socket.getsockname()[1])
+    assert wait([probe]) == {probe.name: None}
+
+def test_log_probe_ready(tmp_path):
+    log_file = tmp_path / "server.log"
+    log_file.write_text("Server startup complete\n")
+    probe = ReadinessProbe("log", path=str(log_file), marker="Server startup complete")
+    log_offsets = get_log_offsets([probe])
+
+    def write_marker():
+        # the marker is split between two reads of the probe
+        with open(str(log_file), 'a') as server_log:
+            server_log.write("x" * (READ_BLOCK_SIZE - 10) + "Server startup complete\n")
+
+    timer = threading.Timer(0.2, write_marker)
+    timer.start()
+    try:
+        assert wait([probe], log_offsets)[probe.name] is not None
+    finally:
+        timer.join()
+
+def test_log_probe_timeout(tmp_path):
+    # the marker of the previous run does not count
+    log_file = tmp_path / "server.log"
+    log_file.write_text("Server startup complete\n")
+    probe = ReadinessProbe("log", path=str(log_file), marker="Server startup complete")
+    log_offsets = get_log_offsets([probe])
+    with open(str(log_file), 'a') as server_log:
+        server_log.write("Loading prefabs\n")
+    assert wait([probe], log_offsets) == {probe.name: None}
+
+def test_all_probes_must_succeed(tcp_socket, tmp_path):
+    tcp_socket.listen()
+    tcp_probe = ReadinessProbe("tcp", "127.0.0.1", tcp_socket.getsockname()[1])
+    log_probe = ReadinessProbe("log", path=str(tmp_path / "missing.log"), marker="Server startup complete")
+    ready_seconds = wait([tcp_probe, log_probe])
+    assert ready_seconds[tcp_probe.name] is not None
+    assert ready_seconds[log_probe.name] is None
+
+def test_parse_readiness_probes():
+    probes = parse_readiness_probes([{"type": "udp", "port": "28015"}, {"type": "log", "path": "server.log", "marker": "Server startup complete"}])
+    assert probes == [ReadinessProbe("udp", "127.0.0.1", 28015), ReadinessProbe("log", path="server.log", marker="Server startup complete")]
+    with pytest.raises(Exception):
+        parse_readiness_probes([{"type": "tcp"}])
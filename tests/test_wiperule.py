@@ -0,0 +1,83 @@
+from datetime import date
+from datetime import timedelta
+
+import pytest
+
+from wiperule import compile_wipe_schedule
+
+START_DATE=date(2024, 1, 1)
+END_DATE=date(2026, 12, 31)
+
+
+def get_wipe_dates(wipe_rule, start_date=START_DATE, end_date=END_DATE):
+    '''
+        Returns every wipe date between start_date and end_date, the last wipe date is set after every wipe like the daemon does.
+    '''
+    wipe_dates = []
+    wipe_date = wipe_rule.get_next_wipe_date(start_date, None, end_date)
+    while wipe_date is not None:
+        wipe_dates.append(wipe_date)
+        wipe_date = wipe_rule.get_next_wipe_date(wipe_date, wipe_date, end_date)
+    return wipe_dates
+
+def get_dates(matches, start_date=START_DATE, end_date=END_DATE):
+    return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1) if matches(start_date + timedelta(days=offset))]
+
+def is_nth_weekday(current_date, weekday, n):
+    return current_date.isoweekday() == weekday and (current_date.day - 1) // 7 + 1 == n
+
+def is_last_weekday(current_date, weekday):
+    return current_date.isoweekday() == weekday and (current_date + timedelta(days=7)).month != current_date.month
+
+
+def test_cron_last_weekday():
+    wipe_rule = compile_wipe_schedule("0 18 * * 4L")
+    assert wipe_rule.wipe_time == "1800"
+    assert get_wipe_dates(wipe_rule) == get_dates(lambda current_date: is_last_weekday(current_date, 4))
+
+def test_cron_last_day_of_month():
+    wipe_rule = compile_wipe_schedule("30 6 L * *")
+    assert wipe_rule.wipe_time == "0630"
+    assert get_wipe_dates(wipe_rule) == get_dates(lambda current_date: (current_date + timedelta(days=1)).day == 1)
+
+def test_cron_nth_weekday():
+    wipe_rule = compile_wipe_schedule("0 18 * * THU#2,FRI#5")
+    assert get_wipe_dates(wipe_rule) == get_dates(lambda current_date: is_nth_weekday(current_date, 4, 2) or is_nth_weekday(current_date, 5, 5))
+
+def test_cron_day_of_month_or_weekday():
+    # like cron, a day matches the days of the month or the weekdays, if both are restricted
+    wipe_rule = compile_wipe_schedule("0 18 1,15 JAN-MAR MON")
+    assert get_wipe_dates(wipe_rule) == get_dates(lambda current_date: current_date.month <= 3 and (current_date.day in (1, 15) or current_date.isoweekday() == 1))
+
+def test_rrule_weekly_interval():
+    first_wipe_date = date(2024, 1, 4)
+    wipe_rule = compile_wipe_schedule("RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=TH", "1800", first_wipe_date)
+    assert get_wipe_dates(wipe_rule) == get_dates(lambda current_date: current_date.isoweekday() == 4 and (current_date - first_wipe_date).days % 14 == 0)
+
+def test_rrule_monthly_interval():
+    first_wipe_date = date(2024, 2, 1)
+    wipe_rule = compile_wipe_schedule("FREQ=MONTHLY;INTERVAL=3;BYDAY=1TH;BYHOUR=19;BYMINUTE=0", "1800", first_wipe_date)
+    assert wipe_rule.wipe_time == "1900"
+    assert get_wipe_dates(wipe_rule) == get_dates(lambda current_date: current_date.month % 3 == 2 and is_nth_weekday(current_date, 4, 1))
+
+def test_rrule_exrule():
+    first_wipe_date = date(2024, 1, 4)
+    wipe_rule = compile_wipe_schedule(["RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=TH", "EXRULE:FREQ=MONTHLY;BYDAY=1TH"], "1800", first_wipe_date)
+    assert get_wipe_dates(wipe_rule) == get_dates(lambda current_date: current_date.isoweekday() == 4 and (current_date - first_wipe_date).days % 14 == 0 and not is_nth_weekday(current_date, 4, 1))
+
+def test_rrule_until():
+    wipe_rule = compile_wipe_schedule("RRULE:FREQ=MONTHLY;BYMONTHDAY=-1;UNTIL=20250630", "1800", date(2024, 1, 1))
+    assert get_wipe_dates(wipe_rule) == get_dates(lambda current_date: (current_date + timedelta(days=1)).day == 1 and current_date <= date(2025, 6, 30))
+
+def test_leap_day_is_accepted():
+    assert get_wipe_dates(compile_wipe_schedule("0 18 29 2 *")) == [date(2024, 2, 29)]
+
+@pytest.mark.parametrize("expression", ["0 18 31 2 *", "0 18 30 2 *", "0 18 31 4,6,9,11 *", "RRULE:FREQ=MONTHLY;BYMONTH=2;BYMONTHDAY=30", "RRULE:FREQ=WEEKLY;BYDAY=TH;UNTIL=20230101", ["RRULE:FREQ=WEEKLY;BYDAY=TH", "EXRULE:FREQ=DAILY"]])
+def test_schedule_without_wipe_date_is_rejected(expression):
+    with pytest.raises(Exception, match="no wipe date within 8 years"):
+        compile_wipe_schedule(expression, "1800", date(2024, 1, 1))
+
+@pytest.mark.parametrize("expression", ["0 18 * *", "0,30 18 * * 4", "0 18 * * 4#6", "0 24 * * 4", "RRULE:FREQ=YEARLY;BYMONTH=1", "RRULE:FREQ=WEEKLY;BYDAY=1TH", "RRULE:FREQ=WEEKLY;BYDAY=TH;COUNT=3"])
+def test_invalid_schedule_is_rejected(expression):
+    with pytest.raises(Exception):
+        compile_wipe_schedule(expression, "1800", date(2024, 1, 1))
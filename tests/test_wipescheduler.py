@@ -0,0 +1,199 @@
+from datetime import datetime as dt
+from datetime import timezone
+from datetime import timedelta
+
+import pytest
+
+from wipescheduler import WipeScheduler
+
+# 2026-03-29 00:00 UTC, at 01:00 UTC Europe/Berlin changes from CET to CEST
+START=dt(2026, 3, 29, tzinfo=timezone.utc)
+
+
+class FakeClock(object):
+    '''
+        Advances only, when the scheduler sleeps. jump() adds a wall clock jump or a suspend to the next sleep.
+    '''
+
+    def __init__(self, start=START):
+        self.wall_seconds = start.timestamp()
+        self.monotonic_seconds = 0.0
+        self.boottime_seconds = 0.0
+        self.slept = []
+        self._wall_jump_seconds = 0.0
+        self._suspend_seconds = 0.0
+
+    def now(self, time_zone):
+        return dt.fromtimestamp(self.wall_seconds, time_zone)
+
+    def wall(self):
+        return self.wall_seconds
+
+    def monotonic(self):
+        return self.monotonic_seconds
+
+    def boottime(self):
+        return self.boottime_seconds
+
+    def sleep(self, event, seconds):
+        self.slept.append(seconds)
+        if event.is_set():
+            seconds = 0.0
+        # a suspended system moves the wall clock and CLOCK_BOOTTIME on, but not CLOCK_MONOTONIC
+        self.wall_seconds += seconds + self._wall_jump_seconds + self._suspend_seconds
+        self.monotonic_seconds += seconds
+        self.boottime_seconds += seconds + self._suspend_seconds
+        self._wall_jump_seconds = 0.0
+        self._suspend_seconds = 0.0
+
+    def jump(self, wall_jump_seconds=0.0, suspend_seconds=0.0):
+        self._wall_jump_seconds = wall_jump_seconds
+        self._suspend_seconds = suspend_seconds
+
+
+class Rule(object):
+    '''
+        Fires every interval_seconds after START plus offset_seconds. Like a wipe rule, an instant stays due until it
+        fired, even if it is in the past. Records the now of every computation of its next instant.
+    '''
+
+    def __init__(self, offset_seconds, interval_seconds=3600):
+        self.offset_seconds = offset_seconds
+        self.interval_seconds = interval_seconds
+        self.fired = 0
+        self.calls = []
+
+    def __call__(self, now):
+        self.calls.append(now)
+        return START + timedelta(seconds=self.offset_seconds + self.fired * self.interval_seconds)
+
+
+def get_scheduler(rules, time_zone=timezone.utc, max_sleep_seconds=300):
+    clock = FakeClock()
+    messages = []
+    scheduler = WipeScheduler(rules, time_zone, lambda message, log_level=None: messages.append(message), max_sleep_seconds=max_sleep_seconds, clock=clock)
+    return scheduler, clock, messages
+
+def fire_all(scheduler, count):
+    fired = []
+    while len(fired) < count:
+        due_keys = sorted(scheduler.wait())
+        for key in due_keys:
+            scheduler.next_instant_functions[key].fired += 1
+        fired.extend(due_keys)
+        scheduler.reschedule(due_keys)
+    return fired
+
+
+def test_rules_fire_in_due_order():
+    scheduler, clock, messages = get_scheduler({"bp": Rule(600), "map": Rule(300), "prestage": Rule(900)}, max_sleep_seconds=3600)
+    assert fire_all(scheduler, 6) == ["map", "bp", "prestage", "map", "bp", "prestage"]
+    # the scheduler slept right until the next instant
+    assert clock.slept == [300, 300, 300, 3600 - 600, 300, 300]
+
+def test_sleep_is_capped_by_max_sleep():
+    scheduler, clock, messages = get_scheduler({"bp": Rule(1000)})
+    assert scheduler.wait() == []
+    assert scheduler.wait() == []
+    assert scheduler.wait() == []
+    assert scheduler.wait() == ["bp"]
+    assert clock.slept == [300, 300, 300, 100]
+
+def test_rescheduled_and_removed_rules_are_dropped_lazily():
+    bp_rule = Rule(300)
+    scheduler, clock, messages = get_scheduler({"bp": bp_rule, "map": Rule(600)})
+    scheduler.rebuild()
+    assert scheduler.next_fire() == (START + timedelta(seconds=300), "bp")
+
+    # the rule moves to a later instant, its old heap item stays until it reaches the top
+    bp_rule.offset_seconds = 900
+    scheduler.reschedule(["bp"])
+    assert len(scheduler._queue) == 3
+    assert scheduler.next_fire() == (START + timedelta(seconds=600), "map")
+    assert len(scheduler._queue) == 2
+
+    scheduler.remove("map")
+    assert scheduler.next_fire() == (START + timedelta(seconds=900), "bp")
+    assert len(scheduler._queue) == 1
+
+def test_paused_rules_do_not_fire():
+    scheduler, clock, messages = get_scheduler({"bp": Rule(300), "map": Rule(600)}, max_sleep_seconds=3600)
+    scheduler.rebuild()
+    scheduler.pause(["bp"])
+    assert scheduler.next_fire()[1] == "map"
+    # a reschedule, e.g. after a configuration reload, keeps it paused
+    scheduler.reschedule(["bp"])
+    assert scheduler.wait() == ["map"]
+    assert clock.slept == [600]
+
+    # bp is overdue, it fires right after the resume
+    scheduler.resume(["bp"])
+    assert scheduler.next_fire() == (START + timedelta(seconds=300), "bp")
+    assert sorted(scheduler.wait()) == ["bp", "map"]
+
+def test_wake_interrupts_sleep():
+    scheduler, clock, messages = get_scheduler({"bp": Rule(3000)})
+    scheduler.rebuild()
+    scheduler.wake()
+    assert scheduler.wait() == []
+    assert clock.wall() == START.timestamp()
+
+def test_wall_clock_jump_rebuilds_schedule():
+    bp_rule = Rule(7200)
+    scheduler, clock, messages = get_scheduler({"bp": bp_rule})
+    scheduler.rebuild()
+    # the clock is set 2 hours ahead, e.g. by NTP, while the scheduler sleeps
+    clock.jump(wall_jump_seconds=7200)
+    assert scheduler.wait() == ["bp"]
+    assert any("Wall clock jump of +7200 seconds" in message for message in messages)
+    assert bp_rule.calls[-1] == START + timedelta(seconds=7500)
+
+def test_wall_clock_jump_back_rebuilds_schedule():
+    bp_rule = Rule(600)
+    scheduler, clock, messages = get_scheduler({"bp": bp_rule})
+    scheduler.rebuild()
+    clock.jump(wall_jump_seconds=-3600)
+    assert scheduler.wait() == []
+    assert any("Wall clock jump of -3600 seconds" in message for message in messages)
+    assert bp_rule.calls[-1] == START - timedelta(seconds=3300)
+    # the instant is an hour further away now
+    assert scheduler.wait() == []
+    assert clock.slept[-1] == 300
+
+def test_suspend_rebuilds_schedule():
+    bp_rule = Rule(7200)
+    scheduler, clock, messages = get_scheduler({"bp": bp_rule})
+    scheduler.rebuild()
+    clock.jump(suspend_seconds=7200)
+    assert scheduler.wait() == ["bp"]
+    assert any("System suspend of 7200 seconds" in message for message in messages)
+    assert len(bp_rule.calls) == 2
+
+def test_small_clock_drift_is_ignored():
+    bp_rule = Rule(7200)
+    scheduler, clock, messages = get_scheduler({"bp": bp_rule})
+    scheduler.rebuild()
+    clock.jump(wall_jump_seconds=2)
+    assert scheduler.wait() == []
+    assert len(bp_rule.calls) == 1
+
+def test_utc_offset_change_rebuilds_schedule():
+    zoneinfo = pytest.importorskip("zoneinfo")
+    bp_rule = Rule(7200)
+    scheduler, clock, messages = get_scheduler({"bp": bp_rule}, zoneinfo.ZoneInfo("Europe/Berlin"), max_sleep_seconds=3000)
+    scheduler.rebuild()
+    # 00:50 UTC is still CET, 01:40 UTC already CEST
+    assert scheduler.wait() == []
+    assert len(bp_rule.calls) == 1
+    assert scheduler.wait() == []
+    assert any("changed from '1:00:00' to '2:00:00'" in message for message in messages)
+    assert len(bp_rule.calls) == 2
+    assert scheduler.wait() == ["bp"]
+
+def test_date_change_rebuilds_schedule():
+    bp_rule = Rule(90000, 86400)
+    scheduler, clock, messages = get_scheduler({"bp": bp_rule}, max_sleep_seconds=86400)
+    scheduler.rebuild()
+    assert scheduler.wait() == []
+    assert any("Date changed to '2026-03-30'" in message for message in messages)
+    assert len(bp_rule.calls) == 2
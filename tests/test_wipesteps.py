@@ -0,0 +1,152 @@
+import threading
+
+import pytest
+
+from wipesteps import WipeStep, parse_wipe_steps, run_wipe_steps, get_backoff_seconds, format_steps_result
+
+STEPS_DATA=[
+    {"name": "stop", "command": "rustserver stop"},
+    {"name": "update", "command": "rustserver update", "after": ["stop"]},
+    {"name": "mods", "command": "rustserver mods-update", "after": "stop"},
+    {"name": "wipe", "command": "rustserver wipe", "after": ["stop"]},
+    {"name": "start", "command": "rustserver start", "after": ["update", "mods", "wipe"]}
+]
+
+
+def get_names(steps):
+    return [step.name for step in steps]
+
+def run(steps, failing=(), max_parallel=1, completed_steps=()):
+    '''
+        Runs the steps with a fake command, that fails for the steps in failing. Returns the result and the names of
+        the steps in the order they were started.
+    '''
+    started = []
+    lock = threading.Lock()
+
+    def run_step(step):
+        with lock:
+            started.append(step.name)
+        return step.name not in failing
+
+    return run_wipe_steps(steps, run_step, max_parallel, lambda message: None, completed_steps), started
+
+
+def test_configured_order_is_kept():
+    assert get_names(parse_wipe_steps(STEPS_DATA)) == ["stop", "update", "mods", "wipe", "start"]
+
+def test_steps_come_after_their_dependencies():
+    steps_data = [
+        {"name": "start", "command": "start", "after": ["wipe"]},
+        {"name": "wipe", "command": "wipe", "after": ["stop"]},
+        {"name": "notify", "command": "notify"},
+        {"name": "stop", "command": "stop"}
+    ]
+    assert get_names(parse_wipe_steps(steps_data)) == ["stop", "wipe", "start", "notify"]
+
+def test_parsed_step_settings():
+    steps = parse_wipe_steps([{"name": "update", "command": "rustserver update", "timeout_seconds": "1800", "retries": "2", "retry_delay_seconds": "30"}])
+    assert steps == [WipeStep("update", "rustserver update", timeout_seconds=1800, retries=2, retry_delay_seconds=30)]
+
+def test_cycle_is_rejected():
+    steps_data = [
+        {"name": "stop", "command": "stop", "after": ["start"]},
+        {"name": "wipe", "command": "wipe", "after": ["stop"]},
+        {"name": "start", "command": "start", "after": ["wipe"]}
+    ]
+    with pytest.raises(Exception, match="cycle: stop -> start -> wipe -> stop"):
+        parse_wipe_steps(steps_data)
+
+def test_unknown_after_is_rejected():
+    with pytest.raises(Exception, match="unknown step 'stopp'"):
+        parse_wipe_steps([{"name": "wipe", "command": "wipe", "after": ["stopp"]}])
+
+@pytest.mark.parametrize("steps_data", [[], [{"name": "wipe"}], [{"name": "wipe", "command": "wipe"}, {"name": "wipe", "command": "wipe"}]])
+def test_invalid_steps_are_rejected(steps_data):
+    with pytest.raises(Exception):
+        parse_wipe_steps(steps_data)
+
+def test_all_steps_run_in_dependency_order():
+    result, started = run(parse_wipe_steps(STEPS_DATA), max_parallel=2)
+    assert result.succeeded
+    assert started[0] == "stop"
+    assert started[-1] == "start"
+    assert sorted(started) == sorted(get_names(result.steps))
+
+def test_no_step_starts_after_a_failure():
+    steps = [WipeStep("stop", "stop"), WipeStep("update", "update"), WipeStep("wipe", "wipe"), WipeStep("start", "start", ["update", "wipe"])]
+    result, started = run(steps, failing={"update"})
+    assert not result.succeeded
+    assert started == ["stop", "update"]
+    assert result.step_results["update"].succeeded is False
+    assert result.skipped_steps == ["wipe", "start"]
+
+def test_running_steps_finish_after_a_failure():
+    update_running = threading.Event()
+    wipe_may_finish = threading.Event()
+
+    def run_step(step):
+        if step.name == "update":
+            update_running.set()
+            wipe_may_finish.wait(5)
+            return True
+        if step.name == "wipe":
+            update_running.wait(5)
+            wipe_may_finish.set()
+            return False
+        return True
+
+    steps = [WipeStep("update", "update"), WipeStep("wipe", "wipe"), WipeStep("start", "start", ["update", "wipe"])]
+    result = run_wipe_steps(steps, run_step, 2, lambda message: None)
+    assert result.step_results["update"].succeeded is True
+    assert result.step_results["wipe"].succeeded is False
+    assert result.skipped_steps == ["start"]
+
+def test_critical_path():
+    result, started = run(parse_wipe_steps(STEPS_DATA))
+    # seconds since the start of the run, at which each step started and finished
+    timings = {"stop": (0, 10), "update": (10, 200), "mods": (10, 40), "wipe": (10, 60), "start": (200, 230)}
+    for name, (started_seconds, finished_seconds) in timings.items():
+        result.step_results[name].started_seconds = started_seconds
+        result.step_results[name].finished_seconds = finished_seconds
+    assert [step_result.step.name for step_result in result.get_critical_path()] == ["stop", "update", "start"]
+
+def test_critical_path_of_failed_run():
+    result, started = run(parse_wipe_steps(STEPS_DATA), failing={"stop"})
+    assert [step_result.step.name for step_result in result.get_critical_path()] == ["stop"]
+
+def test_completed_steps_are_skipped_on_resume():
+    result, started = run(parse_wipe_steps(STEPS_DATA), completed_steps=["stop", "update"])
+    assert result.succeeded
+    assert started == ["mods", "wipe", "start"]
+    assert result.step_results["stop"].resumed
+    assert result.step_results["update"].resumed
+    assert not result.step_results["start"].resumed
+    assert "Wipe step 'update' skipped, an earlier attempt already finished it" in format_steps_result(result)
+
+def test_failed_step_is_retried():
+    attempts = []
+
+    def run_step(step):
+        attempts.append(step.name)
+        return len(attempts) == 3
+
+    result = run_wipe_steps([WipeStep("update", "update", retries=2, retry_delay_seconds=0)], run_step, 1, lambda message: None)
+    assert result.succeeded
+    assert result.step_results["update"].attempts == 3
+
+def test_step_fails_after_its_retries():
+    result, started = run([WipeStep("update", "update", retries=1, retry_delay_seconds=0)], failing={"update"})
+    assert not result.succeeded
+    assert started == ["update", "update"]
+    assert result.step_results["update"].attempts == 2
+
+def test_backoff_doubles_up_to_max():
+    assert [get_backoff_seconds(retry, 60, 1800, 0) for retry in range(1, 8)] == [60, 120, 240, 480, 960, 1800, 1800]
+    # no overflow, however often a wipe failed
+    assert get_backoff_seconds(10000, 60, 1800, 0) == 1800
+
+def test_backoff_jitter():
+    backoffs = [get_backoff_seconds(3, 60, 1800, 0.2) for attempt in range(200)]
+    assert all(192 <= backoff_seconds <= 240 for backoff_seconds in backoffs)
+    assert len(set(backoffs)) > 1
@@ -0,0 +1,130 @@
+from functools import lru_cache
+from datetime import datetime as dt
+from datetime import date
+from datetime import timedelta
+
+import pytest
+
+from wiperule import compile_wipe_types
+
+WIPE_DAYS=[[4], [1, 4], [1, 3, 5, 7], [1, 2, 3, 4, 5, 6, 7]]
+FIRST_WIPE_DATES=[date(2000, 1, 6), date(2021, 2, 2)]
+START_DATE=date(2000, 1, 1)
+END_DATE=date(2039, 12, 31)
+
+
+# copy of the day check of the first release, which the compiled wipe rules have to match day by day
+
+# only cached, so decades of days are checked in seconds
+@lru_cache(maxsize=None)
+def _get_n_weekday(year, month, day_of_week, n):
+    count = 0
+    for i in range(1, 32):
+        try:
+            d = date(year, month, i)
+        except ValueError:
+            break
+        if d.isoweekday() == day_of_week:
+            count += 1
+        if count == n:
+            return d
+    return None
+
+def _get_week_number(date):
+    return ((date - dt(date.year, 1, 1).date()).days // 7) + 1
+
+def check_wipe_by_type(wipe_type, wipe_days, wipe_time, first_wipe_date, last_wipe_date, current_date, current_time):
+    # first check if we already wiped today!
+    if current_date == last_wipe_date:
+        return False
+    # next check if first wipe day is in future!
+    if first_wipe_date > current_date:
+        return False
+    # check if its the right time to wipe!
+    if wipe_time > current_time:
+        return False
+    # check if current date is first wipe day
+    if current_date == first_wipe_date:
+        return True
+    else:
+        # 1 -> WEEKLY
+        if wipe_type == 1:
+            for day in wipe_days:
+                for i in range(1, 6):
+                    next_date=_get_n_weekday(current_date.year, current_date.month, day, i)
+                    if next_date is not None and next_date == current_date:
+                        return True
+        elif wipe_type == 2:
+            for day in wipe_days:
+                for i in range(1, 6):
+                    next_date=_get_n_weekday(current_date.year, current_date.month, day, i)
+                    if next_date is None:
+                        continue
+                    next_date_week=_get_week_number(next_date)
+                    if last_wipe_date is not None:
+                        last_wipe_week=_get_week_number(last_wipe_date)
+                    else:
+                        last_wipe_week=_get_week_number(first_wipe_date)
+
+                    if (next_date_week - last_wipe_week) == 2:
+                        if next_date is not None and next_date == current_date:
+                            return True
+        # 3-7 .. 1st - 5th Weekday of Month
+        elif wipe_type >= 3 and wipe_type <= 7:
+            for day in wipe_days:
+                next_wipe_date = _get_n_weekday(current_date.year, current_date.month, day, wipe_type - 2)
+                if next_wipe_date is not None and next_wipe_date == current_date:
+                    return True
+
+    return False
+
+
+def _get_dates():
+    current_date = START_DATE
+    while current_date <= END_DATE:
+        yield current_date
+        current_date += timedelta(days=1)
+
+@pytest.mark.parametrize("first_wipe_date", FIRST_WIPE_DATES)
+@pytest.mark.parametrize("wipe_days", WIPE_DAYS)
+@pytest.mark.parametrize("wipe_types", [[wipe_type] for wipe_type in range(1, 8)] + [[2, 3], [1, 2, 3, 4, 5, 6, 7]])
+def test_compiled_wipe_types_match_first_release(wipe_types, wipe_days, first_wipe_date):
+    '''
+        Runs both like the daemon does, once per day after the wipe time, and sets the last wipe date after every wipe,
+        which is what the every 2nd week type counts from.
+    '''
+    wipe_rule = compile_wipe_types(wipe_types, wipe_days, "1800", first_wipe_date)
+    expected_last_wipe_date = None
+    last_wipe_date = None
+    for current_date in _get_dates():
+        expected = any(check_wipe_by_type(wipe_type, wipe_days, "1800", first_wipe_date, expected_last_wipe_date, current_date, "1800") for wipe_type in wipe_types)
+        assert wipe_rule.is_due(current_date, "1800", last_wipe_date) == expected, current_date
+        if expected:
+            expected_last_wipe_date = current_date
+            last_wipe_date = current_date
+
+@pytest.mark.parametrize("wipe_type", range(1, 8))
+def test_wipe_time_not_reached(wipe_type):
+    first_wipe_date = FIRST_WIPE_DATES[1]
+    wipe_rule = compile_wipe_types([wipe_type], [1, 2, 3, 4, 5, 6, 7], "1800", first_wipe_date)
+    for current_date in (first_wipe_date, first_wipe_date + timedelta(days=14)):
+        assert check_wipe_by_type(wipe_type, [1, 2, 3, 4, 5, 6, 7], "1800", first_wipe_date, None, current_date, "1759") is False
+        assert wipe_rule.is_due(current_date, "1759") is False
+
+@pytest.mark.parametrize("first_wipe_date", FIRST_WIPE_DATES)
+@pytest.mark.parametrize("wipe_types", [[1], [2], [4], [7], [1, 2, 3, 4, 5, 6, 7]])
+def test_next_wipe_date_matches_first_release(wipe_types, first_wipe_date):
+    '''
+        get_next_wipe_date(), that the event scheduler sleeps until, is the next day the first release wiped on.
+    '''
+    wipe_days = [1, 4]
+    wipe_rule = compile_wipe_types(wipe_types, wipe_days, "1800", first_wipe_date)
+    last_wipe_date = None
+    next_wipe_date = wipe_rule.get_next_wipe_date(START_DATE)
+    for current_date in _get_dates():
+        if any(check_wipe_by_type(wipe_type, wipe_days, "1800", first_wipe_date, last_wipe_date, current_date, "1800") for wipe_type in wipe_types):
+            assert next_wipe_date == current_date
+            last_wipe_date = current_date
+            next_wipe_date = wipe_rule.get_next_wipe_date(current_date, last_wipe_date, END_DATE)
+        else:
+            assert next_wipe_date is None or next_wipe_date > current_date, current_date
@@ -10,8 +10,17 @@ SERVER_UPDATE_CMD="$SERVER_DIR/rustserver update"
 SERVER_UPDATE_LGSM_CMD="$SERVER_DIR/rustserver update-lgsm"
 SERVER_UPDATE_MODS_CMD="$SERVER_DIR/rustserver mods-update"
 
-# wipe methods: 'bpwipe' or 'mapwipe'
-WIPE_METHODS=("mapwipe", "bpwipe")
+# pre-staging: server files are updated into STAGING_DIR while the server is still running
+SERVER_FILES_DIR="$SERVER_DIR/serverfiles"
+STAGING_DIR="$SERVER_DIR/staging"
+STAGED_MARKER="$STAGING_DIR/.staged"
+STEAMCMD="$HOME/.steam/steamcmd/steamcmd.sh"
+RUST_APP_ID="258550"
+# save data and plugin data keep changing while the server runs, they are never copied from or to the staging dir
+STAGING_EXCLUDES=(--exclude "/server/" --exclude "/oxide/" --exclude "/.staged")
+
+# wipe methods: 'bpwipe', 'mapwipe' or 'prestage'
+WIPE_METHODS=("mapwipe" "bpwipe" "prestage")
 
 print_wipe_meths() {
     for I in "${WIPE_METHODS[@]}"
@@ -39,16 +48,61 @@ then
     exit 1
 fi
 
-if [[ ! " ${WIPE_METHODS[*]} " == *"$wipe_method"* ]]; then
+if [[ ! " ${WIPE_METHODS[*]} " == *" $wipe_method "* ]]; then
     echo "Invalid wipe method: '$wipe_method'"
     print_wipe_meths
     exit 1
 fi
 
+if [[ $wipe_method = "prestage" ]]; then
+    rm -f "$STAGED_MARKER"
+
+    echo "Pre-staging server update..."
+    mkdir -p "$STAGING_DIR"
+    # seed the staging dir with the current files, so steamcmd only downloads the changes
+    rsync -a --delete "${STAGING_EXCLUDES[@]}" "$SERVER_FILES_DIR/" "$STAGING_DIR/"
+    if [[ ! $? -eq 0 ]]; then
+        echo "Failed to seed staging dir"
+        exit 1
+    fi
+
+    echo "bash -c "$STEAMCMD +force_install_dir $STAGING_DIR +login anonymous +app_update $RUST_APP_ID validate +quit""
+    bash -c "$STEAMCMD +force_install_dir $STAGING_DIR +login anonymous +app_update $RUST_APP_ID validate +quit"
+    if [[ ! $? -eq 0 ]]; then
+        echo "Failed to pre-stage server update"
+        exit 1
+    fi
+
+    echo "Updating LGSM..."
+    echo "bash -c "$SERVER_UPDATE_LGSM_CMD""
+    bash -c "$SERVER_UPDATE_LGSM_CMD"
+    if [[ ! $? -eq 0 ]]; then
+        echo "Failed to update LGSM"
+        exit 1
+    fi
+
+    touch "$STAGED_MARKER"
+    echo "Finished Pre-stage Task successfully!"
+    exit 0
+fi
+
 echo "Stopping server..."
 echo "bash -c "$SERVER_STOP_CMD""
 bash -c "$SERVER_STOP_CMD"
 
+if [[ -f "$STAGED_MARKER" ]]; then
+    echo "Swapping in pre-staged update..."
+    rsync -a --delete "${STAGING_EXCLUDES[@]}" "$STAGING_DIR/" "$SERVER_FILES_DIR/"
+    if [[ ! $? -eq 0 ]]; then
+        echo "Failed to swap in pre-staged update"
+        exit 1
+    fi
+    rm -f "$STAGED_MARKER"
+    echo "Finished Swap-In Task successfully!"
+fi
+
+# updates are often released at the wipe time itself, after the pre-stage ran. With a current staged build the update
+# only checks the build id.
 echo "Updating Server..."
 echo "bash -c "$SERVER_UPDATE_CMD""
 bash -c "$SERVER_UPDATE_CMD"
@@ -0,0 +1,134 @@
+import csv
+from datetime import datetime as dt
+from datetime import timezone
+from datetime import timedelta
+
+import numpy as np
+
+ICAL_DATETIME_FORMAT="%Y%m%dT%H%M%SZ"
+WEEK_NUMBERS=range(1, 54)
+
+
+def get_wipe_dates(wipe_types, wipe_days, first_wipe_date, start_date, end_date):
+    '''
+        Returns a sorted datetime64[D] array of every date between start_date and end_date (both included), on which
+        any of wipe_types is a wipe date, like wiperule.compile_wipe_types() decides it. The daemon is assumed to run since first_wipe_date and
+        to set the last wipe date after every wipe, which is what the every 2nd week type (2) counts from.
+    '''
+    first_date = np.datetime64(first_wipe_date, 'D')
+    start_date = np.datetime64(start_date, 'D')
+    dates = np.arange(min(start_date, first_date), np.datetime64(end_date, 'D') + 1)
+    if dates.size == 0 or not wipe_types:
+        return dates[:0]
+
+    # 1970-01-01 was a thursday, weekdays are 1 = Monday ... 7 = Sunday like the wipe_days
+    weekdays = (dates.astype(np.int64) + 3) % 7 + 1
+    days_of_month = (dates - dates.astype('datetime64[M]')).astype(np.int64) + 1
+    week_numbers = (dates - dates.astype('datetime64[Y]')).astype(np.int64) // 7 + 1
+    wipe_day = np.isin(weekdays, wipe_days) & (dates > first_date)
+
+    # every type but 2 only depends on the date, the first wipe date counts for every type
+    fixed = dates == first_date
+    for wipe_type in set(wipe_types):
+        if wipe_type == 1:
+            fixed |= wipe_day
+        elif wipe_type >= 3 and wipe_type <= 7:
+            fixed |= wipe_day & ((days_of_month - 1) // 7 + 1 == wipe_type - 2)
+    fixed_indexes = np.flatnonzero(fixed)
+
+    if 2 not in wipe_types:
+        wipe_indexes = fixed_indexes
+    else:
+        wipe_indexes = _get_wipe_indexes_every_2nd_week(fixed_indexes, wipe_day, week_numbers)
+
+    wipe_dates = dates[wipe_indexes]
+    return wipe_dates[wipe_dates >= start_date]
+
+def _get_wipe_indexes_every_2nd_week(fixed_indexes, wipe_day, week_numbers):
+    # type 2 depends on the week of the last wipe, so walk from wipe to wipe and look up the next one in each index
+    week_indexes = {week_number: np.flatnonzero(wipe_day & (week_numbers == week_number)) for week_number in WEEK_NUMBERS}
+    # nothing is due before the first wipe date, so the reference week is only needed after the first wipe
+    reference_week = None
+
+    wipe_indexes = []
+    position = 0
+    while True:
+        next_index = None
+        found = np.searchsorted(fixed_indexes, position)
+        if found < fixed_indexes.size:
+            next_index = int(fixed_indexes[found])
+
+        indexes = week_indexes.get(reference_week + 2) if reference_week is not None else None
+        if indexes is not None:
+            found = np.searchsorted(indexes, position)
+            if found < indexes.size and (next_index is None or indexes[found] < next_index):
+                next_index = int(indexes[found])
+
+        if next_index is None:
+            break
+        wipe_indexes.append(next_index)
+        reference_week = int(week_numbers[next_index])
+        position = next_index + 1
+
+    return np.array(wipe_indexes, dtype=np.int64)
+
+def get_rule_wipe_dates(wipe_rule, start_date, end_date):
+    '''
+        Same as get_wipe_dates() for a compiled WipeRule, e.g. of a wipe schedule expression.
+    '''
+    wipe_dates = []
+    last_wipe_date = None
+    current_date = start_date
+    if wipe_rule.first_wipe_date is not None and wipe_rule.first_wipe_date < current_date:
+        current_date = wipe_rule.first_wipe_date
+    while True:
+        wipe_date = wipe_rule.get_next_wipe_date(current_date, last_wipe_date, end_date)
+        if wipe_date is None:
+            break
+        if wipe_date >= start_date:
+            wipe_dates.append(wipe_date)
+        last_wipe_date = wipe_date
+        current_date = wipe_date + timedelta(days=1)
+    return np.array(wipe_dates, dtype='datetime64[D]')
+
+def get_clash_dates(bp_wipe_dates, map_wipe_dates):
+    '''
+        Returns the dates, on which a blueprint and a map wipe are due on the same day.
+    '''
+    return np.intersect1d(bp_wipe_dates, map_wipe_dates)
+
+def to_dates(wipe_dates):
+    return wipe_dates.astype(object).tolist()
+
+def write_csv(events, output):
+    '''
+        Writes events, a list of dicts with the keys server, wipe, date, instant and clash, as CSV.
+    '''
+    writer = csv.writer(output)
+    writer.writerow(["server", "wipe", "date", "instant", "clash"])
+    for event in events:
+        writer.writerow([event["server"], event["wipe"], event["date"].isoformat(), event["instant"].isoformat(), event["clash"] or ""])
+
+def write_ical(events, output, duration_minutes=30):
+    '''
+        Writes events as iCalendar (RFC 5545) with one VEVENT per wipe, the instants in UTC.
+    '''
+    stamp = dt.now(timezone.utc).strftime(ICAL_DATETIME_FORMAT)
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//AutoWipe//Backtest//EN", "CALSCALE:GREGORIAN"]
+    for event in events:
+        instant = event["instant"].astimezone(timezone.utc)
+        lines.append("BEGIN:VEVENT")
+        lines.append("UID:{0}-{1}-{2}@autowipe".format(event["server"], event["wipe"], instant.strftime(ICAL_DATETIME_FORMAT)))
+        lines.append("DTSTAMP:{0}".format(stamp))
+        lines.append("DTSTART:{0}".format(instant.strftime(ICAL_DATETIME_FORMAT)))
+        lines.append("DURATION:PT{0}M".format(duration_minutes))
+        lines.append("SUMMARY:{0}".format(_escape_ical("{0} {1} wipe".format(event["server"], event["wipe"]))))
+        if event["clash"]:
+            lines.append("DESCRIPTION:{0}".format(_escape_ical(event["clash"])))
+        lines.append("END:VEVENT")
+    lines.append("END:VCALENDAR")
+    # iCalendar lines end with CRLF
+    output.write("\r\n".join(lines) + "\r\n")
+
+def _escape_ical(text):
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
@@ -0,0 +1,91 @@
+import os
+import json
+import socket
+import threading
+
+CONTROL_TIMEOUT_SECONDS=5
+# the longest request is a command with a server name, anything longer is not a request
+MAX_REQUEST_BYTES=65536
+# the status of a large fleet is the longest answer
+MAX_RESPONSE_BYTES=16777216
+
+
+def start_control_server(socket_path, handle_request, log=print):
+    '''
+        Serves handle_request(request) on the unix domain socket socket_path from background threads, one per
+        connection. A request is one JSON object per line, e.g. {"command": "status"}, the answer is one line
+        {"ok": true, "result": ...} or {"ok": false, "error": "..."}. Returns the server.
+    '''
+    # only imported, if the control socket is enabled
+    import socketserver
+
+    class ControlRequestHandler(socketserver.StreamRequestHandler):
+
+        def handle(self):
+            while True:
+                # never more than one request is buffered, however long the line of a client is
+                line = self.rfile.readline(MAX_REQUEST_BYTES + 1)
+                if not line:
+                    return
+                too_long = len(line) > MAX_REQUEST_BYTES
+                try:
+                    if too_long:
+                        raise Exception("Request too long!")
+                    request = json.loads(line)
+                    if not isinstance(request, dict) or "command" not in request:
+                        raise Exception("A request needs a 'command'!")
+                    response = {"ok": True, "result": handle_request(request)}
+                except Exception as ex:
+                    response = {"ok": False, "error": str(ex)}
+                self.wfile.write((json.dumps(response, default=str, separators=(",", ":")) + "\n").encode())
+                self.wfile.flush()
+                if too_long:
+                    # the rest of the line is no request
+                    return
+
+    _remove_stale_socket(socket_path)
+    # only the user and group of the daemon may control it, the socket is created with these permissions by bind()
+    previous_umask = os.umask(0o117)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(socket_path, ControlRequestHandler)
+    finally:
+        os.umask(previous_umask)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="ControlServer", daemon=True).start()
+    log("Serving control socket '{0}'".format(socket_path))
+    return server
+
+def send_request(socket_path, request, timeout_seconds=CONTROL_TIMEOUT_SECONDS):
+    '''
+        Sends one request to the control socket of a running daemon and returns its result. Raises an Exception with
+        the error of the daemon, if the request failed.
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout_seconds)
+        try:
+            client.connect(socket_path)
+        except OSError as ex:
+            raise Exception("No daemon is listening on '{0}'! {1}".format(socket_path, ex))
+        client.sendall((json.dumps(request) + "\n").encode())
+        with client.makefile('rb') as reader:
+            line = reader.readline(MAX_RESPONSE_BYTES + 1)
+    if not line:
+        raise Exception("The daemon closed the connection without an answer!")
+    if len(line) > MAX_RESPONSE_BYTES:
+        raise Exception("The answer of the daemon is longer than {0} bytes!".format(MAX_RESPONSE_BYTES))
+    response = json.loads(line)
+    if not response.get("ok"):
+        raise Exception(response.get("error"))
+    return response.get("result")
+
+def _remove_stale_socket(socket_path):
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+        except OSError:
+            # nobody listens anymore, e.g. after a kill
+            os.remove(socket_path)
+            return
+    raise Exception("Control socket '{0}' is used by another running daemon!".format(socket_path))
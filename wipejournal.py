@@ -0,0 +1,92 @@
+import os
+import json
+from time import time
+
+EVENT_START="start"
+EVENT_STEP="step"
+EVENT_FINISH="finish"
+EVENT_FAIL="fail"
+# the next wipe was skipped by hand, the state carries it as last wipe date
+EVENT_SKIP="skip"
+
+READ_BLOCK_SIZE=4096
+
+
+class WipeJournal(object):
+    '''
+        Append-only journal of wipe events, one compact JSON record per line. Every record carries the complete wipe
+        state after the event, so loading the state only needs the last complete record at the end of the file.
+    '''
+
+    def __init__(self, journal_file):
+        self.journal_file = journal_file
+
+    def append(self, event, wipe, state, step=None):
+        '''
+            Appends a record and returns once it is fsynced to disk.
+        '''
+        record = {"t": round(time(), 3), "e": event, "w": wipe, "s": state}
+        if step is not None:
+            record["n"] = step
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+
+        file_descriptor = os.open(self.journal_file, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # a torn last line of a crash must not swallow the new record
+            size = os.fstat(file_descriptor).st_size
+            if size > 0 and os.pread(file_descriptor, 1, size - 1) != b"\n":
+                line = "\n" + line
+            os.write(file_descriptor, line.encode())
+            os.fsync(file_descriptor)
+        finally:
+            os.close(file_descriptor)
+        return record
+
+    def load_last(self):
+        '''
+            Returns the last complete record or None. Reads the file backwards from its end, so the time does not
+            depend on the length of the history. A torn last line (crash while writing) is skipped.
+        '''
+        if not os.path.isfile(self.journal_file):
+            return None
+
+        with open(self.journal_file, 'rb') as journal:
+            journal.seek(0, os.SEEK_END)
+            position = journal.tell()
+            remainder = b""
+            while position > 0:
+                read_size = min(READ_BLOCK_SIZE, position)
+                position -= read_size
+                journal.seek(position)
+                lines = (journal.read(read_size) + remainder).split(b"\n")
+                # the first part may be the end of a line, that starts in the previous block
+                remainder = lines.pop(0) if position > 0 else b""
+                for line in reversed(lines):
+                    record = self._parse(line)
+                    if record is not None:
+                        return record
+            return self._parse(remainder)
+
+    def history(self):
+        '''
+            Yields all complete records from the oldest to the newest.
+        '''
+        if not os.path.isfile(self.journal_file):
+            return
+        with open(self.journal_file, 'rb') as journal:
+            for line in journal:
+                record = self._parse(line)
+                if record is not None:
+                    yield record
+
+    def _parse(self, line):
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(record, dict) or "e" not in record or "s" not in record:
+            return None
+        return record
@@ -0,0 +1,148 @@
+import os
+import json
+import threading
+from time import time
+
+# the heartbeat renews the lease this many times per ttl, so one missed renewal does not lose it
+RENEWALS_PER_TTL=3
+
+
+class WipeLease(object):
+    '''
+        A time bounded lease, that a node has to hold while it wipes a server, that several nodes share. The lease is
+        only a record of holder and expiry time, the storage is only locked for the moment it is read and changed,
+        so waiting nodes cost nothing and a node, that died while wiping, loses the lease after ttl_seconds.
+        The last finished date of every wipe is kept with it, so a node, that waited, knows the wipe is done.
+        A backend only has to implement _update().
+    '''
+
+    def __init__(self, location, holder, ttl_seconds):
+        self.location = location
+        self.holder = holder
+        self.ttl_seconds = ttl_seconds
+        # the lease record as last read: holder, expires (unix time) and wipes (wipe -> date and holder)
+        self.record = {}
+        self._released = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def current_holder(self):
+        return self.record.get("holder")
+
+    @property
+    def expires(self):
+        return self.record.get("expires", 0)
+
+    def get_wipe_date(self, wipe):
+        '''
+            Returns the date of the last wipe ("bp"/"map"), that a node finished while holding the lease, or None.
+        '''
+        wipe_record = self.record.get("wipes", {}).get(wipe)
+        return wipe_record["date"] if wipe_record is not None else None
+
+    def acquire(self):
+        '''
+            Takes the lease for ttl_seconds, if it is free, expired or already ours, e.g. after a restart during a wipe.
+            Returns True on success.
+        '''
+        def change(record):
+            if record.get("holder") not in (None, self.holder) and record.get("expires", 0) > time():
+                return None
+            return dict(record, holder=self.holder, expires=time() + self.ttl_seconds)
+
+        with self._lock:
+            self._released.clear()
+            return self._update(change)
+
+    def renew(self):
+        '''
+            Extends the lease by ttl_seconds. Returns False, if it was released or another node took it meanwhile.
+        '''
+        def change(record):
+            if record.get("holder") != self.holder:
+                return None
+            return dict(record, expires=time() + self.ttl_seconds)
+
+        with self._lock:
+            if self._released.is_set():
+                return False
+            return self._update(change)
+
+    def release(self, wipe=None, wipe_date=None):
+        '''
+            Gives the lease up and, if wipe and wipe_date are given, records the wipe as finished.
+        '''
+        def change(record):
+            if record.get("holder") != self.holder:
+                return None
+            wipes = dict(record.get("wipes", {}))
+            if wipe is not None:
+                wipes[wipe] = {"date": wipe_date, "holder": self.holder}
+            return dict(record, holder=None, expires=0, wipes=wipes)
+
+        with self._lock:
+            self._released.set()
+            return self._update(change)
+
+    def start_heartbeat(self, log=print):
+        '''
+            Renews the lease from a background thread until it is released.
+        '''
+        def heartbeat():
+            while not self._released.wait(self.ttl_seconds / RENEWALS_PER_TTL):
+                try:
+                    if not self.renew():
+                        if not self._released.is_set():
+                            log("Lost the wipe lease '{0}' to '{1}'! Another node may wipe at the same time.".format(self.location, self.current_holder))
+                        return
+                except Exception as ex:
+                    log("Failed to renew the wipe lease '{0}'! Error Message: '{1}'".format(self.location, ex))
+
+        threading.Thread(target=heartbeat, name="LeaseHeartbeat", daemon=True).start()
+
+    def _update(self, change):
+        '''
+            Reads the lease record, passes it to change(record) and stores the returned record, all as one atomic step
+            against the other nodes. change returns None to leave the record as it is. Stores the record in self.record
+            and returns True, if it was changed.
+        '''
+        raise NotImplementedError()
+
+
+class FileLease(WipeLease):
+    '''
+        The lease as JSON file on storage, that all nodes share (e.g. NFS). The file is locked with fcntl.lockf, which
+        also locks across NFS clients, for the moment it is read and written.
+    '''
+
+    def _update(self, change):
+        import fcntl
+
+        descriptor = os.open(self.location, os.O_RDWR | os.O_CREAT, 0o664)
+        with os.fdopen(descriptor, 'r+') as lease_file:
+            fcntl.lockf(lease_file, fcntl.LOCK_EX)
+            data = lease_file.read()
+            try:
+                record = json.loads(data) if data.strip() else {}
+            except ValueError:
+                # e.g. cut off by a full disk, a lost record only means the lease is free
+                record = {}
+            new_record = change(record)
+            if new_record is not None:
+                lease_file.seek(0)
+                lease_file.truncate()
+                lease_file.write(json.dumps(new_record))
+                lease_file.flush()
+                os.fsync(lease_file.fileno())
+            # closing the file releases the lock
+        self.record = new_record if new_record is not None else record
+        return new_record is not None
+
+
+# further backends, e.g. a database row, only need to implement WipeLease._update()
+LEASE_BACKENDS={"file": FileLease}
+
+def create_lease(backend, location, holder, ttl_seconds):
+    if backend not in LEASE_BACKENDS:
+        raise Exception("Invalid lease backend '{0}'! Choose one of these: {1}".format(backend, list(LEASE_BACKENDS)))
+    return LEASE_BACKENDS[backend](location, holder, ttl_seconds)
@@ -0,0 +1,133 @@
+import threading
+from bisect import bisect_left
+
+CONTENT_TYPE="text/plain; version=0.0.4; charset=utf-8"
+# seconds, a tick only evaluates the wipe rules of the due servers
+TICK_BUCKETS=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# seconds, from a quick restart to a full update during a wipe
+COMMAND_BUCKETS=(1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+
+class Histogram(object):
+    '''
+        Cumulative histogram in Prometheus style. observe() is a bisect and three additions.
+    '''
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_samples(self, name, labels):
+        '''
+            Yields (name, labels, value) of every bucket, the sum and the count.
+        '''
+        cumulative = 0
+        for bucket, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield name + "_bucket", dict(labels, le=repr(float(bucket))), cumulative
+        yield name + "_bucket", dict(labels, le="+Inf"), self.count
+        yield name + "_sum", labels, self.sum
+        yield name + "_count", labels, self.count
+
+
+class WipeMetrics(object):
+    '''
+        Metrics of the daemon. The daemon and the wipe threads only add numbers to prepared objects, everything else
+        is collected when the metrics are scraped. Functions in collectors are called on every scrape and yield
+        (name, type, help, samples) with samples as a list of (labels, value).
+    '''
+
+    def __init__(self):
+        self.ticks = Histogram(TICK_BUCKETS)
+        # (server, wipe, step) -> Histogram of the command wall time
+        self.commands = {}
+        # (server, wipe, step) -> exit code of the last run
+        self.exit_codes = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def observe_tick(self, seconds):
+        # only called by the daemon thread
+        self.ticks.observe(seconds)
+
+    def observe_command(self, server, wipe, step, seconds, exit_code):
+        key = (server, wipe, step)
+        with self._lock:
+            histogram = self.commands.get(key)
+            if histogram is None:
+                histogram = self.commands[key] = Histogram(COMMAND_BUCKETS)
+            histogram.observe(seconds)
+            self.exit_codes[key] = exit_code
+
+    def render(self):
+        '''
+            Returns all metrics in the Prometheus text format.
+        '''
+        lines = []
+        _write_family(lines, "autowipe_tick_seconds", "histogram", "Time the daemon needed per tick to evaluate the wipe rules and reloads. _count is the amount of ticks.", self.ticks.get_samples("autowipe_tick_seconds", {}))
+
+        with self._lock:
+            commands = [(dict(zip(("server", "wipe", "step"), key)), histogram) for key, histogram in self.commands.items()]
+            exit_codes = [(dict(zip(("server", "wipe", "step"), key)), exit_code) for key, exit_code in self.exit_codes.items()]
+        _write_family(lines, "autowipe_command_seconds", "histogram", "Wall time of the wipe and pre-stage commands.", [sample for labels, histogram in commands for sample in histogram.get_samples("autowipe_command_seconds", labels)])
+        _write_family(lines, "autowipe_command_exit_code", "gauge", "Exit code of the last run of a command, negative if it got killed by a signal.", [("autowipe_command_exit_code", labels, exit_code) for labels, exit_code in exit_codes])
+
+        for collector in list(self.collectors):
+            for name, metric_type, help_text, samples in collector():
+                _write_family(lines, name, metric_type, help_text, [(name, labels, value) for labels, value in samples])
+        return "".join(lines)
+
+
+def _write_family(lines, name, metric_type, help_text, samples):
+    lines.append("# HELP {0} {1}\n".format(name, help_text))
+    lines.append("# TYPE {0} {1}\n".format(name, metric_type))
+    for sample_name, labels, value in samples:
+        lines.append("{0}{1} {2}\n".format(sample_name, _format_labels(labels), _format_value(value)))
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{0}="{1}"'.format(key, str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")) for key, value in labels.items()) + "}"
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+def start_metrics_server(metrics, address, port):
+    '''
+        Serves metrics.render() on http://address:port/metrics from a background thread and returns the server.
+    '''
+    # only imported, if the metrics are enabled
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # every scrape would end up on stderr
+            pass
+
+    server = ThreadingHTTPServer((address, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="MetricsServer", daemon=True).start()
+    return server
@@ -0,0 +1,169 @@
+import os
+import cProfile
+import threading
+import tracemalloc
+from time import perf_counter
+from contextlib import contextmanager
+from datetime import datetime as dt
+
+# tick=one tick of the daemon loop, check=check_if_wipe() of one server, wipe=one wipe or pre-stage command run
+PROFILE_PARTS=["tick", "check", "wipe"]
+# the allocations are grouped by line, more frames only make the snapshots slower
+TRACEMALLOC_FRAMES=1
+TOP_ALLOCATIONS=25
+
+
+class PhaseTime(object):
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+
+class WipeProfiler(object):
+    '''
+        Profiles the selected parts of the daemon while a profiling session is active. A session is started and
+        stopped by toggle(), which is safe to call from a signal handler; the daemon applies it with update() at the
+        start of its next tick.
+
+        All ticks of a session share one cProfile profile, every wipe run gets its own profile and tracemalloc diff.
+        The wall time of every phase is written to a summary, when the session stops. The files are named
+        "<output_prefix>.profile.<session start>.*" and can be read with pstats or snakeviz.
+    '''
+
+    def __init__(self, output_prefix, parts=PROFILE_PARTS, log=print):
+        self.output_prefix = output_prefix
+        self.parts = parts
+        self.log = log
+        self.active = False
+        self._toggle_requested = False
+        self._lock = threading.Lock()
+        self._session_prefix = None
+        self._phase_times = {}
+        self._tick_profile = None
+        self._started_tracemalloc = False
+        self._start_snapshot = None
+        self._run_count = 0
+
+    def toggle(self):
+        # only sets a flag, the session itself is started or stopped by the daemon thread
+        self._toggle_requested = True
+
+    def update(self):
+        if not self._toggle_requested:
+            return
+        self._toggle_requested = False
+        if self.active:
+            self.stop()
+        else:
+            self.start()
+
+    def start(self):
+        self._session_prefix = "{0}.profile.{1}".format(self.output_prefix, dt.now().strftime("%Y%m%d-%H%M%S"))
+        self._phase_times = {}
+        self._run_count = 0
+        self._tick_profile = cProfile.Profile() if "tick" in self.parts else None
+        self._started_tracemalloc = not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._start_snapshot = tracemalloc.take_snapshot()
+        self.active = True
+        self.log("Profiling started for {0}, writing to '{1}.*'".format(self.parts, self._session_prefix))
+
+    def stop(self):
+        self.active = False
+        files = []
+        if self._tick_profile is not None:
+            self._tick_profile.dump_stats(self._session_prefix + ".tick.prof")
+            files.append(self._session_prefix + ".tick.prof")
+            self._tick_profile = None
+
+        with open(self._session_prefix + ".summary.txt", 'w') as summary:
+            summary.write("Wall time per phase:\n")
+            with self._lock:
+                phase_times = sorted(self._phase_times.items())
+            for phase, phase_time in phase_times:
+                summary.write("{0}: count={1} total={2:.6f}s mean={3:.6f}s max={4:.6f}s\n".format(phase, phase_time.count, phase_time.total_seconds, phase_time.total_seconds / phase_time.count, phase_time.max_seconds))
+            summary.write("\nTop {0} allocation changes since the session started:\n".format(TOP_ALLOCATIONS))
+            _write_allocation_diff(summary, self._start_snapshot)
+        files.append(self._session_prefix + ".summary.txt")
+
+        self._start_snapshot = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        self.log("Profiling stopped, wrote {0}".format(files))
+
+    def start_phase(self, part, name=None):
+        '''
+            Returns a token for end_phase() or None, if the part is not profiled right now.
+        '''
+        if not self.active or part not in self.parts:
+            return None
+        profile = None
+        snapshot = None
+        if part == "tick":
+            profile = self._tick_profile
+        elif part == "wipe":
+            # wipes run in their own threads, cProfile only sees the thread that enabled it
+            profile = cProfile.Profile()
+            snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        if profile is not None:
+            try:
+                profile.enable()
+            except ValueError:
+                # another profiler is already active, only the wall time is measured then
+                profile = None
+        return (part, name, profile, snapshot, self._session_prefix, perf_counter())
+
+    def end_phase(self, token):
+        if token is None:
+            return
+        part, name, profile, snapshot, session_prefix, started = token
+        seconds = perf_counter() - started
+        if profile is not None:
+            profile.disable()
+
+        phase = part if name is None else "{0}[{1}]".format(part, name)
+        with self._lock:
+            phase_time = self._phase_times.get(phase)
+            if phase_time is None:
+                phase_time = self._phase_times[phase] = PhaseTime()
+            phase_time.add(seconds)
+            if part == "wipe":
+                self._run_count += 1
+                run_prefix = "{0}.{1}.{2}".format(session_prefix, phase.replace("[", ".").replace("]", "").replace(",", ".").replace(os.sep, "_"), self._run_count)
+
+        if part == "wipe":
+            # each wipe run gets its own files, even if the session already stopped
+            if profile is not None:
+                profile.dump_stats(run_prefix + ".prof")
+            with open(run_prefix + ".txt", 'w') as run_summary:
+                run_summary.write("{0}: {1:.6f}s\n".format(phase, seconds))
+                if snapshot is not None and tracemalloc.is_tracing():
+                    run_summary.write("\nTop {0} allocation changes during the run:\n".format(TOP_ALLOCATIONS))
+                    _write_allocation_diff(run_summary, snapshot)
+
+    @contextmanager
+    def phase(self, part, name=None):
+        token = self.start_phase(part, name)
+        try:
+            yield
+        finally:
+            self.end_phase(token)
+
+
+def _write_allocation_diff(output, snapshot):
+    if snapshot is None or not tracemalloc.is_tracing():
+        output.write("tracemalloc is not tracing.\n")
+        return
+    # imports and the profilers themselves are not interesting
+    filters = [tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"), tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, cProfile.__file__)]
+    current_snapshot = tracemalloc.take_snapshot().filter_traces(filters)
+    for statistic in current_snapshot.compare_to(snapshot.filter_traces(filters), 'lineno')[:TOP_ALLOCATIONS]:
+        output.write("{0}\n".format(statistic))
@@ -0,0 +1,172 @@
+import os
+from time import monotonic
+
+PROBE_TYPES=["tcp", "udp", "log"]
+# A2S_INFO of the steam server query protocol, a rust server answers it on its query port once it accepts players
+A2S_INFO_REQUEST=b"\xff\xff\xff\xffTSource Engine Query\x00"
+READ_BLOCK_SIZE=65536
+
+
+class ReadinessProbe(object):
+    '''
+        One condition, that a started server has to fulfill to count as ready: a "tcp" port accepts connections
+        (e.g. RCON), a "udp" port answers payload (e.g. the query port) or a "log" file gets a line with marker.
+    '''
+
+    def __init__(self, probe_type, host=None, port=None, path=None, marker=None, payload=A2S_INFO_REQUEST):
+        self.probe_type = probe_type
+        self.host = host
+        self.port = port
+        self.path = path
+        self.marker = marker
+        self.payload = payload
+
+    @property
+    def name(self):
+        if self.probe_type == "log":
+            return "log:{0}".format(self.path)
+        return "{0}:{1}:{2}".format(self.probe_type, self.host, self.port)
+
+    def __eq__(self, other):
+        return isinstance(other, ReadinessProbe) and vars(self) == vars(other)
+
+    def __repr__(self):
+        return "ReadinessProbe({0!r})".format(self.name)
+
+
+def parse_readiness_probes(probes_data):
+    '''
+        Parses the list of probes of a configuration, e.g. [{"type": "udp", "port": "28015"}, {"type": "log", "path":
+        "...", "marker": "Server startup complete"}]. The host defaults to 127.0.0.1.
+    '''
+    if not isinstance(probes_data, list) or not probes_data:
+        raise Exception("Readiness probes have to be a non empty list!")
+
+    probes = []
+    for probe_data in probes_data:
+        probe_type = probe_data.get('type')
+        if probe_type not in PROBE_TYPES:
+            raise Exception("Invalid readiness probe type '{0}'! Choose one of these: {1}".format(probe_type, PROBE_TYPES))
+        if probe_type == "log":
+            if 'path' not in probe_data or not probe_data.get('marker'):
+                raise Exception("A log readiness probe needs a 'path' and a 'marker'!")
+            probes.append(ReadinessProbe("log", path=probe_data['path'], marker=probe_data['marker']))
+        else:
+            if 'port' not in probe_data:
+                raise Exception("A {0} readiness probe needs a 'port'!".format(probe_type))
+            payload = probe_data['payload'].encode() if 'payload' in probe_data else A2S_INFO_REQUEST
+            probes.append(ReadinessProbe(probe_type, probe_data.get('host', "127.0.0.1"), int(probe_data['port']), payload=payload))
+    return probes
+
+def get_log_offsets(probes):
+    '''
+        Returns (inode, size) of the log file of every log probe, taken before the server starts, so a marker of the
+        previous run is not mistaken for the new one.
+    '''
+    offsets = {}
+    for probe in probes:
+        if probe.probe_type == "log":
+            try:
+                file_stat = os.stat(probe.path)
+                offsets[probe.path] = (file_stat.st_ino, file_stat.st_size)
+            except OSError:
+                offsets[probe.path] = None
+    return offsets
+
+def wait_until_ready(probes, timeout_seconds, interval_seconds=2, log_offsets=None, log=print):
+    '''
+        Polls all probes at the same time every interval_seconds until all of them succeeded or timeout_seconds passed.
+        Returns the seconds each probe needed by name, None for the probes, that never succeeded.
+    '''
+    # only imported, when a probe runs, it would double the startup time of the daemon
+    import asyncio
+
+    return asyncio.run(_wait_until_ready(probes, timeout_seconds, interval_seconds, dict(log_offsets or {}), log))
+
+async def _wait_until_ready(probes, timeout_seconds, interval_seconds, log_offsets, log):
+    import asyncio
+
+    started = monotonic()
+    ready_seconds = {probe.name: None for probe in probes}
+
+    async def poll(probe):
+        while True:
+            if await _probe_once(probe, interval_seconds, log_offsets):
+                ready_seconds[probe.name] = monotonic() - started
+                log("Readiness probe '{0}' succeeded after {1:.1f}s".format(probe.name, ready_seconds[probe.name]))
+                return
+            await asyncio.sleep(interval_seconds)
+
+    tasks = [asyncio.ensure_future(poll(probe)) for probe in probes]
+    done, pending = await asyncio.wait(tasks, timeout=timeout_seconds)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    for task in done:
+        # an unexpected error of one probe counts as not ready
+        if task.exception() is not None:
+            log("Readiness probe failed with an unexpected error: '{0}'".format(task.exception()))
+    return ready_seconds
+
+async def _probe_once(probe, timeout_seconds, log_offsets):
+    import asyncio
+
+    if probe.probe_type == "tcp":
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(probe.host, probe.port), timeout_seconds)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        return True
+
+    if probe.probe_type == "udp":
+        loop = asyncio.get_running_loop()
+        answered = loop.create_future()
+
+        class QueryProtocol(asyncio.DatagramProtocol):
+
+            def datagram_received(self, data, address):
+                if not answered.done():
+                    answered.set_result(data)
+
+            def error_received(self, ex):
+                # e.g. ICMP port unreachable, while the server is still starting
+                if not answered.done():
+                    answered.set_exception(ex)
+
+        try:
+            transport, protocol = await loop.create_datagram_endpoint(QueryProtocol, remote_addr=(probe.host, probe.port))
+        except OSError:
+            return False
+        try:
+            transport.sendto(probe.payload)
+            await asyncio.wait_for(answered, timeout_seconds)
+            return True
+        except (OSError, asyncio.TimeoutError):
+            return False
+        finally:
+            transport.close()
+
+    # the file is only read from where it ended before the server started, or from the start if it was replaced
+    offset = 0
+    log_offset = log_offsets.get(probe.path)
+    try:
+        file_stat = os.stat(probe.path)
+    except OSError:
+        return False
+    if log_offset is not None and log_offset[0] == file_stat.st_ino and log_offset[1] <= file_stat.st_size:
+        offset = log_offset[1]
+    marker = probe.marker.encode()
+    with open(probe.path, 'rb') as log_file:
+        log_file.seek(offset)
+        tail = b""
+        while True:
+            data = log_file.read(READ_BLOCK_SIZE)
+            if not data:
+                # the next poll only reads, what was written since, plus a possibly incomplete marker
+                log_offsets[probe.path] = (file_stat.st_ino, max(offset, log_file.tell() - len(marker)))
+                return False
+            # the marker may be split between two blocks
+            if marker in tail + data:
+                return True
+            tail = data[-len(marker):]
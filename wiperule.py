@@ -0,0 +1,507 @@
+import calendar
+from datetime import date
+from datetime import timedelta
+
+# the days 1..31 of a month are the bits 0..30 of a month mask
+WEEKDAY_PATTERN=sum(1 << day_index for day_index in range(0, 35, 7))
+ALL_MONTHS=(1 << 12) - 1
+# the gregorian calendar repeats after 400 years
+MAX_SEARCH_MONTHS=400 * 12
+WEEKDAY_NAMES={"MO": 1, "TU": 2, "WE": 3, "TH": 4, "FR": 5, "SA": 6, "SU": 7}
+CRON_WEEKDAY_NAMES={"SUN": 0, "MON": 1, "TUE": 2, "WED": 3, "THU": 4, "FRI": 5, "SAT": 6}
+CRON_MONTH_NAMES={"JAN": 1, "FEB": 2, "MAR": 3, "APR": 4, "MAY": 5, "JUN": 6, "JUL": 7, "AUG": 8, "SEP": 9, "OCT": 10, "NOV": 11, "DEC": 12}
+RRULE_FREQUENCIES=("DAILY", "WEEKLY", "MONTHLY")
+# a wipe schedule without a wipe date in this many years, e.g. "0 18 31 2 *", is rejected, leap days repeat within 8 years
+MAX_LOOKAHEAD_YEARS=8
+
+
+def get_week_number(current_date):
+    # week 1 = day 1-7 of the year, the reference of wipe type 2
+    return ((current_date.timetuple().tm_yday - 1) // 7) + 1
+
+def _get_lowest_bit(mask):
+    return (mask & -mask).bit_length() - 1
+
+def _get_bits(mask):
+    while mask:
+        bit = _get_lowest_bit(mask)
+        yield bit
+        mask &= mask - 1
+
+
+class CalendarTerm(object):
+    '''
+        Set of days compiled into bitsets: months, days of the month (also counted from the end of the month), weekdays
+        (every or the n-th one of a month, also counted from the end) and an interval of days, weeks or months.
+        A restriction, that is None, matches every day. With match_any (cron) a day matches, if it matches the days of
+        the month or the weekdays, otherwise (RRULE) it has to match both.
+    '''
+    __slots__ = ("months", "month_days", "last_month_days", "weekdays", "nth_weekdays", "last_nth_weekdays", "match_any", "interval", "interval_unit", "interval_anchor")
+
+    def __init__(self, months=ALL_MONTHS, month_days=None, last_month_days=None, weekdays=None, nth_weekdays=None, last_nth_weekdays=None, match_any=False, interval=1, interval_unit=None, interval_anchor=None):
+        self.months = months
+        # bit n-1 = day n, for last_month_days bit n-1 = the n-th last day
+        self.month_days = month_days
+        self.last_month_days = last_month_days
+        # bit weekday-1 where 1 = Monday ... 7 = Sunday
+        self.weekdays = weekdays
+        # weekday -> bit n-1 for the n-th (or n-th last) weekday of the month
+        self.nth_weekdays = nth_weekdays
+        self.last_nth_weekdays = last_nth_weekdays
+        self.match_any = match_any
+        self.interval = interval
+        # "day", "week" or "month", counted from the date interval_anchor
+        self.interval_unit = interval_unit
+        self.interval_anchor = interval_anchor
+
+    def get_month_mask(self, year, month, last_wipe_date=None):
+        if not (self.months >> (month - 1)) & 1:
+            return 0
+        if self.interval_unit == "month" and ((year * 12 + month) - (self.interval_anchor.year * 12 + self.interval_anchor.month)) % self.interval != 0:
+            return 0
+
+        first_weekday, days_in_month = calendar.monthrange(year, month)
+        first_weekday += 1
+        all_days = (1 << days_in_month) - 1
+
+        day_mask = None
+        if self.month_days is not None or self.last_month_days is not None:
+            day_mask = (self.month_days or 0) & all_days
+            for bit in _get_bits(self.last_month_days or 0):
+                if bit < days_in_month:
+                    day_mask |= 1 << (days_in_month - 1 - bit)
+
+        weekday_mask = None
+        if self.weekdays is not None or self.nth_weekdays is not None or self.last_nth_weekdays is not None:
+            weekday_mask = 0
+            for weekday in range(1, 8):
+                offset = (weekday - first_weekday) % 7
+                if ((self.weekdays or 0) >> (weekday - 1)) & 1:
+                    weekday_mask |= (WEEKDAY_PATTERN << offset) & all_days
+                    continue
+                count = (days_in_month - 1 - offset) // 7 + 1
+                for bit in _get_bits((self.nth_weekdays or {}).get(weekday, 0)):
+                    if bit < count:
+                        weekday_mask |= 1 << (offset + 7 * bit)
+                for bit in _get_bits((self.last_nth_weekdays or {}).get(weekday, 0)):
+                    if bit < count:
+                        weekday_mask |= 1 << (offset + 7 * (count - 1 - bit))
+
+        if day_mask is None and weekday_mask is None:
+            mask = all_days
+        elif day_mask is None or weekday_mask is None:
+            mask = day_mask if weekday_mask is None else weekday_mask
+        elif self.match_any:
+            mask = day_mask | weekday_mask
+        else:
+            mask = day_mask & weekday_mask
+
+        if mask and self.interval_unit in ("day", "week"):
+            mask &= self._get_interval_mask(date(year, month, 1).toordinal(), days_in_month)
+        return mask
+
+    def _get_interval_mask(self, first_ordinal, days_in_month):
+        anchor_ordinal = self.interval_anchor.toordinal()
+        mask = 0
+        if self.interval_unit == "day":
+            for day_index in range((anchor_ordinal - first_ordinal) % self.interval, days_in_month, self.interval):
+                mask |= 1 << day_index
+        else:
+            # weeks start on monday, date.toordinal() 1 is a monday
+            anchor_week = (anchor_ordinal - 1) // 7
+            for day_index in range(days_in_month):
+                if ((first_ordinal + day_index - 1) // 7 - anchor_week) % self.interval == 0:
+                    mask |= 1 << day_index
+        return mask
+
+
+class WeekNumberTerm(object):
+    '''
+        Wipe type 2: the weekdays of the week of the year (day 1-7 = week 1, ...), that is two weeks after the week of
+        the last wipe, or of the first wipe if there was none.
+    '''
+    __slots__ = ("weekdays", "first_wipe_date")
+
+    def __init__(self, weekdays, first_wipe_date):
+        self.weekdays = weekdays
+        self.first_wipe_date = first_wipe_date
+
+    def get_month_mask(self, year, month, last_wipe_date=None):
+        reference_date = last_wipe_date if last_wipe_date is not None else self.first_wipe_date
+        week_number = get_week_number(reference_date) + 2
+
+        first_weekday, days_in_month = calendar.monthrange(year, month)
+        first_yday = date(year, month, 1).timetuple().tm_yday
+        # day indexes of the month, that belong to week_number
+        first_index = max((week_number - 1) * 7 + 1 - first_yday, 0)
+        last_index = min(week_number * 7 - first_yday, days_in_month - 1)
+        if first_index > last_index:
+            return 0
+        week_mask = ((1 << (last_index + 1)) - 1) & ~((1 << first_index) - 1)
+
+        weekday_mask = 0
+        # bit weekday-1 and monthrange() both count monday as 0
+        for bit in _get_bits(self.weekdays):
+            weekday_mask |= WEEKDAY_PATTERN << ((bit - first_weekday) % 7)
+        return week_mask & weekday_mask
+
+
+class WipeRule(object):
+    '''
+        Compiled wipe schedule of one wipe kind. A day is a wipe day, if any term and no exclude term matches it, it is
+        not before first_wipe_date or after until_date and it is not the day of the last wipe. The wipe is due once the
+        local time reaches wipe_time (HHMM).
+    '''
+    __slots__ = ("terms", "exclude_terms", "wipe_time", "first_wipe_date", "until_date", "first_wipe_date_fires", "expression")
+
+    def __init__(self, terms, wipe_time, first_wipe_date=None, exclude_terms=(), until_date=None, first_wipe_date_fires=False, expression=None):
+        self.terms = tuple(terms)
+        self.exclude_terms = tuple(exclude_terms)
+        self.wipe_time = wipe_time
+        self.first_wipe_date = first_wipe_date
+        self.until_date = until_date
+        # the numeric wipe types always wipe on the first wipe date
+        self.first_wipe_date_fires = first_wipe_date_fires
+        self.expression = expression
+
+    def get_month_mask(self, year, month, last_wipe_date=None):
+        mask = 0
+        for term in self.terms:
+            mask |= term.get_month_mask(year, month, last_wipe_date)
+        if mask:
+            for term in self.exclude_terms:
+                mask &= ~term.get_month_mask(year, month, last_wipe_date)
+
+        first_wipe_date = self.first_wipe_date
+        if first_wipe_date is not None and (year, month) <= (first_wipe_date.year, first_wipe_date.month):
+            if (year, month) < (first_wipe_date.year, first_wipe_date.month):
+                return 0
+            mask &= ~((1 << (first_wipe_date.day - 1)) - 1)
+            if self.first_wipe_date_fires:
+                mask |= 1 << (first_wipe_date.day - 1)
+
+        until_date = self.until_date
+        if until_date is not None and (year, month) >= (until_date.year, until_date.month):
+            if (year, month) > (until_date.year, until_date.month):
+                return 0
+            mask &= (1 << until_date.day) - 1
+
+        if last_wipe_date is not None and last_wipe_date.year == year and last_wipe_date.month == month:
+            mask &= ~(1 << (last_wipe_date.day - 1))
+        return mask
+
+    def is_wipe_date(self, current_date, last_wipe_date=None):
+        return bool((self.get_month_mask(current_date.year, current_date.month, last_wipe_date) >> (current_date.day - 1)) & 1)
+
+    def is_due(self, current_date, current_time, last_wipe_date=None):
+        '''
+            Returns True if current_date is a wipe date and current_time (HHMM) reached the wipe time.
+        '''
+        if self.wipe_time > current_time:
+            return False
+        return self.is_wipe_date(current_date, last_wipe_date)
+
+    def get_next_wipe_date(self, from_date, last_wipe_date=None, max_date=None):
+        '''
+            Returns the first wipe day at or after from_date, or None if there is none until max_date.
+            Looks at whole months at once, so the time does not depend on the distance to the next wipe day.
+        '''
+        if self.first_wipe_date is not None and from_date < self.first_wipe_date:
+            from_date = self.first_wipe_date
+        if self.until_date is not None and (max_date is None or self.until_date < max_date):
+            max_date = self.until_date
+
+        year = from_date.year
+        month = from_date.month
+        mask = self.get_month_mask(year, month, last_wipe_date) & ~((1 << (from_date.day - 1)) - 1)
+        for i in range(MAX_SEARCH_MONTHS):
+            if mask:
+                wipe_date = date(year, month, _get_lowest_bit(mask) + 1)
+                if max_date is not None and wipe_date > max_date:
+                    return None
+                return wipe_date
+            month += 1
+            if month > 12:
+                month = 1
+                year += 1
+            if max_date is not None and (year, month) > (max_date.year, max_date.month):
+                return None
+            mask = self.get_month_mask(year, month, last_wipe_date)
+        return None
+
+
+def compile_wipe_types(wipe_types, wipe_days, wipe_time, first_wipe_date):
+    '''
+        Translates the numeric wipe types and days into a WipeRule: 1 = every week, 2 = every 2nd week, 3-7 = the
+        1st-5th wipe day of the month. The first wipe date is always a wipe date.
+    '''
+    weekdays = 0
+    for day in wipe_days:
+        weekdays |= 1 << (day - 1)
+
+    terms = []
+    calendar_term = CalendarTerm(weekdays=0, nth_weekdays={})
+    for wipe_type in set(wipe_types):
+        # 1 -> WEEKLY
+        if wipe_type == 1:
+            calendar_term.weekdays = weekdays
+        # 2 -> every 2nd week, counted from the week of the last (or first) wipe
+        elif wipe_type == 2:
+            terms.append(WeekNumberTerm(weekdays, first_wipe_date))
+        # 3-7 .. 1st - 5th Weekday of Month
+        elif wipe_type >= 3 and wipe_type <= 7:
+            for day in wipe_days:
+                calendar_term.nth_weekdays[day] = calendar_term.nth_weekdays.get(day, 0) | (1 << (wipe_type - 3))
+    if calendar_term.weekdays or calendar_term.nth_weekdays:
+        terms.append(calendar_term)
+
+    return WipeRule(terms, wipe_time, first_wipe_date, first_wipe_date_fires=True)
+
+def compile_wipe_schedule(expression, wipe_time=None, first_wipe_date=None):
+    '''
+        Compiles a cron expression ("minute hour day-of-month month day-of-week") or RRULE lines into a WipeRule.
+        expression may be a string or a list of lines. RRULE lines may be prefixed with "RRULE:" and "EXRULE:" lines
+        remove their days again. first_wipe_date is the DTSTART of the RRULE.
+    '''
+    lines = expression if isinstance(expression, list) else expression.splitlines()
+    lines = [line.strip() for line in lines if line.strip()]
+    if not lines:
+        raise Exception("Empty wipe schedule!")
+
+    if "FREQ=" not in lines[0].upper():
+        if len(lines) > 1:
+            raise Exception("A cron wipe schedule has only one line!")
+        terms, cron_wipe_time = _parse_cron(lines[0])
+        return _check_wipe_dates(WipeRule(terms, cron_wipe_time, first_wipe_date, expression=expression))
+
+    terms = []
+    exclude_terms = []
+    rule_wipe_time = None
+    until_date = None
+    for line in lines:
+        name, separator, value = line.partition(":")
+        if not separator:
+            name, value = "RRULE", line
+        name = name.strip().upper()
+        if name not in ("RRULE", "EXRULE"):
+            raise Exception("Unsupported wipe schedule line '{0}'! Only RRULE and EXRULE lines are supported.".format(line))
+
+        term, line_wipe_time, line_until_date = _parse_rrule(value, wipe_time, first_wipe_date)
+        if name == "EXRULE":
+            exclude_terms.append(term)
+            continue
+        if terms:
+            raise Exception("Only one RRULE line is supported!")
+        terms.append(term)
+        rule_wipe_time = line_wipe_time
+        until_date = line_until_date
+
+    if not terms:
+        raise Exception("Missing RRULE line in wipe schedule!")
+    return _check_wipe_dates(WipeRule(terms, rule_wipe_time, first_wipe_date, exclude_terms, until_date, expression=expression))
+
+def _check_wipe_dates(wipe_rule):
+    '''
+        Returns wipe_rule, if it has a wipe date within MAX_LOOKAHEAD_YEARS after the first wipe date (or today).
+    '''
+    from_date = wipe_rule.first_wipe_date or date.today()
+    if wipe_rule.get_next_wipe_date(from_date, None, from_date + timedelta(days=366 * MAX_LOOKAHEAD_YEARS)) is None:
+        raise Exception("The wipe schedule has no wipe date within {0} years after '{1}'!".format(MAX_LOOKAHEAD_YEARS, from_date))
+    return wipe_rule
+
+def _parse_cron(expression):
+    fields = expression.split()
+    if len(fields) != 5:
+        raise Exception("Cron expression '{0}' needs the 5 fields minute, hour, day-of-month, month and day-of-week!".format(expression))
+
+    minutes = _parse_cron_field(fields[0], 0, 59)
+    hours = _parse_cron_field(fields[1], 0, 23)
+    # the daemon wipes at most once a day
+    if len(minutes) != 1 or len(hours) != 1:
+        raise Exception("Cron expression '{0}' has to name exactly one minute and one hour, a wipe runs at most once a day!".format(expression))
+
+    term = CalendarTerm(match_any=True)
+    term.months = _to_mask(_parse_cron_field(fields[3], 1, 12, CRON_MONTH_NAMES), 1)
+
+    if fields[2] not in ("*", "?"):
+        month_days = set()
+        for part in fields[2].split(","):
+            if part.upper() == "L":
+                term.last_month_days = 1
+            else:
+                month_days |= _parse_cron_field(part, 1, 31)
+        term.month_days = _to_mask(month_days, 1)
+
+    if fields[4] not in ("*", "?"):
+        weekdays = set()
+        for part in fields[4].split(","):
+            part = part.upper()
+            # 4L = last thursday, 4#2 = second thursday of the month
+            if part.endswith("L") and len(part) > 1:
+                weekday = _get_cron_weekday(part[:-1])
+                term.last_nth_weekdays = term.last_nth_weekdays or {}
+                term.last_nth_weekdays[weekday] = term.last_nth_weekdays.get(weekday, 0) | 1
+            elif "#" in part:
+                weekday_part, n_part = part.split("#", 1)
+                weekday = _get_cron_weekday(weekday_part)
+                n = _parse_int(n_part, 1, 5, expression)
+                term.nth_weekdays = term.nth_weekdays or {}
+                term.nth_weekdays[weekday] = term.nth_weekdays.get(weekday, 0) | (1 << (n - 1))
+            else:
+                weekdays |= set(7 if day == 0 else day for day in _parse_cron_field(part, 0, 7, CRON_WEEKDAY_NAMES))
+        term.weekdays = _to_mask(weekdays, 1)
+
+    # cron only ORs the day of month and the weekday, if both are restricted
+    if term.month_days == 0 and term.last_month_days is None:
+        term.month_days = None
+    if term.weekdays == 0 and term.nth_weekdays is None and term.last_nth_weekdays is None:
+        term.weekdays = None
+
+    return [term], "{0:02d}{1:02d}".format(hours.pop(), minutes.pop())
+
+def _parse_cron_field(field, minimum, maximum, names=None):
+    values = set()
+    for part in field.split(","):
+        part = part.upper()
+        step = 1
+        if "/" in part:
+            part, step_part = part.split("/", 1)
+            step = _parse_int(step_part, 1, maximum, field)
+        if part in ("*", "?"):
+            start, end = minimum, maximum
+        elif "-" in part:
+            start_part, end_part = part.split("-", 1)
+            start = _parse_cron_value(start_part, minimum, maximum, names, field)
+            end = _parse_cron_value(end_part, minimum, maximum, names, field)
+        else:
+            start = _parse_cron_value(part, minimum, maximum, names, field)
+            # 5/10 = every 10th starting at 5
+            end = maximum if step > 1 else start
+        if start > end:
+            raise Exception("Invalid range '{0}' in cron field '{1}'!".format(part, field))
+        values.update(range(start, end + 1, step))
+    return values
+
+def _parse_cron_value(value, minimum, maximum, names, field):
+    if names is not None and value in names:
+        return names[value]
+    return _parse_int(value, minimum, maximum, field)
+
+def _get_cron_weekday(value):
+    if value in CRON_WEEKDAY_NAMES:
+        value = CRON_WEEKDAY_NAMES[value]
+    weekday = _parse_int(str(value), 0, 7, value)
+    return 7 if weekday == 0 else weekday
+
+def _parse_rrule(rule, wipe_time, first_wipe_date):
+    parts = {}
+    for part in rule.split(";"):
+        if not part.strip():
+            continue
+        key, separator, value = part.partition("=")
+        if not separator:
+            raise Exception("Invalid RRULE part '{0}'!".format(part))
+        parts[key.strip().upper()] = value.strip().upper()
+
+    frequency = parts.pop("FREQ", None)
+    if frequency not in RRULE_FREQUENCIES:
+        raise Exception("Unsupported RRULE FREQ '{0}'! Supported: {1}".format(frequency, RRULE_FREQUENCIES))
+    if parts.pop("WKST", "MO") != "MO":
+        raise Exception("Only WKST=MO is supported!")
+    if "COUNT" in parts:
+        raise Exception("COUNT is not supported, use UNTIL instead!")
+
+    term = CalendarTerm()
+    interval = _parse_int(parts.pop("INTERVAL", "1"), 1, 1000, rule)
+    if interval > 1:
+        if first_wipe_date is None:
+            raise Exception("An RRULE with INTERVAL needs the first wipe date as start!")
+        term.interval = interval
+        term.interval_unit = {"DAILY": "day", "WEEKLY": "week", "MONTHLY": "month"}[frequency]
+        term.interval_anchor = first_wipe_date
+
+    if "BYMONTH" in parts:
+        term.months = _to_mask([_parse_int(value, 1, 12, rule) for value in parts.pop("BYMONTH").split(",")], 1)
+
+    if "BYMONTHDAY" in parts:
+        if frequency == "WEEKLY":
+            raise Exception("BYMONTHDAY is not allowed with FREQ=WEEKLY!")
+        term.month_days = 0
+        term.last_month_days = 0
+        for value in parts.pop("BYMONTHDAY").split(","):
+            day = _parse_int(value, -31, 31, rule)
+            if day > 0:
+                term.month_days |= 1 << (day - 1)
+            elif day < 0:
+                term.last_month_days |= 1 << (-day - 1)
+            else:
+                raise Exception("BYMONTHDAY=0 is not allowed!")
+
+    if "BYDAY" in parts:
+        term.weekdays = 0
+        for value in parts.pop("BYDAY").split(","):
+            weekday = WEEKDAY_NAMES.get(value[-2:])
+            if weekday is None:
+                raise Exception("Invalid BYDAY '{0}'!".format(value))
+            if len(value) == 2:
+                term.weekdays |= 1 << (weekday - 1)
+                continue
+            if frequency != "MONTHLY":
+                raise Exception("BYDAY with position '{0}' needs FREQ=MONTHLY!".format(value))
+            n = _parse_int(value[:-2], -5, 5, rule)
+            if n > 0:
+                term.nth_weekdays = term.nth_weekdays or {}
+                term.nth_weekdays[weekday] = term.nth_weekdays.get(weekday, 0) | (1 << (n - 1))
+            elif n < 0:
+                term.last_nth_weekdays = term.last_nth_weekdays or {}
+                term.last_nth_weekdays[weekday] = term.last_nth_weekdays.get(weekday, 0) | (1 << (-n - 1))
+            else:
+                raise Exception("Invalid BYDAY '{0}'!".format(value))
+
+    # without BY* days the day is taken from the start, like RFC 5545 does
+    if frequency == "WEEKLY" and term.weekdays is None:
+        if first_wipe_date is None:
+            raise Exception("FREQ=WEEKLY without BYDAY needs the first wipe date as start!")
+        term.weekdays = 1 << (first_wipe_date.isoweekday() - 1)
+    elif frequency == "MONTHLY" and term.weekdays is None and term.month_days is None:
+        if first_wipe_date is None:
+            raise Exception("FREQ=MONTHLY without BYDAY or BYMONTHDAY needs the first wipe date as start!")
+        term.month_days = 1 << (first_wipe_date.day - 1)
+
+    hour = parts.pop("BYHOUR", None)
+    minute = parts.pop("BYMINUTE", None)
+    if hour is not None or minute is not None:
+        if wipe_time is None and (hour is None or minute is None):
+            raise Exception("RRULE needs BYHOUR and BYMINUTE or a wipe time!")
+        rule_wipe_time = "{0:02d}{1:02d}".format(_parse_int(hour, 0, 23, rule) if hour is not None else int(wipe_time[:2]), _parse_int(minute, 0, 59, rule) if minute is not None else int(wipe_time[2:]))
+    elif wipe_time is not None:
+        rule_wipe_time = wipe_time
+    else:
+        raise Exception("RRULE needs BYHOUR and BYMINUTE or a wipe time!")
+
+    until_date = None
+    if "UNTIL" in parts:
+        until = parts.pop("UNTIL")
+        try:
+            until_date = date(int(until[0:4]), int(until[4:6]), int(until[6:8]))
+        except ValueError:
+            raise Exception("Invalid UNTIL '{0}'! Expected format YYYYMMDD.".format(until))
+
+    if parts:
+        raise Exception("Unsupported RRULE parts: {0}".format(sorted(parts.keys())))
+    return term, rule_wipe_time, until_date
+
+def _parse_int(value, minimum, maximum, source):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise Exception("Invalid number '{0}' in '{1}'!".format(value, source))
+    if number < minimum or number > maximum:
+        raise Exception("Number '{0}' in '{1}' is not between {2} and {3}!".format(value, source, minimum, maximum))
+    return number
+
+def _to_mask(values, first_value):
+    mask = 0
+    for value in values:
+        mask |= 1 << (value - first_value)
+    return mask
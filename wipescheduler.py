@@ -0,0 +1,173 @@
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime as dt
+
+from simplelogger import LogLevel
+
+
+class SystemClock(object):
+    '''
+        The clocks the WipeScheduler reads, tests pass their own to simulate clock jumps and DST changes.
+    '''
+
+    def now(self, time_zone):
+        return dt.now(time_zone)
+
+    def wall(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def boottime(self):
+        # CLOCK_BOOTTIME keeps counting while the system is suspended, CLOCK_MONOTONIC does not
+        try:
+            return time.clock_gettime(time.CLOCK_BOOTTIME)
+        except (AttributeError, OSError):
+            return None
+
+    def sleep(self, event, seconds):
+        '''
+            Sleeps seconds or until event is set.
+        '''
+        event.wait(seconds)
+
+
+class WipeScheduler(object):
+    '''
+        Keeps the next fire instant of every wipe rule in a priority queue and blocks until the earliest one is due.
+        next_instant_functions maps a rule key to a callable, that takes the current (aware) datetime and returns the
+        next aware fire instant of that rule or None.
+    '''
+
+    def __init__(self, next_instant_functions, time_zone, log, max_sleep_seconds=300, clock_jump_tolerance_seconds=5, clock=None):
+        self.next_instant_functions = dict(next_instant_functions)
+        self.clock = clock if clock is not None else SystemClock()
+        self.time_zone = time_zone
+        self.log = log
+        self.max_sleep_seconds = max_sleep_seconds
+        self.clock_jump_tolerance_seconds = clock_jump_tolerance_seconds
+
+        self._queue = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._wake_event = threading.Event()
+        self._paused = set()
+        self._built_for_date = None
+        self._built_for_utcoffset = None
+
+    def add(self, key, next_instant_function):
+        self.next_instant_functions[key] = next_instant_function
+        self.reschedule([key])
+
+    def remove(self, key):
+        self.next_instant_functions.pop(key, None)
+        self._entries.pop(key, None)
+        self._paused.discard(key)
+
+    def pause(self, keys):
+        '''
+            Takes the given rules out of the queue until resume() is called, e.g. while their wipe is running.
+        '''
+        for key in keys:
+            self._paused.add(key)
+            self._entries.pop(key, None)
+
+    def resume(self, keys):
+        self._paused.difference_update(keys)
+        self.reschedule(keys)
+
+    def rebuild(self):
+        now = self.clock.now(self.time_zone)
+        self._queue = []
+        self._entries = {}
+        self._built_for_date = now.date()
+        self._built_for_utcoffset = now.utcoffset()
+        self._schedule(self.next_instant_functions.keys(), now)
+
+    def reschedule(self, keys):
+        self._schedule(keys, self.clock.now(self.time_zone))
+
+    def _schedule(self, keys, now):
+        for key in list(keys):
+            self._entries.pop(key, None)
+            if key in self._paused:
+                continue
+            next_instant = self.next_instant_functions[key](now)
+            if next_instant is None:
+                self.log("No upcoming fire instant for '{0}'.".format(key), LogLevel.DEBUG)
+                continue
+            sequence = next(self._counter)
+            self._entries[key] = (next_instant, sequence)
+            heapq.heappush(self._queue, (next_instant, sequence, key))
+            self.log("Scheduled '{0}' at '{1}'.".format(key, next_instant), LogLevel.DEBUG)
+
+    def next_fire(self):
+        '''
+            Returns (instant, key) of the earliest scheduled rule or None.
+        '''
+        # entries are replaced lazily, so drop stale heap items until the top is current
+        while self._queue:
+            instant, sequence, key = self._queue[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == sequence:
+                return instant, key
+            heapq.heappop(self._queue)
+        return None
+
+    def due(self, now=None):
+        if now is None:
+            now = self.clock.now(self.time_zone)
+        return [key for key, (instant, sequence) in self._entries.items() if instant <= now]
+
+    def wake(self):
+        '''
+            Interrupts a running wait(), e.g. after the wipe state got changed from another thread.
+        '''
+        self._wake_event.set()
+
+    def wait(self):
+        '''
+            Sleeps until the earliest rule is due, but at most max_sleep_seconds, so that clock jumps, DST changes and
+            suspend/resume are noticed in time. Returns the list of due rule keys (which may be empty).
+        '''
+        if self._built_for_date is None:
+            self.rebuild()
+
+        next_fire = self.next_fire()
+        now = self.clock.now(self.time_zone)
+        if next_fire is None:
+            sleep_seconds = self.max_sleep_seconds
+        else:
+            sleep_seconds = min(max((next_fire[0] - now).total_seconds(), 0), self.max_sleep_seconds)
+
+        if sleep_seconds > 0:
+            self.log("Sleeping {0:.1f} seconds until next schedule check.".format(sleep_seconds), LogLevel.TRACE)
+            wall_before = self.clock.wall()
+            monotonic_before = self.clock.monotonic()
+            boottime_before = self.clock.boottime()
+
+            self.clock.sleep(self._wake_event, sleep_seconds)
+            self._wake_event.clear()
+
+            wall_elapsed = self.clock.wall() - wall_before
+            monotonic_elapsed = self.clock.monotonic() - monotonic_before
+            if abs(wall_elapsed - monotonic_elapsed) > self.clock_jump_tolerance_seconds:
+                boottime_after = self.clock.boottime()
+                if boottime_before is not None and boottime_after is not None and (boottime_after - boottime_before) - monotonic_elapsed > self.clock_jump_tolerance_seconds:
+                    self.log("System suspend of {0:.0f} seconds detected! Rebuilding wipe schedule..".format((boottime_after - boottime_before) - monotonic_elapsed), LogLevel.WARN)
+                else:
+                    self.log("Wall clock jump of {0:+.0f} seconds detected! Rebuilding wipe schedule..".format(wall_elapsed - monotonic_elapsed), LogLevel.WARN)
+                self.rebuild()
+
+        now = self.clock.now(self.time_zone)
+        if now.utcoffset() != self._built_for_utcoffset:
+            self.log("UTC offset of time zone '{0}' changed from '{1}' to '{2}'! Rebuilding wipe schedule..".format(self.time_zone, self._built_for_utcoffset, now.utcoffset()), LogLevel.INFO)
+            self.rebuild()
+        elif now.date() != self._built_for_date:
+            self.log("Date changed to '{0}'. Rebuilding wipe schedule..".format(now.date()), LogLevel.DEBUG)
+            self.rebuild()
+
+        return self.due(now)
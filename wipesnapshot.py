@@ -0,0 +1,265 @@
+import os
+import re
+import json
+import stat
+import errno
+import shutil
+from time import monotonic
+from datetime import datetime as dt
+
+SNAPSHOT_METHODS=["auto", "reflink", "copy"]
+MANIFEST_FILE="snapshot.json"
+MANIFEST_VERSION=1
+SNAPSHOT_NAME_PATTERN=re.compile(r"^\d{8}-\d{6}-[a-z]+$")
+# files above this size are copied in chunks of this size by several threads
+COPY_CHUNK_SIZE=64 * 1024 * 1024
+COPY_THREADS=4
+# ioctl FICLONE from linux/fs.h, clones a whole file on btrfs, xfs and other copy-on-write file systems
+FICLONE=0x40049409
+REFLINK_UNSUPPORTED_ERRORS=(errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS)
+
+
+class SnapshotResult(object):
+
+    def __init__(self, path, file_count, linked_count, cloned_count, copied_count, copied_bytes, duration_seconds):
+        self.path = path
+        self.file_count = file_count
+        # unchanged files, hardlinked from the previous snapshot
+        self.linked_count = linked_count
+        self.cloned_count = cloned_count
+        self.copied_count = copied_count
+        self.copied_bytes = copied_bytes
+        self.duration_seconds = duration_seconds
+
+    def __str__(self):
+        return "'{0}': {1} files, {2} linked from the previous snapshot, {3} cloned, {4} copied ({5:.1f} MB) in {6:.1f}s".format(self.path, self.file_count, self.linked_count, self.cloned_count, self.copied_count, self.copied_bytes / 1024 / 1024, self.duration_seconds)
+
+
+def get_directory_keys(directories):
+    '''
+        Returns (key, absolute path) of every directory, the key is the name of the directory inside a snapshot.
+    '''
+    keys = []
+    for directory in directories:
+        key = os.path.basename(os.path.normpath(directory)) or "root"
+        if key in [existing_key for existing_key, _ in keys]:
+            key = "{0}.{1}".format(key, len(keys))
+        keys.append((key, os.path.abspath(directory)))
+    return keys
+
+def list_snapshots(snapshot_location):
+    '''
+        Returns the paths of all complete snapshots in snapshot_location, the oldest first.
+    '''
+    if not os.path.isdir(snapshot_location):
+        return []
+    snapshots = [os.path.join(snapshot_location, name) for name in os.listdir(snapshot_location) if SNAPSHOT_NAME_PATTERN.match(name) and os.path.isfile(os.path.join(snapshot_location, name, MANIFEST_FILE))]
+    # the name only has seconds, a manual snapshot and a wipe can share them
+    return sorted(snapshots, key=lambda snapshot_path: (os.path.basename(snapshot_path)[:15], os.path.getmtime(os.path.join(snapshot_path, MANIFEST_FILE))))
+
+def load_manifest(snapshot_path):
+    with open(os.path.join(snapshot_path, MANIFEST_FILE)) as manifest_file:
+        return json.load(manifest_file)
+
+def create_snapshot(directories, snapshot_location, label, method="auto", retention=0, threads=COPY_THREADS, log=print):
+    '''
+        Snapshots the directories into "<snapshot_location>/<YYYYmmdd-HHMMSS>-<label>". Files, that did not change
+        since the previous snapshot (same size and modification time), are hardlinked from it. Changed files are
+        cloned with reflinks (method "auto" falls back to copying, if the file system can not clone) or copied by
+        several threads, large files in chunks. The snapshot is written into a temporary directory and renamed, once
+        it is complete. Afterwards only the newest retention snapshots are kept (0 = all). Returns a SnapshotResult.
+    '''
+    from concurrent.futures import ThreadPoolExecutor
+
+    if method not in SNAPSHOT_METHODS:
+        raise Exception("Invalid snapshot method '{0}'! Choose one of these: {1}".format(method, SNAPSHOT_METHODS))
+    started = monotonic()
+    os.makedirs(snapshot_location, exist_ok=True)
+    _remove_incomplete_snapshots(snapshot_location)
+
+    snapshots = list_snapshots(snapshot_location)
+    previous_path = snapshots[-1] if snapshots else None
+    previous_files = {}
+    if previous_path is not None:
+        try:
+            previous_manifest = load_manifest(previous_path)
+            # a file is only taken over, if its directory still comes from the same source
+            directory_keys = dict(get_directory_keys(directories))
+            previous_keys = set(key for key, source in previous_manifest["directories"].items() if directory_keys.get(key) == source)
+            previous_files = {path: tuple(file_stat) for path, file_stat in previous_manifest["files"].items() if path.split("/", 1)[0] in previous_keys}
+        except Exception as ex:
+            log("Failed to read previous snapshot '{0}', every file gets copied! Error Message: '{1}'".format(previous_path, ex))
+
+    name = "{0}-{1}".format(dt.now().strftime("%Y%m%d-%H%M%S"), label)
+    snapshot_path = os.path.join(snapshot_location, name)
+    if os.path.exists(snapshot_path):
+        raise Exception("Snapshot '{0}' already exists!".format(snapshot_path))
+    tmp_path = snapshot_path + ".tmp"
+    os.makedirs(tmp_path)
+
+    try:
+        files = {}
+        linked_count = 0
+        copier = _FileCopier(method != "copy", method == "reflink", threads)
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="snapshot") as executor:
+            copier.executor = executor
+            for key, source in get_directory_keys(directories):
+                if not os.path.isdir(source):
+                    raise Exception("Snapshot directory '{0}' does not exist!".format(source))
+                for root, dir_names, file_names in os.walk(source):
+                    relative_root = os.path.relpath(root, source)
+                    target_root = os.path.normpath(os.path.join(tmp_path, key, relative_root))
+                    os.makedirs(target_root, exist_ok=True)
+                    for entry_name in dir_names + file_names:
+                        source_file = os.path.join(root, entry_name)
+                        target_file = os.path.join(target_root, entry_name)
+                        file_stat = os.lstat(source_file)
+                        if stat.S_ISLNK(file_stat.st_mode):
+                            os.symlink(os.readlink(source_file), target_file)
+                            continue
+                        if not stat.S_ISREG(file_stat.st_mode):
+                            continue
+                        path = "/".join((key, os.path.normpath(os.path.join(relative_root, entry_name))))
+                        files[path] = (file_stat.st_size, file_stat.st_mtime_ns)
+                        if previous_files.get(path) == files[path]:
+                            try:
+                                os.link(os.path.join(previous_path, path), target_file)
+                                linked_count += 1
+                                continue
+                            except OSError:
+                                pass
+                        copier.copy(source_file, target_file, file_stat)
+                    # symlinks to directories are copied as symlinks, not walked
+                    dir_names[:] = [dir_name for dir_name in dir_names if not os.path.islink(os.path.join(root, dir_name))]
+            copier.wait()
+
+        manifest = {"version": MANIFEST_VERSION, "label": label, "created": dt.now().isoformat(), "directories": dict(get_directory_keys(directories)), "files": files}
+        with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as manifest_file:
+            json.dump(manifest, manifest_file, separators=(",", ":"))
+        os.rename(tmp_path, snapshot_path)
+    except BaseException:
+        # a half written snapshot must never become the base of the next one
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    if retention > 0:
+        for old_snapshot in list_snapshots(snapshot_location)[:-retention]:
+            shutil.rmtree(old_snapshot)
+            log("Removed snapshot '{0}'".format(old_snapshot))
+    return SnapshotResult(snapshot_path, len(files), linked_count, copier.cloned_count, copier.copied_count, copier.copied_bytes, monotonic() - started)
+
+def restore_snapshot(snapshot_path, threads=COPY_THREADS, log=print):
+    '''
+        Replaces every snapshotted directory with its content in the snapshot. The files are cloned or copied, never
+        hardlinked, so the running server can not change the snapshot. Each directory is restored next to the original
+        and swapped in with a rename. The server has to be stopped.
+    '''
+    from concurrent.futures import ThreadPoolExecutor
+
+    manifest = load_manifest(snapshot_path)
+    restored = []
+    copier = _FileCopier(True, False, threads)
+    for key, source in manifest["directories"].items():
+        restore_path = source.rstrip(os.sep) + ".restore"
+        replaced_path = source.rstrip(os.sep) + ".replaced"
+        for leftover in (restore_path, replaced_path):
+            if os.path.lexists(leftover):
+                shutil.rmtree(leftover)
+
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="restore") as executor:
+            copier.executor = executor
+            snapshot_directory = os.path.join(snapshot_path, key)
+            for root, dir_names, file_names in os.walk(snapshot_directory):
+                target_root = os.path.normpath(os.path.join(restore_path, os.path.relpath(root, snapshot_directory)))
+                os.makedirs(target_root, exist_ok=True)
+                for entry_name in dir_names + file_names:
+                    snapshot_file = os.path.join(root, entry_name)
+                    file_stat = os.lstat(snapshot_file)
+                    if stat.S_ISLNK(file_stat.st_mode):
+                        os.symlink(os.readlink(snapshot_file), os.path.join(target_root, entry_name))
+                    elif stat.S_ISREG(file_stat.st_mode):
+                        copier.copy(snapshot_file, os.path.join(target_root, entry_name), file_stat)
+                dir_names[:] = [dir_name for dir_name in dir_names if not os.path.islink(os.path.join(root, dir_name))]
+            copier.wait()
+
+        if os.path.lexists(source):
+            os.rename(source, replaced_path)
+        os.rename(restore_path, source)
+        if os.path.lexists(replaced_path):
+            shutil.rmtree(replaced_path)
+        log("Restored '{0}' from snapshot '{1}'".format(source, snapshot_path))
+        restored.append(source)
+    return restored
+
+
+class _FileCopier(object):
+    '''
+        Copies files through the thread pool in executor: with a reflink clone if allowed and supported, otherwise
+        with copy_file_range in chunks of COPY_CHUNK_SIZE. Mode and modification time are kept.
+    '''
+
+    def __init__(self, reflink, reflink_required, threads):
+        self.reflink = reflink
+        self.reflink_required = reflink_required
+        self.threads = threads
+        self.executor = None
+        self.futures = []
+        self.cloned_count = 0
+        self.copied_count = 0
+        self.copied_bytes = 0
+
+    def copy(self, source_file, target_file, file_stat):
+        if self.reflink and self._clone(source_file, target_file):
+            shutil.copystat(source_file, target_file)
+            self.cloned_count += 1
+            return
+        self.copied_count += 1
+        self.copied_bytes += file_stat.st_size
+        with open(target_file, 'wb') as target:
+            target.truncate(file_stat.st_size)
+        chunks = [(offset, min(COPY_CHUNK_SIZE, file_stat.st_size - offset)) for offset in range(0, file_stat.st_size, COPY_CHUNK_SIZE)]
+        self.futures.append(([self.executor.submit(_copy_chunk, source_file, target_file, offset, length) for offset, length in chunks], source_file, target_file))
+
+    def wait(self):
+        futures, self.futures = self.futures, []
+        for chunk_futures, source_file, target_file in futures:
+            for chunk_future in chunk_futures:
+                chunk_future.result()
+            # after the last write, otherwise the modification time would be the one of the copy
+            shutil.copystat(source_file, target_file)
+
+    def _clone(self, source_file, target_file):
+        import fcntl
+
+        with open(source_file, 'rb') as source, open(target_file, 'wb') as target:
+            try:
+                fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+                return True
+            except OSError as ex:
+                if ex.errno not in REFLINK_UNSUPPORTED_ERRORS:
+                    raise
+        if self.reflink_required:
+            raise Exception("The file system of '{0}' does not support reflinks!".format(target_file))
+        # the first failed clone decides for the rest of the run
+        self.reflink = False
+        return False
+
+
+def _copy_chunk(source_file, target_file, offset, length):
+    with open(source_file, 'rb') as source, open(target_file, 'r+b') as target:
+        end = offset + length
+        while offset < end:
+            try:
+                copied = os.copy_file_range(source.fileno(), target.fileno(), end - offset, offset, offset)
+            except (AttributeError, OSError):
+                # python < 3.8 or a kernel/file system without copy_file_range
+                data = os.pread(source.fileno(), min(end - offset, 1024 * 1024), offset)
+                copied = os.pwrite(target.fileno(), data, offset) if data else 0
+            if copied == 0:
+                raise Exception("'{0}' got shorter while copying it!".format(source_file))
+            offset += copied
+
+def _remove_incomplete_snapshots(snapshot_location):
+    for name in os.listdir(snapshot_location):
+        if name.endswith(".tmp") and SNAPSHOT_NAME_PATTERN.match(name[:-len(".tmp")]):
+            shutil.rmtree(os.path.join(snapshot_location, name))
@@ -0,0 +1,237 @@
+from time import sleep
+from time import monotonic
+from datetime import timedelta
+from collections import OrderedDict
+
+
+MAX_PARALLEL_STEPS=2
+# the retry delay of a step doubles with every retry up to this
+MAX_STEP_RETRY_DELAY_SECONDS=600
+# a retry waits up to this fraction less than its backoff, so retries of several servers spread out
+RETRY_JITTER=0.2
+
+
+class WipeStep(object):
+    '''
+        One command of a wipe. It starts once every step in after succeeded. timeout_seconds and
+        output_timeout_seconds of None mean the wipe_command_* settings of the instance. resources
+        (processlimits.ProcessLimits) only apply to this step, None means unlimited.
+    '''
+
+    def __init__(self, name, command, after=(), timeout_seconds=None, output_timeout_seconds=None, retries=0, retry_delay_seconds=10, resources=None):
+        self.name = name
+        self.command = command
+        self.after = list(after)
+        self.timeout_seconds = timeout_seconds
+        self.output_timeout_seconds = output_timeout_seconds
+        self.retries = retries
+        self.retry_delay_seconds = retry_delay_seconds
+        self.resources = resources
+
+    def __eq__(self, other):
+        return isinstance(other, WipeStep) and vars(self) == vars(other)
+
+    def __repr__(self):
+        return "WipeStep({0!r}, {1!r}, after={2!r})".format(self.name, self.command, self.after)
+
+
+class StepResult(object):
+
+    def __init__(self, step, started_seconds, finished_seconds, attempts, succeeded):
+        # attempts=0 means, that an earlier run of the wipe already finished the step
+        self.step = step
+        # seconds since the start of the run
+        self.started_seconds = started_seconds
+        self.finished_seconds = finished_seconds
+        self.attempts = attempts
+        self.succeeded = succeeded
+
+    @property
+    def resumed(self):
+        return self.attempts == 0
+
+    @property
+    def duration_seconds(self):
+        return self.finished_seconds - self.started_seconds
+
+
+class WipeStepsResult(object):
+
+    def __init__(self, steps, step_results, duration_seconds):
+        self.steps = steps
+        # step name -> StepResult, in the order the steps finished
+        self.step_results = step_results
+        self.duration_seconds = duration_seconds
+
+    @property
+    def succeeded(self):
+        return len(self.step_results) == len(self.steps) and all(step_result.succeeded for step_result in self.step_results.values())
+
+    @property
+    def skipped_steps(self):
+        return [step.name for step in self.steps if step.name not in self.step_results]
+
+    def get_critical_path(self):
+        '''
+            Returns the StepResults of the chain of steps, that decided the duration of the run: starting with the
+            step that finished last, each step is preceded by the step in its after list, that finished last.
+        '''
+        if not self.step_results:
+            return []
+        current = max(self.step_results.values(), key=lambda step_result: step_result.finished_seconds)
+        path = [current]
+        while current.step.after:
+            predecessors = [self.step_results[name] for name in current.step.after if name in self.step_results]
+            if not predecessors:
+                break
+            current = max(predecessors, key=lambda step_result: step_result.finished_seconds)
+            path.append(current)
+        path.reverse()
+        return path
+
+
+def parse_wipe_steps(steps_data):
+    '''
+        Parses the list of steps of a configuration, e.g. [{"name": "stop", "command": "..."}, {"name": "update",
+        "command": "...", "after": ["stop"], "timeout_seconds": "1800", "retries": "2"}] and returns the WipeSteps in
+        an order, in which every step comes after the steps it waits for.
+    '''
+    if not isinstance(steps_data, list) or not steps_data:
+        raise Exception("Wipe steps have to be a non empty list!")
+
+    steps = OrderedDict()
+    for step_data in steps_data:
+        if 'resources' in step_data:
+            # only imported with resource settings, it is not needed for "--check" without them
+            from processlimits import parse_process_limits
+        if 'name' not in step_data or 'command' not in step_data:
+            raise Exception("Every wipe step needs a 'name' and a 'command'!")
+        name = str(step_data['name'])
+        if name in steps:
+            raise Exception("Wipe step '{0}' is defined twice!".format(name))
+        after = step_data.get('after', [])
+        if isinstance(after, str):
+            after = [after]
+        steps[name] = WipeStep(
+            name,
+            step_data['command'],
+            after,
+            int(step_data['timeout_seconds']) if 'timeout_seconds' in step_data else None,
+            int(step_data['output_timeout_seconds']) if 'output_timeout_seconds' in step_data else None,
+            int(step_data.get('retries', 0)),
+            int(step_data.get('retry_delay_seconds', 10)),
+            parse_process_limits(step_data['resources']) if 'resources' in step_data else None)
+
+    for step in steps.values():
+        for name in step.after:
+            if name not in steps:
+                raise Exception("Wipe step '{0}' waits for unknown step '{1}'!".format(step.name, name))
+
+    # depth first topological sort, that keeps the configured order where possible
+    ordered = []
+    states = {}
+    def visit(step, path):
+        if states.get(step.name) == "done":
+            return
+        if states.get(step.name) == "visiting":
+            raise Exception("Wipe steps have a cycle: {0}".format(" -> ".join(path + [step.name])))
+        states[step.name] = "visiting"
+        for name in step.after:
+            visit(steps[name], path + [step.name])
+        states[step.name] = "done"
+        ordered.append(step)
+    for step in steps.values():
+        visit(step, [])
+    return ordered
+
+def get_single_step(command):
+    '''
+        A wipe command like wipe.sh as a graph with a single step.
+    '''
+    return [WipeStep("wipe", command)]
+
+def get_backoff_seconds(retry, delay_seconds, max_delay_seconds, jitter=RETRY_JITTER):
+    '''
+        Returns the seconds to wait before retry (1 = first retry): delay_seconds doubled with every retry up to
+        max_delay_seconds, minus a random part of up to jitter of it.
+    '''
+    # only imported once a wipe failed
+    import random
+
+    backoff_seconds = min(max_delay_seconds, delay_seconds * 2 ** min(retry - 1, 32))
+    return backoff_seconds * (1 - jitter * random.random())
+
+def run_wipe_steps(steps, run_step, max_parallel=MAX_PARALLEL_STEPS, log=print, completed_steps=()):
+    '''
+        Runs every step as soon as all steps in its after list succeeded, at most max_parallel at the same time.
+        run_step(step) runs the command of a step once and returns True on success. A step is retried up to its
+        retries. Once a step failed for good, no further step is started; the running ones are finished.
+        Steps in completed_steps were finished by an earlier run of the same wipe and are not run again.
+        Returns a WipeStepsResult.
+    '''
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+    run_started = monotonic()
+    step_results = OrderedDict()
+    pending = []
+    for step in steps:
+        if step.name in completed_steps:
+            step_results[step.name] = StepResult(step, 0.0, 0.0, 0, True)
+        else:
+            pending.append(step)
+    running = {}
+    failed = False
+    with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="step") as executor:
+        while pending or running:
+            if not failed:
+                for step in list(pending):
+                    if len(running) >= max_parallel:
+                        break
+                    if all(name in step_results and step_results[name].succeeded for name in step.after):
+                        pending.remove(step)
+                        running[executor.submit(_run_step_with_retries, step, run_step, log)] = (step, monotonic() - run_started)
+            if not running:
+                break
+
+            done, not_done = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step, started_seconds = running.pop(future)
+                try:
+                    attempts, succeeded = future.result()
+                except Exception as ex:
+                    log("Wipe step '{0}' raised an unexpected error: '{1}'".format(step.name, ex))
+                    attempts, succeeded = 1, False
+                step_results[step.name] = StepResult(step, started_seconds, monotonic() - run_started, attempts, succeeded)
+                if not succeeded:
+                    failed = True
+
+    return WipeStepsResult(steps, step_results, monotonic() - run_started)
+
+def _run_step_with_retries(step, run_step, log):
+    attempt = 1
+    while True:
+        if run_step(step) is True:
+            return attempt, True
+        if attempt > step.retries:
+            return attempt, False
+        delay_seconds = get_backoff_seconds(attempt, step.retry_delay_seconds, max(step.retry_delay_seconds, MAX_STEP_RETRY_DELAY_SECONDS))
+        log("Wipe step '{0}' failed! Retry {1}/{2} in {3:.0f} seconds.".format(step.name, attempt, step.retries, delay_seconds))
+        sleep(delay_seconds)
+        attempt += 1
+
+def format_steps_result(result):
+    '''
+        Returns the log lines of a run: every step with its timing and the critical path.
+    '''
+    lines = []
+    for step_result in result.step_results.values():
+        if step_result.resumed:
+            lines.append("Wipe step '{0}' skipped, an earlier attempt already finished it".format(step_result.step.name))
+            continue
+        lines.append("Wipe step '{0}' {1} after '{2}' (started at +{3}, attempts: {4})".format(step_result.step.name, "finished" if step_result.succeeded else "failed", timedelta(seconds=round(step_result.duration_seconds)), timedelta(seconds=round(step_result.started_seconds)), step_result.attempts))
+    if result.skipped_steps:
+        lines.append("Skipped wipe steps: {0}".format(result.skipped_steps))
+    critical_path = [step_result for step_result in result.get_critical_path() if not step_result.resumed]
+    if critical_path:
+        lines.append("Critical path: {0} = '{1}' of '{2}'".format(" -> ".join("{0} ({1})".format(step_result.step.name, timedelta(seconds=round(step_result.duration_seconds))) for step_result in critical_path), timedelta(seconds=round(critical_path[-1].finished_seconds - critical_path[0].started_seconds)), timedelta(seconds=round(result.duration_seconds))))
+    return lines